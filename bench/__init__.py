@@ -0,0 +1,14 @@
+"""
+Бенчмарки хранилища. Пакет src при импорте поднимает бота (локатор,
+телеграм, конфиг), поэтому здесь он регистрируется как пустой пакет
+с тем же путём: бенчмаркам нужны только модули из src.utils
+"""
+import os
+import sys
+import types
+
+
+if 'src' not in sys.modules:
+  _src = types.ModuleType('src')
+  _src.__path__ = [os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src')]
+  sys.modules['src'] = _src
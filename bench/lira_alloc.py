@@ -0,0 +1,97 @@
+"""
+Сравнение старого (перебор множества _fpls) и нового (FreeExtents)
+распределителей свободного места Лиры на фрагментированном хранилище;
+новый выделяет место так же, как Lira._malloc: FreeExtents.malloc с
+HOLE_FIT и HOLE_SPLIT Лиры
+
+Запуск из корня репозитория:
+  python -m bench.lira_alloc [cycles]
+"""
+import random
+import sys
+import time
+
+from src.utils.lira import Lira
+from src.utils.lira_extents import FreeExtents
+
+
+class SetAllocator:
+  """Распределитель в том виде, в котором он был в Lira до FreeExtents"""
+
+  def __init__(self):
+    self.fpls = { (0, 2**40) }
+
+  def malloc(self, s):
+    best = None
+    for el in self.fpls:
+      if el[1] >= s and (best is None or el[1] < best[1]):
+        best = el
+    self.fpls.remove(best)
+    if s != best[1]:
+      self.fpls.add( (best[0] + s, best[1] - s) )
+    return best[0], s
+
+  def free(self, pl):
+    self.fpls.add(pl)
+    l = r = None
+    for fpl in self.fpls:
+      if fpl[0] + fpl[1] == pl[0]:
+        l = fpl
+      elif pl[0] + pl[1] == fpl[0]:
+        r = fpl
+    if l is not None:
+      self.fpls.remove(l)
+      self.fpls.remove(pl)
+      pl = (l[0], l[1] + pl[1])
+      self.fpls.add(pl)
+    if r is not None:
+      self.fpls.remove(r)
+      self.fpls.remove(pl)
+      pl = (pl[0], pl[1] + r[1])
+      self.fpls.add(pl)
+
+  def holes(self):
+    return len(self.fpls)
+
+
+class IndexAllocator:
+  def __init__(self):
+    self.fpls = FreeExtents([ (0, 2**40) ])
+
+  def malloc(self, s):
+    return self.fpls.malloc(s, Lira.HOLE_FIT, Lira.HOLE_SPLIT)
+
+  def free(self, pl):
+    self.fpls.free(pl)
+
+  def holes(self):
+    return len(self.fpls)
+
+
+def run(allocator, cycles: int, live: int, seed: int = 1):
+  """
+  Держит около live живых объектов случайного размера и выполняет cycles
+  циклов put/out (освобождение случайного объекта и выделение нового),
+  что имитирует многомесячное редактирование событий
+  """
+  rnd = random.Random(seed)
+  objs = [allocator.malloc(rnd.randint(64, 4096)) for _ in range(live)]
+  start = time.perf_counter()
+  for _ in range(cycles):
+    i = rnd.randrange(len(objs))
+    allocator.free(objs[i])
+    objs[i] = allocator.malloc(rnd.randint(64, 4096))
+  return time.perf_counter() - start, allocator.holes()
+
+
+def main():
+  cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+  live = 20_000
+  for name, allocator in [('set', SetAllocator), ('index', IndexAllocator)]:
+    elapsed, holes = run(allocator(), cycles, live)
+    print(f'{name:>6}: {cycles} cycles, {holes} holes, '
+          f'{elapsed:.2f}s, {elapsed / cycles * 1e6:.1f}us/cycle')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,52 @@
+"""
+Рост файла данных Лиры при дописывании маленьких событий и их
+редактировании: с предвыделением места порциями и с ростом файла
+на каждую запись; в конце печатается Lira.arenaStats
+
+Запуск из корня репозитория:
+  python -m bench.lira_arena [events]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench.lira_codec import sample
+from src.utils.lira import Lira
+
+
+def run(path: str, n: int, prealloc: bool):
+  if not prealloc:
+    Lira.PREALLOC_MIN, Lira.PREALLOC_MAX = 0, 0
+  lira = Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr'))
+  rnd = random.Random(1)
+  ids = []
+  start = time.perf_counter()
+  for i in range(n):
+    ids.append(lira.put(sample('event', i), cat='event'))
+    lira.flush()
+  for _ in range(n):
+    id = rnd.choice(ids)
+    event = sample('event', rnd.randrange(n))
+    event['desc'] *= rnd.randint(1, 3)
+    lira.put(event, id=id, cat='event')
+    lira.flush()
+  elapsed = time.perf_counter() - start
+  stats = lira.arenaStats()
+  lira.close()
+  return elapsed, stats
+
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+  defaults = Lira.PREALLOC_MIN, Lira.PREALLOC_MAX
+  for prealloc in (True, False):
+    elapsed, stats = run(tempfile.mkdtemp(), n, prealloc)
+    Lira.PREALLOC_MIN, Lira.PREALLOC_MAX = defaults
+    print(f'{"prealloc" if prealloc else "exact":>8}: {elapsed / (2 * n) * 1e6:6.1f}us/put, '
+          + ', '.join(f'{key} {value}' for key, value in stats.items()))
+
+
+if __name__ == '__main__':
+  main()
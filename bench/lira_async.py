@@ -0,0 +1,111 @@
+"""
+Задержки AsyncLira в цикле событий asyncio:
+  - get объекта из кэша (без перехода в поток ввода-вывода) против
+    run_in_executor(lira.get);
+  - одновременные get объектов, которых нет в кэше: AsyncLira собирает
+    их в get_many, run_in_executor читает каждый по отдельности;
+  - put + flush из многих корутин: AsyncLira объединяет flush;
+  - задержка самого цикла событий (на сколько опаздывает таймер в 1 мс),
+    пока идут записи, — с AsyncLira и с синхронными вызовами Лиры
+Для каждого случая печатаются медиана и 99-й перцентиль задержки, а для
+одновременных запросов — ещё и общее время
+
+Запуск из корня репозитория:
+  python -m bench.lira_async [objects]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from bench.lira_codec import sample
+from src.utils.lira import Lira
+from src.utils.lira_async import AsyncLira
+from src.utils.lira_cache import LiraCache, LruPolicy
+
+
+def report(name, times, total=None):
+  times = sorted(times)
+  print(f'{name:>34}: p50 {times[len(times) // 2] * 1e6:8.1f}us, '
+        f'p99 {times[int(len(times) * 0.99)] * 1e6:8.1f}us'
+        + ('' if total is None else f', total {total * 1e3:6.1f}ms'))
+
+
+async def timed(coro):
+  start = time.perf_counter()
+  await coro
+  return time.perf_counter() - start
+
+
+async def together(coros):
+  start = time.perf_counter()
+  times = await asyncio.gather(*(timed(coro) for coro in coros))
+  return times, time.perf_counter() - start
+
+
+async def lag(stop, times):
+  while not stop.is_set():
+    start = time.perf_counter()
+    await asyncio.sleep(0.001)
+    times.append(time.perf_counter() - start - 0.001)
+
+
+async def main(n):
+  path = tempfile.mkdtemp()
+  lira = Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr'),
+              cache=LiraCache(LruPolicy(n // 10)))
+  ids = lira.put_many([sample('event', i) for i in range(n)], cat='event')
+  lira.flush()
+  alira = AsyncLira.of(lira)
+  loop = asyncio.get_running_loop()
+  hot = ids[-100:]
+
+  async def executor(fn, *args):
+    return await loop.run_in_executor(None, fn, *args)
+
+  report('cached get, AsyncLira', [await timed(alira.get(hot[i % 100])) for i in range(10_000)])
+  report('cached get, run_in_executor', [await timed(executor(lira.get, hot[i % 100]))
+                                         for i in range(10_000)])
+
+  report('1000 cold gets, AsyncLira', *await together(alira.get(id) for id in ids[:1000]))
+  report('1000 cold gets, run_in_executor',
+         *await together(executor(lira.get, id) for id in ids[1000:2000]))
+
+  async def write(i):
+    await alira.put(sample('event', i), cat='event')
+    await alira.flush()
+
+  def writeSync(i):
+    lira.put(sample('event', i), cat='event')
+    lira.flush()
+
+  commits = lira.commitStats()['commits']
+  report('1000 put+flush, AsyncLira', *await together(write(i) for i in range(1000)))
+  print(f'{"":>36}flushes: {lira.commitStats()["commits"] - commits}')
+  commits = lira.commitStats()['commits']
+  report('1000 put+flush, run_in_executor', *await together(executor(writeSync, i)
+                                                            for i in range(1000)))
+  print(f'{"":>36}flushes: {lira.commitStats()["commits"] - commits}')
+
+  for name in ('AsyncLira', 'sync'):
+    stop, times = asyncio.Event(), []
+    ticker = asyncio.create_task(lag(stop, times))
+    for i in range(2000):
+      if name == 'sync':
+        lira.put(sample('event', i), cat='event')
+        lira.flush()
+        lira.get(ids[i])
+        await asyncio.sleep(0)
+      else:
+        await alira.put(sample('event', i), cat='event')
+        await alira.flush()
+        await alira.get(ids[i])
+    stop.set()
+    await ticker
+    report(f'loop lag during writes, {name}', times)
+  await alira.close()
+
+
+if __name__ == '__main__':
+  asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000))
@@ -0,0 +1,100 @@
+"""
+Размер и скорость кодеков Лиры на формах реальных сущностей бота (event,
+timesheet, destination, translation, user, action)
+
+Запуск из корня репозитория:
+  python -m bench.lira_codec [objects_per_category]
+"""
+import datetime as dt
+import sys
+import time
+
+from src.entities.event.event import Place
+from src.utils.lira_codec import LiraCodec
+from src.utils.repeater import Period
+from src.utils.tg.tg_destination import TgDestination
+
+
+def sample(cat: str, i: int):
+  start = dt.datetime(2023, 1, 1, 19) + dt.timedelta(hours=i)
+  sets = {
+    'head': None,
+    'tail': None,
+    'black_list': {1, 2, 3},
+    'words_black_list': ['отмена'],
+    'line_format': '%d %t %n %p',
+  }
+  return {
+    'event': lambda: {
+      'start': start,
+      'finish': None,
+      'place': Place(name=f'Клуб {i % 40}', org=f'Организатор {i % 7}'),
+      'url': f'https://t.me/channel/{i}',
+      'desc': f'Вечер настольных игр №{i}',
+      'creator': 100000 + i % 500,
+      'id': i,
+    },
+    'timesheet': lambda: {
+      'id': i,
+      'name': f'timesheet{i}',
+      'password': 'a6vbd3dks',
+      'destination_sets': sets,
+      'events': set(range(i, i + 200)),
+      'places': [f'Клуб {k}' for k in range(20)],
+      'orgs': [f'Организатор {k}' for k in range(7)],
+    },
+    'destination': lambda: {
+      'id': i,
+      'chat': TgDestination(chat_id=-1000000000000 - i, message_to_replay_id=i),
+      'sets': sets,
+    },
+    'translation': lambda: {
+      'id': i,
+      'destination_id': i,
+      'message_id': 5000 + i,
+      'timesheet_id': i % 30,
+      'creator': 100000 + i % 500,
+    },
+    'user': lambda: {
+      'chat': 100000 + i,
+      'timesheet_id': i % 30,
+      'destination_id': i,
+    },
+    'action': lambda: {
+      'id': i,
+      'creator': 100000 + i % 500,
+      'type': 'ACTION_TG_AUTO_FORWARD',
+      'period': Period(point=start, delta=dt.timedelta(days=1)),
+      'last_update': start,
+      'chat': TgDestination(chat_id=-1000000000000 - i),
+      'timesheet_id': i % 30,
+      'translation_id': i,
+    },
+  }[cat]()
+
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  codecs = [
+    ('pickle', LiraCodec()),
+    ('p5', LiraCodec('p5')),
+    ('entity', LiraCodec('e')),
+    ('entity+z', LiraCodec('e', compress_threshold=256)),
+  ]
+  for cat in ['event', 'timesheet', 'destination', 'translation', 'user', 'action']:
+    objs = [sample(cat, i) for i in range(n)]
+    for name, codec in codecs:
+      start = time.perf_counter()
+      encoded = [codec.encode(obj, cat) for obj in objs]
+      encode = time.perf_counter() - start
+      start = time.perf_counter()
+      decoded = [codec.decode(dump, tag, cat) for dump, tag in encoded]
+      decode = time.perf_counter() - start
+      assert [d.keys() for d in decoded] == [o.keys() for o in objs]
+      size = sum(len(dump) for dump, _ in encoded) / n
+      print(f'{cat:>11} {name:>8}: {size:7.0f} B/obj, '
+            f'encode {encode / n * 1e6:6.1f}us, decode {decode / n * 1e6:6.1f}us')
+
+
+if __name__ == '__main__':
+  main()
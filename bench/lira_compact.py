@@ -0,0 +1,41 @@
+"""
+Уплотнение Лиры, в файле данных которой между объектами остались дыры
+(удалён каждый третий объект): время compact и Lira.arenaStats до и после.
+После уплотнения объекты должны лежать вплотную — без дыр, used == live
+
+Запуск из корня репозитория:
+  python -m bench.lira_compact [objects]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from bench.lira_codec import sample
+from src.utils.lira import Lira
+
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+  path = tempfile.mkdtemp()
+  lira = Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr'))
+  ids = lira.put_many([sample('event', i) for i in range(n)], cat='event')
+  lira.flush()
+  lira.out_many(ids[::3])
+  lira.flush()
+  print(f'{"before":>8}: ' + ', '.join(f'{key} {value}' for key, value in lira.arenaStats().items()))
+
+  start = time.perf_counter()
+  lira.compact()
+  elapsed = time.perf_counter() - start
+  stats = lira.arenaStats()
+  print(f'{"after":>8}: ' + ', '.join(f'{key} {value}' for key, value in stats.items())
+        + f', {elapsed * 1e3:.0f}ms')
+  assert stats['holes'] == 0 and lira.fragmentation() == 0, stats
+  assert [event['desc'] for event in lira.get_many(ids[1::3])] == \
+    [sample('event', i)['desc'] for i in range(1, n, 3)]
+  lira.close()
+
+
+if __name__ == '__main__':
+  main()
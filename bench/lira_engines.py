@@ -0,0 +1,84 @@
+"""
+Файловая Лира против SqliteLira на нагрузке бота: запись объектов
+репозиториями (put + flush на каждый объект), холодная загрузка
+категории (как LiraRepo._deserializeValues), обновления с flush (как
+LiraRepo._onValueChanged), выборка маленькой категории среди большой
+и удаление
+
+Запуск из корня репозитория:
+  python -m bench.lira_engines [events] [dir]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench.lira_codec import sample
+from src.utils.lira import Lira
+from src.utils.lira_sqlite import SqliteLira
+
+
+ENGINES = {
+  'lira': lambda path: Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr')),
+  'sqlite': lambda path: SqliteLira(os.path.join(path, 'lira.db')),
+}
+
+
+def timed(results, name, count, action):
+  start = time.perf_counter()
+  action()
+  elapsed = time.perf_counter() - start
+  results[name] = elapsed / count * 1e6
+
+
+def run(engine, path, n):
+  results = {}
+  rnd = random.Random(1)
+  store = ENGINES[engine](path)
+  ids = []
+
+  def write():
+    for i in range(n):
+      ids.append(store.put(sample('event', i), cat='event'))
+      store.flush()
+    for i in range(n // 100):
+      store.put(sample('user', i), cat='user')
+      store.flush()
+  timed(results, 'put+flush', n + n // 100, write)
+  store.close()
+
+  store = ENGINES[engine](path)
+  timed(results, 'cold load', n, lambda: [store.get(id) for id in store['event']])
+
+  def update():
+    for id in rnd.sample(ids, n // 10):
+      store.put(sample('event', id), id=id, cat='event')
+      store.flush()
+  timed(results, 'update+flush', n // 10, update)
+  timed(results, 'small cat', 100, lambda: [store['user'] for _ in range(100)])
+
+  def remove():
+    for id in rnd.sample(ids, n // 10):
+      store.out(id)
+      store.flush()
+  timed(results, 'out+flush', n // 10, remove)
+  store.close()
+  return results
+
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+  root = sys.argv[2] if len(sys.argv) > 2 else tempfile.mkdtemp()
+  results = {}
+  for engine in ENGINES:
+    path = os.path.join(root, engine)
+    os.makedirs(path, exist_ok=True)
+    results[engine] = run(engine, path, n)
+  print(f'{"us/op":>12}' + ''.join(f'{engine:>10}' for engine in ENGINES))
+  for op in results['lira']:
+    print(f'{op:>12}' + ''.join(f'{results[engine][op]:10.1f}' for engine in ENGINES))
+
+
+if __name__ == '__main__':
+  main()
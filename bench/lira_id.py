@@ -0,0 +1,53 @@
+"""
+Поиск id объекта в памяти (Lira.id) при 1M объектов в кэше: старый
+линейный поиск по равенству против обратного индекса LiraCache
+
+Запуск из корня репозитория:
+  python -m bench.lira_id [objects]
+"""
+import random
+import sys
+import time
+
+from src.utils.lira_cache import LiraCache
+
+
+def linear_id(objv: dict, obj):
+  """Lira.id в том виде, в котором он был до обратного индекса"""
+  for id, val in objv.items():
+    if val == obj:
+      return id
+  return None
+
+
+def measure(name, lookup, objs, count):
+  rnd = random.Random(1)
+  sample = [rnd.choice(objs) for _ in range(count)]
+  start = time.perf_counter()
+  for obj in sample:
+    lookup(obj)
+  elapsed = time.perf_counter() - start
+  print(f'{name:>8}: {elapsed / count * 1e6:10.2f}us/lookup ({count} lookups)')
+
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+  identity = LiraCache()
+  content = LiraCache(content_index=True)
+  objs = [{'id': i, 'desc': f'event {i}'} for i in range(n)]
+  for i, obj in enumerate(objs):
+    identity.put(-i - 1, obj, 64)
+  start = time.perf_counter()
+  for i, obj in enumerate(objs):
+    content.put(-i - 1, obj, 64)
+  print(f'content index build: {time.perf_counter() - start:.2f}s for {n} objects')
+
+  objv = dict(identity.items())
+  measure('linear', lambda obj: linear_id(objv, obj), objs, 10)
+  measure('identity', identity.find, objs, 100_000)
+  copies = [dict(obj) for obj in objs[:1000]]
+  measure('content', content.find, copies, 1000)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,52 @@
+"""
+Выдача идентификаторов LiraRepo.newId: создание многих событий
+(newId + put, как в User) и одни только newId — с записью счётчика на
+каждый идентификатор (ID_BLOCK = 1, как раньше) и с резервированием
+блоками. Печатается время на событие / идентификатор и число сбросов
+заголовков Лиры
+
+Запуск из корня репозитория:
+  python -m bench.lira_ids [events]
+"""
+import os
+import sys
+import tempfile
+import time
+import types
+
+from src.entities.event.event import Event, Place
+from src.entities.event.event_repository import EventRepo
+from src.utils.lira import Lira
+
+
+def run(n, block):
+  path = tempfile.mkdtemp()
+  lira = Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr'))
+  repo = type('Repo', (EventRepo,), {'ID_BLOCK': block})(
+    types.SimpleNamespace(lira=lambda: lira, liraWriter=lambda: None),
+  )
+  commits = lira.commitStats()['commits']
+  start = time.perf_counter()
+  for i in range(n):
+    repo.put(Event(place=Place(f'Клуб {i % 40}'), desc=f'Вечер №{i}', creator=100000 + i % 500,
+                   id=repo.newId()))
+  create = (time.perf_counter() - start) / n * 1e6
+  flushes = lira.commitStats()['commits'] - commits
+  start = time.perf_counter()
+  for _ in range(n):
+    repo.newId()
+  ids = (time.perf_counter() - start) / n * 1e6
+  lira.close()
+  return create, flushes, ids
+
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+  print(f'{"":>10}{"us/event":>10}{"flushes":>10}{"us/id":>10}')
+  for block in (1, EventRepo.ID_BLOCK, 1024):
+    create, flushes, ids = run(n, block)
+    print(f'{"block " + str(block):>10}{create:10.1f}{flushes:10}{ids:10.2f}')
+
+
+if __name__ == '__main__':
+  main()
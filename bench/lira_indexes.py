@@ -0,0 +1,109 @@
+"""
+Вторичные индексы LiraRepo: поиск места назначения по chat id
+(DestinationRepo.findByChatId) и пользователей расписания на
+репозиториях из многих объектов — перебором (findIf / findAll) и по
+индексу (findBy). Печатается время одного поиска, а также цена
+индексов при загрузке репозитория и при записи изменения объекта
+
+Запуск из корня репозитория:
+  python -m bench.lira_indexes [objects]
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+
+from bench.lira_codec import sample
+from src.utils.lira import Lira
+from src.utils.lira_repo import LiraRepo, LiraIndex
+
+
+class DictRepo(LiraRepo):
+  """Репозиторий словарей из sample (слушать изменения не нужно: _onValueChanged вызывается явно)"""
+
+  def valueToSerialized(self, value):
+    return value
+
+  def valueFromSerialized(self, serialized):
+    return serialized
+
+  def addValueListener(self, value, listener):
+    pass
+
+
+class DestinationRepo(DictRepo):
+  def keyByValue(self, value):
+    return value['id']
+
+
+class IndexedDestinationRepo(DestinationRepo):
+  INDEXES = {'chat_id': LiraIndex(lambda d: d['chat'].chatId, unique=True)}
+
+
+class UserRepo(DictRepo):
+  def keyByValue(self, value):
+    return value['chat']
+
+
+class IndexedUserRepo(UserRepo):
+  INDEXES = {'timesheet': LiraIndex(lambda u: u['timesheet_id'])}
+
+
+def timed(count, action):
+  start = time.perf_counter()
+  action()
+  return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+  path = tempfile.mkdtemp()
+  lira = Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr'))
+  lira.put_many([sample('destination', i) for i in range(n)], cat='destination')
+  lira.put_many([sample('user', i) for i in range(n)], cat='user')
+  lira.flush()
+  chats = [-1000000000000 - i * 7919 % n for i in range(100)]
+  timesheets = [i % 30 for i in range(100)]
+
+  print(f'{n} objects{"plain":>20}{"indexed":>12}')
+  repos = {}
+  for name, plain, indexed in (('destination', DestinationRepo, IndexedDestinationRepo),
+                               ('user', UserRepo, IndexedUserRepo)):
+    load = []
+    for cls in (plain, indexed):
+      gc.collect()
+      start = time.perf_counter()
+      repos[cls] = cls(lira, name)
+      load.append((time.perf_counter() - start) * 1e3)
+    print(f'{"load " + name + ", ms":>28}{load[0]:12.1f}{load[1]:12.1f}')
+
+  plain, indexed = repos[DestinationRepo], repos[IndexedDestinationRepo]
+  find = [
+    timed(len(chats), lambda: [plain.findIf(lambda d: d['chat'].chatId == chat) for chat in chats]),
+    timed(len(chats), lambda: [indexed.findBy('chat_id', chat) for chat in chats]),
+  ]
+  print(f'{"findByChatId, us":>28}{find[0]:12.1f}{find[1]:12.2f}')
+
+  plain, indexed = repos[UserRepo], repos[IndexedUserRepo]
+  find = [
+    timed(len(timesheets), lambda: [plain.findAll(lambda u: u['timesheet_id'] == id) for id in timesheets]),
+    timed(len(timesheets), lambda: [indexed.findBy('timesheet', id) for id in timesheets]),
+  ]
+  print(f'{"users of timesheet, us":>28}{find[0]:12.1f}{find[1]:12.2f}')
+
+  change = []
+  for repo in (plain, indexed):
+    users = [repo.find(100000 + i) for i in range(1000)]
+
+    def update():
+      for user in users:
+        user['timesheet_id'] += 1
+        repo._onValueChanged(user)
+    change.append(timed(len(users), update))
+  print(f'{"change + flush, us":>28}{change[0]:12.1f}{change[1]:12.1f}')
+  lira.close()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,69 @@
+"""
+Ленивые репозитории: создание EventRepo на хранилище из многих событий
+с построением всех значений сразу (LAZY = False) и лениво — при первом
+запуске (ключей в метаинформации ещё нет, события перечитываются и
+перезаписываются) и при следующих. Печатаются время создания, память,
+занятая репозиторием (tracemalloc, отдельным созданием, потому что
+трассировка замедляет создание), время первого find и время, за которое
+строятся 100 событий расписания (Timesheet.events — запрос по ключам)
+
+Запуск из корня репозитория:
+  python -m bench.lira_lazy [objects]
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+from bench.lira_codec import sample
+from src.entities.event.event_repository import EventRepo
+from src.utils.lira import Lira
+
+
+class EagerEventRepo(EventRepo):
+  LAZY = False
+
+
+def run(lira, cls):
+  locator = types.SimpleNamespace(lira=lambda: lira, liraWriter=lambda: None)
+  gc.collect()
+  start = time.perf_counter()
+  repo = cls(locator)
+  elapsed = time.perf_counter() - start
+  start = time.perf_counter()
+  repo.find(len(repo.values) // 2)
+  find = time.perf_counter() - start
+  keys = list(range(1, len(repo.values), len(repo.values) // 100))[:100]
+  start = time.perf_counter()
+  repo.query().whereIn('key', keys).orderBy('start').all()
+  events = time.perf_counter() - start
+  count = len(repo.values)
+  del repo
+  gc.collect()
+  tracemalloc.start()
+  repo = cls(locator)
+  memory = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  assert len(repo.values) == count
+  return elapsed * 1e3, memory / 2 ** 20, find * 1e6, events * 1e3
+
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+  path = tempfile.mkdtemp()
+  lira = Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr'))
+  for start in range(0, n, 10_000):
+    lira.put_many([sample('event', i) for i in range(start, min(start + 10_000, n))], cat='event')
+    lira.flush()
+  print(f'{n} events{"create, ms":>18}{"MiB":>8}{"find, us":>10}{"100 events, ms":>16}')
+  for name, cls in (('eager', EagerEventRepo), ('lazy, first', EventRepo), ('lazy', EventRepo)):
+    elapsed, memory, find, events = run(lira, cls)
+    print(f'{name:>14}{elapsed:12.0f}{memory:8.1f}{find:10.1f}{events:16.2f}')
+  lira.close()
+
+
+if __name__ == '__main__':
+  main()
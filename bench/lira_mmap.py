@@ -0,0 +1,84 @@
+"""
+Холодная загрузка репозитория (LiraRepo._deserializeValues) с чтением
+через seek/read и через mmap
+
+Запуск из корня репозитория:
+  python -m bench.lira_mmap [size_mb] [dir]
+
+Хранилище размера size_mb (по умолчанию 500 МБ) создаётся в dir один раз
+и переиспользуется при следующих запусках
+"""
+import datetime as dt
+import os
+import sys
+import tempfile
+import time
+
+from typing import Any, Callable
+
+from src.entities.event.event import Event, Place
+from src.utils.lira import Lira
+from src.utils.lira_repo import LiraRepo
+
+
+class BenchEventRepo(LiraRepo):
+  """То же, что EventRepo, но без локатора"""
+
+  def __init__(self, lira: Lira):
+    super().__init__(lira, lira_cat='event')
+
+  def valueToSerialized(self, value: Event) -> {str: Any}:
+    return value.serialize()
+
+  def valueFromSerialized(self, serialized: {str: Any}) -> Event:
+    return Event(serialized=serialized)
+
+  def addValueListener(self, value: Event, listener: Callable):
+    value.addListener(listener)
+
+  def keyByValue(self, value: Event) -> int:
+    return value.id
+
+
+def make_store(path: str, size_mb: int):
+  data, head = os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr')
+  if os.path.exists(head):
+    return data, head
+  lira = Lira(data, head)
+  start = dt.datetime(2023, 1, 1, 19)
+  id = 0
+  while lira._end() < size_mb * 1024 * 1024:
+    with lira.transaction():
+      for _ in range(1000):
+        id += 1
+        lira.put(Event(
+          id=id,
+          start=start + dt.timedelta(hours=id),
+          place=Place(name=f'Place {id % 50}', org=f'Org {id % 7}'),
+          url=f'https://t.me/channel/{id}',
+          desc='Описание мероприятия ' * 200,
+          creator=id % 1000,
+        ).serialize(), cat='event')
+  lira.close()
+  return data, head
+
+
+def main():
+  size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+  path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(tempfile.gettempdir(),
+                                                          f'lira_bench_{size_mb}mb')
+  os.makedirs(path, exist_ok=True)
+  data, head = make_store(path, size_mb)
+  print(f'store: {os.path.getsize(data) / 2**20:.0f} MB in {path}')
+
+  for mmap in [False, True, False, True]:
+    lira = Lira(data, head, mmap=mmap)
+    start = time.perf_counter()
+    repo = BenchEventRepo(lira)
+    elapsed = time.perf_counter() - start
+    print(f'mmap={mmap!s:>5}: {len(repo.values)} events loaded in {elapsed:.2f}s')
+    lira.close()
+
+
+if __name__ == '__main__':
+  main()
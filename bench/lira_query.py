@@ -0,0 +1,78 @@
+"""
+Запросы LiraRepo.query() против findAll с сортировкой результата на
+репозитории событий с индексами по создателю и (упорядоченным, как
+в EventRepo) по началу: первые 10 по началу, события за неделю по
+порядку, события одного создателя, новые первыми, и события одного
+расписания по порядку (как в Timesheet.events). Печатаются время
+запроса и его план (explain)
+
+Запуск из корня репозитория:
+  python -m bench.lira_query [objects]
+"""
+import datetime as dt
+import os
+import sys
+import tempfile
+import time
+import types
+
+from bench.lira_codec import sample
+from src.entities.event.event_repository import EventRepo
+from src.utils.lira import Lira
+from src.utils.lira_repo import LiraIndex
+
+
+class IndexedEventRepo(EventRepo):
+  INDEXES = {
+    'creator': LiraIndex(lambda e: e.creator),
+    **EventRepo.INDEXES,
+  }
+
+
+def timed(action, repeat=20):
+  start = time.perf_counter()
+  for _ in range(repeat):
+    action()
+  return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+  path = tempfile.mkdtemp()
+  lira = Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr'))
+  for start in range(0, n, 10_000):
+    lira.put_many([sample('event', i) for i in range(start, min(start + 10_000, n))], cat='event')
+    lira.flush()
+  repo = IndexedEventRepo(types.SimpleNamespace(lira=lambda: lira, liraWriter=lambda: None))
+  repo.findAll(lambda _: True)
+  since = sample('event', n // 2)['start']
+  until = since + dt.timedelta(days=7)
+  timesheet = {id: None for id in range(1, n + 1, max(1, n // 500))}
+  cases = {
+    'first 10 by start': (
+      lambda: sorted(repo.findAll(lambda _: True), key=lambda e: e.start)[:10],
+      lambda: repo.query().orderBy('start').limit(10),
+    ),
+    'week by start': (
+      lambda: sorted(repo.findAll(lambda e: since <= e.start <= until), key=lambda e: e.start),
+      lambda: repo.query().between('start', since, until).orderBy('start'),
+    ),
+    'creator, newest first': (
+      lambda: sorted(repo.findAll(lambda e: e.creator == 100007), key=lambda e: e.start, reverse=True),
+      lambda: repo.query().where('creator', 100007).orderBy('start', reverse=True),
+    ),
+    'timesheet by start': (
+      lambda: sorted((repo.find(id) for id in timesheet), key=lambda e: e.start),
+      lambda: repo.query().whereIn('key', timesheet).orderBy('start'),
+    ),
+  }
+  print(f'{n} events{"findAll, ms":>26}{"query, ms":>12}')
+  for name, (scan, query) in cases.items():
+    assert [e.id for e in scan()] == [e.id for e in query()]
+    print(f'{name:>24}{timed(scan):12.2f}{timed(lambda: query().all()):12.3f}')
+    print('  ' + query().explain().replace('\n', '\n  '))
+  lira.close()
+
+
+if __name__ == '__main__':
+  main()
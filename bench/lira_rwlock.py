@@ -0,0 +1,92 @@
+"""
+Конкурентные чтения Лиры из нескольких потоков: блокировка
+читателей-писателей против одной монопольной блокировки (как было раньше).
+Часть чтений попадает в кэш, часть — холодные (кэш ограничен), один поток
+параллельно пишет
+
+Запуск из корня репозитория:
+  python -m bench.lira_rwlock [reads_per_thread]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from contextlib import contextmanager
+from threading import Lock, Thread
+
+from src.utils.lira import Lira
+from src.utils.lira_cache import LiraCache, LruPolicy
+from src.utils.rwlock import RWLock
+
+
+class ExclusiveLock:
+  """Блокировка с интерфейсом RWLock, у которой чтение тоже монопольно"""
+
+  def __init__(self):
+    self._lock = Lock()
+
+  @contextmanager
+  def read(self):
+    with self._lock:
+      yield self
+
+  def __enter__(self):
+    self._lock.acquire()
+    return self
+
+  def __exit__(self, *args):
+    self._lock.release()
+
+
+def run(path: str, lock, threads: int, reads: int) -> float:
+  lira = Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr'),
+              cache=LiraCache(LruPolicy(2000)))
+  lira.__dict__['_lock'] = lock
+  ids = lira['event']
+  stop = False
+
+  def reader(seed):
+    rnd = random.Random(seed)
+    for _ in range(reads):
+      lira.get(rnd.choice(ids))
+
+  def writer():
+    while not stop:
+      lira.put({'tick': time.time()}, id='tick', cat='tick')
+      time.sleep(0.001)
+
+  workers = [Thread(target=reader, args=(i,)) for i in range(threads)]
+  background = Thread(target=writer)
+  background.start()
+  start = time.perf_counter()
+  for w in workers:
+    w.start()
+  for w in workers:
+    w.join()
+  elapsed = time.perf_counter() - start
+  stop = True
+  background.join()
+  lira.close()
+  return elapsed
+
+
+def main():
+  reads = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+  path = tempfile.mkdtemp(prefix='lira_rwlock_')
+  lira = Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr'))
+  with lira.transaction():
+    for i in range(10_000):
+      lira.put({'id': i, 'desc': 'x' * 512}, cat='event')
+  lira.close()
+
+  for threads in [1, 2, 4, 8]:
+    for name, lock in [('exclusive', ExclusiveLock), ('rwlock', RWLock)]:
+      elapsed = run(path, lock(), threads, reads)
+      print(f'{threads} threads, {name:>9}: '
+            f'{threads * reads / elapsed:10.0f} reads/s')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,98 @@
+"""
+Пропускная способность смешанной записи: одновременно из нескольких
+потоков пишутся большие события (event), мелкие счётчики id
+(id_counter) и обновления action (last_update), каждая запись — put +
+flush, как в LiraRepo. Одна Лира на все категории против ShardedLira
+с осколком на категорию; печатается число записей в секунду по
+категориям, 99-й перцентиль задержки put + flush и фрагментация
+файлов данных
+
+Запуск из корня репозитория:
+  python -m bench.lira_shards [seconds] [dir]
+"""
+import datetime as dt
+import os
+import sys
+import tempfile
+import time
+
+from threading import Event, Thread
+
+from bench.lira_codec import sample
+from src.utils.lira import Lira
+from src.utils.lira_sharded import ShardedLira
+
+
+ENGINES = {
+  'lira': lambda path: Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr')),
+  'sharded': lambda path: ShardedLira(path),
+}
+
+
+def events(store, i):
+  event = sample('event', i)
+  event['desc'] *= 200
+  store.put(event, cat='event')
+  store.flush()
+
+
+def counters(store, i):
+  store.put(i, id='event_id_counter', cat='id_counter')
+  store.flush()
+
+
+def actions(store, i):
+  action = sample('action', i % 100)
+  action['last_update'] += dt.timedelta(seconds=i)
+  store.put(action, id=f'action{i % 100}', cat='action')
+  store.flush()
+
+
+WRITERS = {'event': events, 'id_counter': counters, 'action': actions}
+
+
+def run(engine, path, seconds):
+  store = ENGINES[engine](path)
+  stop = Event()
+  latencies = {}
+
+  def writer(cat, write):
+    i, times = 0, []
+    while not stop.is_set():
+      start = time.perf_counter()
+      write(store, i)
+      times.append(time.perf_counter() - start)
+      i += 1
+    latencies[cat] = sorted(times)
+
+  threads = [Thread(target=writer, args=item) for item in WRITERS.items()]
+  start = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  time.sleep(seconds)
+  stop.set()
+  for thread in threads:
+    thread.join()
+  elapsed = time.perf_counter() - start
+  fragmentation = store.fragmentation()
+  store.close()
+  rates = {cat: len(times) / elapsed for cat, times in latencies.items()}
+  p99 = {cat: times[int(len(times) * 0.99)] * 1e3 for cat, times in latencies.items()}
+  return rates, p99, fragmentation
+
+
+def main():
+  seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+  root = sys.argv[2] if len(sys.argv) > 2 else tempfile.mkdtemp()
+  print(f'{"puts/s, p99 ms":>16}' + ''.join(f'{cat:>20}' for cat in WRITERS)
+        + f'{"total":>10}{"fragm.":>8}')
+  for engine in ENGINES:
+    path = os.path.join(root, engine)
+    os.makedirs(path, exist_ok=True)
+    rates, p99, fragmentation = run(engine, path, seconds)
+    print(f'{engine:>16}' + ''.join(f'{rates[cat]:12.0f}{p99[cat]:8.2f}' for cat in WRITERS)
+          + f'{sum(rates.values()):10.0f}{fragmentation:8.2f}')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,79 @@
+"""
+Время запуска: от старта процесса до обработки первого сообщения
+(чтение категории пользователей, поиск пользователя и запись его
+изменения) на хранилище, где большую часть объектов составляют события.
+Сравниваются ленивое чтение заголовков по категориям и чтение всех
+заголовков сразу (как до разбиения файла заголовков на блоки)
+
+Запуск из корня репозитория:
+  python -m bench.lira_startup [objects,...] [dir]
+
+Хранилища создаются в dir один раз и переиспользуются
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.lira_codec import sample
+from src.utils.lira import Lira
+
+
+CHUNK = 10_000
+
+
+def make_store(path: str, n: int):
+  data, head = os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr')
+  if os.path.exists(head):
+    return data, head
+  lira = Lira(data, head)
+  users = max(n // 100, 1)
+  lira.put_many([sample('user', i) for i in range(users)], cat='user')
+  for start in range(0, n - users, CHUNK):
+    count = min(CHUNK, n - users - start)
+    lira.put_many([sample('event', start + i) for i in range(count)], cat='event')
+    lira.flush()
+  lira.close()
+  return data, head
+
+
+def child(data: str, head: str, mode: str):
+  lira = Lira(data, head)
+  if mode == 'all':
+    list(lira)
+  ids = lira['user']
+  users = dict(zip(ids, lira.get_many(ids)))
+  id, user = next(iter(users.items()))
+  user['destination_id'] += 1
+  lira.put(user, id=id, cat='user')
+  lira.flush()
+
+
+def measure(data: str, head: str, mode: str, runs: int = 3) -> float:
+  best = None
+  for _ in range(runs):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'bench.lira_startup', '--child', data, head, mode],
+                   check=True)
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+
+def main():
+  if sys.argv[1:2] == ['--child']:
+    child(*sys.argv[2:5])
+    return
+  sizes = [int(n) for n in sys.argv[1].split(',')] if len(sys.argv) > 1 else [10_000, 100_000, 1_000_000]
+  root = sys.argv[2] if len(sys.argv) > 2 else tempfile.mkdtemp()
+  print(f'{"objects":>10}{"lazy, s":>10}{"all, s":>10}')
+  for n in sizes:
+    path = os.path.join(root, str(n))
+    os.makedirs(path, exist_ok=True)
+    data, head = make_store(path, n)
+    print(f'{n:>10}{measure(data, head, "lazy"):10.3f}{measure(data, head, "all"):10.3f}')
+
+
+if __name__ == '__main__':
+  main()
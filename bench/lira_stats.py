@@ -0,0 +1,56 @@
+"""
+Цена статистики Лиры: get из кэша, get с чтением из файла и put + flush
+без статистики и с LiraStats; в конце печатается снимок Lira.stats()
+
+Запуск из корня репозитория:
+  python -m bench.lira_stats [objects]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from bench.lira_codec import sample
+from src.utils.lira import Lira
+from src.utils.lira_cache import LiraCache, LruPolicy
+from src.utils.lira_stats import LiraStats, format_stats
+
+
+def timed(count, action):
+  start = time.perf_counter()
+  action()
+  return (time.perf_counter() - start) / count * 1e6
+
+
+def run(n, stats):
+  path = tempfile.mkdtemp()
+  lira = Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr'),
+              cache=LiraCache(LruPolicy(100)), stats=stats)
+  results = {}
+
+  def write():
+    for i in range(n):
+      lira.put(sample('event', i), cat='event')
+      lira.flush()
+  results['put+flush'] = timed(n, write)
+  ids = lira['event']
+  hot = ids[-100:]
+  results['cached get'] = timed(10 * n, lambda: [lira.get(hot[i % 100]) for i in range(10 * n)])
+  results['cold get'] = timed(n, lambda: [lira.get(id) for id in ids])
+  snapshot = lira.stats()
+  lira.close()
+  return results, snapshot
+
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+  off, _ = run(n, None)
+  on, snapshot = run(n, LiraStats())
+  print(f'{"us/op":>12}{"off":>10}{"on":>10}')
+  for op in off:
+    print(f'{op:>12}{off[op]:10.2f}{on[op]:10.2f}')
+  print(format_stats(snapshot))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,71 @@
+"""
+Отложенная запись изменений LiraRepo (LiraWriter) против записи на
+каждое изменение: несколько потоков часто меняют одни и те же объекты
+(как last_update действий и места расписаний). Печатается время одного
+изменения в вызывающем потоке, сколько раз Лира сбрасывала изменения
+на диск и сколько байт заголовков (журнала) записала
+
+Запуск из корня репозитория:
+  python -m bench.lira_writer [changes] [delay]
+"""
+import datetime as dt
+import os
+import sys
+import tempfile
+import time
+
+from threading import Thread
+
+from bench.lira_codec import sample
+from bench.lira_indexes import DictRepo
+from src.utils.lira import Lira
+from src.utils.lira_writer import LiraWriter
+
+
+class ActionRepo(DictRepo):
+  def keyByValue(self, value):
+    return value['id']
+
+
+def run(n, delay):
+  path = tempfile.mkdtemp()
+  lira = Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr'))
+  lira.put_many([sample('action', i) for i in range(100)], cat='action')
+  lira.flush()
+  writer = None if delay is None else LiraWriter(lira, delay=delay)
+  repo = ActionRepo(lira, 'action', writer=writer)
+  before = lira.commitStats()
+
+  def changes(k):
+    for i in range(k, n, 4):
+      action = repo.find(i % 100)
+      action['last_update'] += dt.timedelta(seconds=1)
+      repo._onValueChanged(action)
+
+  threads = [Thread(target=changes, args=(k,)) for k in range(4)]
+  start = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  elapsed = time.perf_counter() - start
+  repo.sync()
+  if writer is not None:
+    writer.close()
+  after = lira.commitStats()
+  result = elapsed / n * 1e6, after['commits'] - before['commits'], (after['bytes'] - before['bytes']) / 1024
+  lira.close()
+  return result
+
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+  delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+  print(f'{"":>14}{"us/change":>12}{"flushes":>10}{"head KiB":>10}')
+  for name, d in (('immediate', None), ('write-behind', delay)):
+    us, flushes, kib = run(n, d)
+    print(f'{name:>14}{us:12.1f}{flushes:10}{kib:10.0f}')
+
+
+if __name__ == '__main__':
+  main()
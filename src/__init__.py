@@ -6,6 +6,7 @@ from src.domain.locator import glob
 from src.utils.tg.tg_destination import TgDestination
 from src.entities.event.event import Event
 from src.entities.message_maker.message_maker import get_event_line
+from src.utils.lira_stats import format_stats
 from src.utils.repeater import Repeater, Period, PeriodRepeater
 
 
@@ -17,13 +18,11 @@ config = locator.config()
 
 
 def clear_category(cat: str):
-  for id in lira[cat]:
-    lira.pop(id)
+  lira.out_many(lira[cat])
   lira.flush()
 
 def set_password():
-  for id in lira['timesheet']:
-    tm = lira.get(id)
+  for id, tm in lira.scan_cat('timesheet'):
     tm['password'] = 'a6vbd3dks'
     lira.put(tm, id=id, cat='timesheet')
   lira.flush()
@@ -48,18 +47,47 @@ def set_value(value, id, cat):
     lira.flush()
     
 def print_events():
-  for lira_id in lira['event']:
-    event = lira.get(id=lira_id)
+  for lira_id, event in lira.scan_cat('event'):
     if isinstance(event['place'].name, datetime.datetime):
       print(event['id'], event['desc'], event['place'].name)
     
 def remove_events():
-  for lira_id in lira['event']:
-    event = lira(lira_id)
+  for lira_id, event in lira.scan_cat('event'):
     if isinstance(event['place'].name, datetime.datetime):
       lira.out(lira_id)
   lira.flush()
     
+def backup_lira(path: str = 'lira_backup', incremental: bool = True):
+  print(lira.snapshot(path, incremental=incremental))
+
+def migrate_lira(engine: str):
+  """
+  Перенести текущее хранилище (выбранное в конфиге) в хранилище другого движка: 'sqlite' — lira/lira.db,
+  'sharded' — по категориям в lira/shards (группы категорий — lira_shard_groups), 'lira' — lira/data.lr
+  и lira/head.lr; после переноса движок нужно поменять в конфиге (lira_engine)
+  """
+  from src.utils.lira import Lira
+  from src.utils.lira_sharded import ShardedLira
+  from src.utils.lira_sqlite import SqliteLira, migrate
+  if engine == 'sqlite':
+    target = SqliteLira('lira/lira.db')
+  elif engine == 'sharded':
+    target = ShardedLira('lira/shards', groups=config.liraShardGroups())
+  else:
+    target = Lira('lira/data.lr', 'lira/head.lr')
+  print(migrate(lira, target))
+  target.close()
+
+def print_lira_stats():
+  print(format_stats(lira.stats()))
+
+def make_lira_stats_dumper():
+  """Периодический вывод статистики Лиры в лог (раз в lira_stats_period секунд)"""
+  return Repeater(
+    action=lambda _: log.info('Lira stats:\n' + format_stats(lira.stats())),
+    period=config.liraStatsPeriod(),
+  )
+
 def print_lira_objs():
   for cat in lira.cats():
     print(cat)
@@ -99,6 +127,16 @@ def main():
   log.info('Bot Started!')
   autoupdate = make_autoupdate()
   autoupdate.start()
+  dumper = None
+  if config.liraStatsPeriod() is not None:
+    dumper = make_lira_stats_dumper()
+    dumper.start()
   tg.infinity_polling(none_stop=True, interval=0)
   locator.actionRepo().stopActions()
   autoupdate.stop()
+  if dumper is not None:
+    dumper.stop()
+    dumper.join()
+  if locator.liraWriter() is not None:
+    locator.liraWriter().close()
+  lira.close()
@@ -23,6 +23,51 @@ class Config:
   
   def locale(self) -> str:
     return self._paramOrNone('locale', str)
+  
+  def liraEngine(self) -> str:
+    return self._paramOrNone('lira_engine', str) or 'lira'
+  
+  def liraGroupCommit(self) -> float:
+    return self._paramOrNone('lira_group_commit', float)
+  
+  def liraCompactThreshold(self) -> float:
+    return self._paramOrNone('lira_compact_threshold', float)
+  
+  def liraMmap(self) -> bool:
+    return self._paramOrNone('lira_mmap', bool) or False
+  
+  def liraShared(self) -> bool:
+    return self._paramOrNone('lira_shared', bool) or False
+  
+  def liraShardGroups(self) -> {str: str}:
+    return self._paramOrNone('lira_shard_groups', dict) or {}
+  
+  def liraStats(self) -> bool:
+    return self._paramOrNone('lira_stats', bool) or self.liraStatsPeriod() is not None
+  
+  def liraStatsPeriod(self) -> float:
+    return self._paramOrNone('lira_stats_period', float)
+  
+  def liraCacheItems(self) -> int:
+    return self._paramOrNone('lira_cache_items', int)
+  
+  def liraCacheBytes(self) -> int:
+    return self._paramOrNone('lira_cache_bytes', int)
+  
+  def liraCachePinned(self) -> [str]:
+    return self._paramOrNone('lira_cache_pinned', list) or ['user', 'timesheet']
+  
+  def liraCodec(self) -> str:
+    return self._paramOrNone('lira_codec', str)
+  
+  def liraCompressThreshold(self) -> int:
+    return self._paramOrNone('lira_compress_threshold', int)
+  
+  def liraWriteDelay(self) -> float:
+    return self._paramOrNone('lira_write_delay', float)
+  
+  def liraWriteMaxDelay(self) -> float:
+    return self._paramOrNone('lira_write_max_delay', float)
 
   def _paramOrNone(self, name: str, tp):
     return Config._valueOrNone(self.data.get(name), tp)
@@ -11,6 +11,7 @@ class Locator:
     self._eventRepository = None
     self._flogger = None
     self._lira = None
+    self._liraWriter = None
     self._logger = None
     self._loggerStream = None
     self._messageMaker = None
@@ -68,10 +69,53 @@ class Locator:
   def lira(self):
     if self._lira is None:
       from src.utils.lira import Lira
+      from src.utils.lira_cache import LiraCache, LruPolicy, ByteBudgetPolicy
+      from src.utils.lira_codec import LiraCodec
+      from src.utils.lira_stats import LiraStats
       os.makedirs('lira', exist_ok=True)
-      self._lira = Lira('lira/data.lr', 'lira/head.lr')
+      config = self.config()
+      policy = None
+      if config.liraCacheBytes() is not None:
+        policy = ByteBudgetPolicy(config.liraCacheBytes())
+      elif config.liraCacheItems() is not None:
+        policy = LruPolicy(config.liraCacheItems())
+      cache = LiraCache(policy, pinned=config.liraCachePinned())
+      codec = LiraCodec(config.liraCodec(),
+                        compress_threshold=config.liraCompressThreshold())
+      stats = LiraStats() if config.liraStats() else None
+      if config.liraEngine() == 'sqlite':
+        from src.utils.lira_sqlite import SqliteLira
+        self._lira = SqliteLira('lira/lira.db', cache=cache, codec=codec)
+      elif config.liraEngine() == 'sharded':
+        from src.utils.lira_sharded import ShardedLira
+        self._lira = ShardedLira('lira/shards',
+                                 groups=config.liraShardGroups(),
+                                 cache=cache,
+                                 codec=codec,
+                                 group_commit=config.liraGroupCommit(),
+                                 compact_threshold=config.liraCompactThreshold(),
+                                 mmap=config.liraMmap(),
+                                 stats=stats)
+      else:
+        self._lira = Lira('lira/data.lr', 'lira/head.lr',
+                          group_commit=config.liraGroupCommit(),
+                          compact_threshold=config.liraCompactThreshold(),
+                          mmap=config.liraMmap(),
+                          cache=cache,
+                          codec=codec,
+                          shared=config.liraShared(),
+                          stats=stats)
     return self._lira
   
+  def liraWriter(self):
+    if self._liraWriter is None and self.config().liraWriteDelay() is not None:
+      from src.utils.lira_writer import LiraWriter
+      self._liraWriter = LiraWriter(self.lira(),
+                                    delay=self.config().liraWriteDelay(),
+                                    max_delay=self.config().liraWriteMaxDelay(),
+                                    logger=self.logger())
+    return self._liraWriter
+  
   def logger(self):
     if self._logger is None:
       import logging
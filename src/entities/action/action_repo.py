@@ -2,7 +2,7 @@ from typing import Callable, Any, Optional
 
 from src.domain.locator import Locator
 from src.entities.action.action import Action, serialize_action, deserialize_action
-from src.utils.lira_repo import LiraRepo
+from src.utils.lira_repo import LiraRepo, LiraIndex
 
 
 T = Action
@@ -10,8 +10,10 @@ Key = int
 
 
 class ActionRepo(LiraRepo):
+  INDEXES = {'type': LiraIndex(lambda a: a.type)}
+
   def __init__(self, locator: Locator):
-    super().__init__(locator.lira(), lira_cat='action')
+    super().__init__(locator.lira(), lira_cat='action', writer=locator.liraWriter())
     self.executor = locator.actionExecutor()
     self.actionIsStarted = False
     self.repeaters = []
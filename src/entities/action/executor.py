@@ -60,3 +60,4 @@ class ActionExecutor(LocatorStorage):
       action.translationId = tr.id
     logger.info(f'auto post to {action.chat.chatId} success')
     action.notify()
+    self.locator.actionRepo().sync()
@@ -38,15 +38,20 @@ class Destination(Notifier, Serializable):
 
   def deserialize(self, serialized: {str: Any}):
     self.id = serialized['id']
-    self.chat = serialized['chat']
-    if isinstance(self.chat, int) or isinstance(self.chat, str):
-      self.chat = TgDestination(chat_id=self.chat)
-    elif isinstance(self.chat, TgChat):
-      self.chat = TgDestination(chat_id=self.chat.chatId,
-                                message_to_replay_id=self.chat.topicId,
-                                translate_to_message_id=self.chat.messageId)
+    self.chat = Destination.chatFromSerialized(serialized['chat'])
     self.sets = DestinationSettings(serialized=serialized['sets'])
     
+  @staticmethod
+  def chatFromSerialized(chat) -> TgDestination:
+    """Чат из сериализованного места назначения (в старых записях — chat id или TgChat)"""
+    if isinstance(chat, int) or isinstance(chat, str):
+      return TgDestination(chat_id=chat)
+    if isinstance(chat, TgChat):
+      return TgDestination(chat_id=chat.chatId,
+                           message_to_replay_id=chat.topicId,
+                           translate_to_message_id=chat.messageId)
+    return chat
+
   def getUrl(self, message_id: int = None):
     chat = copy(self.chat)
     chat.translateToMessageId = message_id
@@ -1,9 +1,10 @@
+from types import SimpleNamespace
 from typing import Callable, Any
 
 from src.domain.locator import Locator
 from src.utils.tg.tg_destination import TgDestination
 from src.entities.destination.destination import Destination
-from src.utils.lira_repo import LiraRepo
+from src.utils.lira_repo import LiraRepo, LiraIndex
 
 
 T = Destination
@@ -11,8 +12,11 @@ Key = int
 
 
 class DestinationRepo(LiraRepo):
+  INDEXES = {'chat_id': LiraIndex(lambda d: d.chat.chatId, unique=True)}
+  LAZY = True
+
   def __init__(self, locator: Locator):
-    super().__init__(locator.lira(), lira_cat='destination')
+    super().__init__(locator.lira(), lira_cat='destination', writer=locator.liraWriter())
 
   def valueToSerialized(self, value: T) -> {str: Any}:
     return value.serialize()
@@ -25,9 +29,16 @@ class DestinationRepo(LiraRepo):
 
   def keyByValue(self, value: T) -> Key:
     return value.id
+
+  def keyBySerialized(self, serialized: {str: Any}) -> Key:
+    return serialized['id']
+
+  def projectSerialized(self, serialized: {str: Any}) -> SimpleNamespace:
+    # без настроек (sets)
+    return SimpleNamespace(id=serialized['id'], chat=Destination.chatFromSerialized(serialized['chat']))
     
   def findByChatId(self, chatId) -> Destination:
-    destination = self.findIf(lambda d: d.chat.chatId == chatId)
+    destination = self.findBy('chat_id', chatId)
     if destination is not None:
       return destination
     return self.put(Destination(
@@ -1,17 +1,22 @@
+from types import SimpleNamespace
 from typing import Callable, Any
 
 from src.domain.locator import Locator
 from src.entities.event.event import Event
-from src.utils.lira_repo import LiraRepo
+from src.utils.lira_repo import LiraIndex, LiraRepo
 
 
 T = Event
 Key = int
+FIELDS = ('start', 'finish', 'place', 'url', 'desc', 'creator', 'id')
 
 
 class EventRepo(LiraRepo):
+  INDEXES = {'start': LiraIndex(lambda e: e.start, sorted=True)}
+  LAZY = True
+
   def __init__(self, locator: Locator):
-    super().__init__(locator.lira(), lira_cat='event')
+    super().__init__(locator.lira(), lira_cat='event', writer=locator.liraWriter())
 
   def valueToSerialized(self, value: T) -> {str: Any}:
     return value.serialize()
@@ -23,4 +28,11 @@ class EventRepo(LiraRepo):
     value.addListener(listener)
 
   def keyByValue(self, value: T) -> Key:
-    return value.id
\ No newline at end of file
+    return value.id
+
+  def keyBySerialized(self, serialized: {str: Any}) -> Key:
+    return serialized['id']
+
+  def projectSerialized(self, serialized: {str: Any}) -> SimpleNamespace:
+    # поля события без построения Event
+    return SimpleNamespace(**{field: serialized.get(field) for field in FIELDS})
@@ -1,4 +1,4 @@
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
 from src.domain.locator import LocatorStorage, Locator
 from src.entities.destination.settings import DestinationSettings
@@ -32,7 +32,7 @@ class Timesheet(Notifier, LocatorStorage, Serializable):
       self.password = password
       self.destinationSets = destination_sets or DestinationSettings()
       self.destinationSets.addListener(lambda s: self.notify())
-      self._events: {int: Callable} = dict()
+      self._events: {int: Optional[Callable]} = dict()
       self.places = []
       self.orgs = []
     
@@ -53,12 +53,8 @@ class Timesheet(Notifier, LocatorStorage, Serializable):
     self.password: str = serialized.get('password')
     self.destinationSets = DestinationSettings(serialized=serialized.get('destination_sets'))
     self.destinationSets.addListener(lambda s: self.notify())
-    events = [self.eventRepo.find(id) for id in serialized['events']]
-    self._events = {
-      event.id: event.addListener(lambda e: self.notify())
-      for event in events
-      if event is not None
-    }
+    # события строятся (и слушаются) при первом обращении к ним через events
+    self._events = {id: None for id in serialized['events']}
     self.places = serialized.get('places') or []
     self.orgs = serialized.get('orgs') or []
 
@@ -69,14 +65,21 @@ class Timesheet(Notifier, LocatorStorage, Serializable):
     self.notify()
   
   def removeEvent(self, id: int) -> bool:
-    if self._events.get(id) is None:
+    if id not in self._events:
       return False
-    self._events.pop(id)
-    self.eventRepo.remove(id)
-    self.notify()
+    with self.eventRepo.batch():
+      self._events.pop(id)
+      self.eventRepo.remove(id)
+      self.notify()
     return True
 
   def events(self, predicat = lambda _: True) -> [Event]:
-    events = [self.eventRepo.find(id) for id, _ in self._events.items()]
-    events = [e for e in events if e is not None and predicat(e)]
-    return events
+    """
+    События расписания, удовлетворяющие предикату, в порядке начала; ещё не построенные события читаются
+    из репозитория одной пачкой, и расписание начинает слушать их изменения
+    """
+    events = self.eventRepo.query().whereIn('key', self._events).orderBy('start').all()
+    for event in events:
+      if event.id in self._events and self._events[event.id] is None:
+        self._events[event.id] = event.addListener(lambda e: self.notify())
+    return [event for event in events if predicat(event)]
@@ -2,7 +2,7 @@ from typing import Callable, Any
 
 from src.domain.locator import Locator, LocatorStorage
 from src.entities.timesheet.timesheet import Timesheet
-from src.utils.lira_repo import LiraRepo
+from src.utils.lira_repo import LiraRepo, LiraIndex
 
 
 T = Timesheet
@@ -10,9 +10,11 @@ Key = int
 
 
 class TimesheetRepo(LiraRepo, LocatorStorage):
+  INDEXES = {'name': LiraIndex(lambda t: t.name, unique=True)}
+
   def __init__(self, locator: Locator):
     LocatorStorage.__init__(self, locator)
-    LiraRepo.__init__(self, self.locator.lira(), lira_cat='timesheet')
+    LiraRepo.__init__(self, self.locator.lira(), lira_cat='timesheet', writer=self.locator.liraWriter())
 
   def valueToSerialized(self, value: T) -> {str: Any}:
     return value.serialize()
@@ -27,4 +29,4 @@ class TimesheetRepo(LiraRepo, LocatorStorage):
     return value.id
 
   def findByName(self, name: str):
-    return self.findIf(lambda t: t.name == name)
+    return self.findBy('name', name)
@@ -2,7 +2,7 @@ from typing import Callable, Any, Optional, List
 
 from src.domain.locator import Locator, LocatorStorage
 from src.entities.translation.translation import Translation
-from src.utils.lira_repo import LiraRepo
+from src.utils.lira_repo import LiraRepo, LiraIndex
 
 
 T = Translation
@@ -11,9 +11,15 @@ Key = int
 
 
 class TranslationRepo(LocatorStorage, LiraRepo):
+  INDEXES = {
+    'timesheet': LiraIndex(lambda tr: tr.timesheetId),
+    'message': LiraIndex(lambda tr: (None if tr.destination is None else
+                                     (tr.destination.chat.chatId, tr.messageId))),
+  }
+
   def __init__(self, locator: Locator):
     LocatorStorage.__init__(self, locator)
-    LiraRepo.__init__(self, self.locator.lira(), lira_cat='translation')
+    LiraRepo.__init__(self, self.locator.lira(), lira_cat='translation', writer=self.locator.liraWriter())
     for tr in [tr for _, tr in self.values.values()]:
       tr.connect()
 
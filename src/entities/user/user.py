@@ -327,8 +327,7 @@ class User(Notifier, TgState, Serializable, LocatorStorage):
     self.terminateSubstate()
     if not self._checkTimesheet():
       return
-    events = sorted(list(self.findTimesheet().events()),
-                    key=lambda e: e.start)
+    events = self.findTimesheet().events()
     if len(events) == 0:
       self.send('Пусто :(', emoji='fail')
     else:
@@ -353,8 +352,9 @@ class User(Notifier, TgState, Serializable, LocatorStorage):
       return
     
     def on_field_entered(data):
-      self.findTimesheet().removeEvent(id=data.id)
-      self.eventRepo.remove(data.id)
+      with self.eventRepo.batch():
+        self.findTimesheet().removeEvent(id=data.id)
+        self.eventRepo.remove(data.id)
       self.send('Мероприятие успешно удалено', emoji='ok')
       self.resetTgState()
 
@@ -874,7 +874,7 @@ class User(Notifier, TgState, Serializable, LocatorStorage):
     if not self._checkTimesheet():
       return
     timesheet_id = self.findTimesheet().id
-    trs = self.translationRepo.findAll(lambda tr: tr.timesheetId == timesheet_id)
+    trs = self.translationRepo.findBy('timesheet', timesheet_id)
     if len(trs) == 0:
       self.send('А никого :(', emoji='fail')
     else:
@@ -884,11 +884,8 @@ class User(Notifier, TgState, Serializable, LocatorStorage):
       
   def handleRemoveTranslation(self):
     def on_field_entered(data):
-      tr = self.translationRepo.findIf(
-        lambda t: (t.timesheetId == self.timesheetId and
-                   t.destination.chat.chatId == data[0] and
-                   t.messageId == data[1])
-      )
+      tr = next((t for t in self.translationRepo.findBy('message', (data[0], data[1]))
+                 if t.timesheetId == self.timesheetId), None)
       if tr is None:
         self.send('Не найдено трансляции в данное сообщение :(', emoji='fail')
       else:
@@ -965,8 +962,7 @@ class User(Notifier, TgState, Serializable, LocatorStorage):
     ))
 
   def handleShowAutoposts(self):
-    autoposts = self.actionRepo.findAll(lambda a: a.type == Action.TG_AUTO_FORWARD)
-    autoposts.sort(key=lambda p: p.id)
+    autoposts = self.actionRepo.query().where('type', Action.TG_AUTO_FORWARD).orderBy('id').all()
     if len(autoposts) == 0:
       self.send('А никого :(', emoji='fail')
       return
@@ -1,3 +1,4 @@
+from types import SimpleNamespace
 from typing import Callable, Any
 
 from src.domain.locator import Locator, LocatorStorage
@@ -8,9 +9,11 @@ T = User
 Key = int
 
 class UserRepo(LocatorStorage, LiraRepo):
+  LAZY = True
+
   def __init__(self, locator: Locator):
     LocatorStorage.__init__(self, locator)
-    LiraRepo.__init__(self, self.locator.lira(), lira_cat='user')
+    LiraRepo.__init__(self, self.locator.lira(), lira_cat='user', writer=self.locator.liraWriter())
     
   def valueToSerialized(self, value: T) -> {str: Any}:
     return value.serialize()
@@ -24,5 +27,14 @@ class UserRepo(LocatorStorage, LiraRepo):
   def keyByValue(self, value: T) -> Key:
     return value.chat
 
+  def keyBySerialized(self, serialized: {str: Any}) -> Key:
+    return serialized['chat']
+
+  def projectSerialized(self, serialized: {str: Any}) -> SimpleNamespace:
+    # без поиска места назначения пользователя (destination) — только его id
+    return SimpleNamespace(chat=serialized['chat'],
+                           timesheetId=serialized.get('timesheet_id'),
+                           destinationId=serialized.get('destination_id'))
+
   def find(self, key: Key, **kwargs) -> T:
     return super().find(key, lambda chat: User(self.locator, chat=chat))
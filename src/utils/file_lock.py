@@ -0,0 +1,31 @@
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+
+class FileLock:
+  """
+  Межпроцессная рекомендательная блокировка (flock) на отдельном файле:
+  разделяемая — для читателей, монопольная — для писателя. Блокировка
+  принадлежит открытому файлу, поэтому внутри процесса её нужно
+  дополнительно защищать обычными блокировками. Доступна только там,
+  где есть fcntl
+  """
+
+  def __init__(self, path: str):
+    if fcntl is None:
+      raise OSError('inter-process locking requires fcntl')
+    self._file = open(path, 'a+b')
+
+
+  def acquire(self, shared: bool = False):
+    """Захватить блокировку (ждёт, пока её не отпустят другие процессы)"""
+    fcntl.flock(self._file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+  def release(self):
+    """Отпустить блокировку"""
+    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+  def close(self):
+    self._file.close()
@@ -2,9 +2,22 @@
 # author:  felix
 # created: 2021.03.01 01:04:18
 #
+import mmap
+import os
 import pickle
+import time
 
-from threading import Lock
+from contextlib import contextmanager
+from threading import Condition, Lock, RLock, Thread, local
+
+from src.utils.lira_cache import LiraCache
+from src.utils.lira_codec import LiraCodec
+from src.utils.lira_extents import FreeExtents
+from src.utils.lira_record import (DEAD, HEAD, MAGIC, frame, has_id, pack_batch, pack_ids, read_batches,
+                                   read_index, record_info, scan, unframe, unpack_ids, write_index)
+from src.utils.lira_stats import TimedLock
+from src.utils.file_lock import FileLock
+from src.utils.rwlock import RWLock
 
 
 class Lira:
@@ -13,16 +26,29 @@ class Lira:
   синхронизации объектов в оперативной памяти и на
   жёстком диске. Потокобезопасна, т.е. можно
   пользоваться из разных потоков одновременно, не
-  прибегая к блокировкам и мьютексам
+  прибегая к блокировкам и мьютексам. Чтения (get,
+  cat, id, индексация по категории) друг друга не
+  ждут, монопольно выполняются только изменения
 
   Важно! Лира не записывает заголовки автоматически,
   это нужно делать вручную с помощью метода flush.
+  При этом flush не переписывает файл заголовков
+  целиком, а дописывает изменения в журнал (файл
+  заголовков с суффиксом .journal); когда журнал
+  становится больше файла заголовков, он сворачивается
+  в новый файл заголовков (контрольная точка). Файл
+  заголовков разбит на блоки по категориям: при
+  открытии читается только оглавление, а заголовки
+  категории — при первом обращении к ней
 
   Тоже важно! Если в Лиру был записан объект, а затем
   изменён, то в памяти останется тот, что был записан
   Лира не отслеживает изменения объектов поэтому,
   чтобы обновить объект, необходимо его перезаписать:
   lira.put(obj, id=lira.id(obj), cat=lira.cat(obj))
+  Если кэш объектов ограничен (см. LiraCache), то
+  неперезаписанные изменения могут пропасть и раньше:
+  при вытеснении объекта из кэша
 
 
   Примеры использования Лиры:
@@ -51,25 +77,137 @@ class Lira:
     print(id)
   """
 
-  def __init__(self, _data, _head):
+  FORMAT_VERSION = 5
+  JOURNAL_MIN_SIZE = 64 * 1024
+  ARENA_SIZE = 2**40  # хвостовой свободный участок в заголовках до версии 5
+  HOLE_FIT = 4
+  HOLE_SPLIT = 64 * 1024
+  PREALLOC_MIN = 1024 * 1024
+  PREALLOC_MAX = 64 * 1024 * 1024
+  COMPACT_MIN_SIZE = 1024 * 1024
+  COMPACT_STEP = 64
+  READ_GAP = 4096
+  IOV_MAX = 1024
+  READ_SPAN = 16 * 1024 * 1024
+  SNAPSHOT_RETRIES = 2
+
+  def __init__(self, _data, _head, *, group_commit=None, compact_threshold=None,
+               mmap=False, cache=None, codec=None, shared=False, stats=None):
     """
     При создании необходимо указать два аргумента:
     _data — имя файла для хранения самих объектов
     _head — и имя файла заголовков
+
+    group_commit — окно группового сброса в секундах;
+    если указано, то flush из разных потоков не пишет
+    журнал сам, а ждёт фонового потока, который раз
+    в окно сбрасывает все накопившиеся изменения одной
+    записью
+
+    compact_threshold — доля фрагментации (см.
+    fragmentation), при превышении которой после flush
+    в фоне запускается уплотнение файла данных
+
+    mmap — читать объекты, которых нет в памяти, не
+    через seek и read, а из отображённого в память файла
+    данных (отображение расширяется при росте файла и
+    пересоздаётся после уплотнения)
+
+    cache — кэш объектов в памяти (LiraCache); по
+    умолчанию неограниченный, т.е. в памяти остаются
+    все когда-либо прочитанные или записанные объекты
+
+    codec — кодирование объектов (LiraCodec); тег
+    кодека записывается в заголовок для каждого
+    объекта, поэтому объекты, записанные другими
+    кодеками или старыми версиями Лиры, читаются
+    как прежде
+
+    shared — с теми же файлами одновременно работают
+    несколько процессов (см. ниже); без этого второй
+    процесс, пишущий в ту же Лиру, испортит её. Нужен
+    модуль fcntl, т.е. только для unix
+
+    Совместный режим: изменения делает только тот
+    процесс, который держит монопольную блокировку
+    файла _head.lock; она берётся при первом изменении
+    (put, out и т.п.) и отпускается после flush, так
+    что между изменением и flush другие процессы ждут.
+    Перед тем как изменять, процесс дочитывает чужие
+    изменения из журнала. Читатели же проверяют, не
+    изменился ли журнал (по inode и размеру, т.е. одним
+    stat), и если изменился — дочитывают из него только
+    новые пакеты, а если журнал сменился (поколение
+    заголовков выросло после чужой контрольной точки) —
+    перечитывают оглавление заголовков. Объекты, которых
+    нет в памяти, читаются под разделяемой блокировкой
+
+    stats — счётчики и гистограммы (LiraStats), которые
+    Лира пополняет при работе (см. stats); по умолчанию
+    не собираются
     """
-    self.__dict__['_fpls'] = { (0, 2**40) }
+    self.__dict__['_fpls'] = FreeExtents()
+    self.__dict__['_tail'] = 0
+    self.__dict__['_alloc'] = 0
     self.__dict__['_objs'] = dict()
-    self.__dict__['_objv'] = dict()
+    self.__dict__['_objv'] = LiraCache() if cache is None else cache
     self.__dict__['_cats'] = dict()
+    self.__dict__['_lazy'] = dict()
+    self.__dict__['_lzid'] = dict()  # {категория: массив id или None} для непрочитанных категорий
+    self.__dict__['_lzlk'] = Lock()
     self.__dict__['_mnid'] = -1
-    self.__dict__['_lock'] = Lock()
+    self.__dict__['_st'] = stats
+    self.__dict__['_lock'] = RWLock() if stats is None else TimedLock(RWLock(), stats)
+    self.__dict__['_mlock'] = Lock()
     self.__dict__['_chng'] = False
+    self.__dict__['_jrnl'] = []
+    self.__dict__['_jgen'] = 0
+    self.__dict__['_jfile'] = None
+    self.__dict__['_jbase'] = 0
+    self.__dict__['_hsize'] = 0
+    self.__dict__['_txlk'] = RLock()
+    self.__dict__['_txdp'] = local()
+    self.__dict__['_stat'] = {
+      'commits': 0,
+      'checkpoints': 0,
+      'bytes': 0,
+      'latency_total': 0.0,
+      'latency_max': 0.0,
+    }
+    self.__dict__['_gcwnd'] = group_commit
+    self.__dict__['_gccnd'] = Condition()
+    self.__dict__['_gcreq'] = 0
+    self.__dict__['_gcdone'] = 0
+    self.__dict__['_gcthr'] = None
+    self.__dict__['_live'] = 0
+    self.__dict__['_cmpth'] = compact_threshold
+    self.__dict__['_cmpthr'] = None
+    self.__dict__['_mmode'] = mmap
+    self.__dict__['_mmap'] = None
+    self.__dict__['_codec'] = LiraCodec() if codec is None else codec
+    self.__dict__['_seq'] = 0
+    self.__dict__['_snap'] = 0
+    self.__dict__['_shold'] = 0  # снимков, держащих межпроцессную блокировку всё копирование
+    self.__dict__['_dfrd'] = []
+    self.__dict__['_pend'] = []
+    self.__dict__['_hfile'] = None
+    self.__dict__['_held'] = False
+    self.__dict__['_jpos'] = 0
+    self.__dict__['_seen'] = None
+    self.__dict__['_slk'] = Lock()
+    self.__dict__['_rdrs'] = 0
+    self.__dict__['_flock'] = FileLock(_head + '.lock') if shared else None
     try:
       self.__dict__['_data'] = open(_data, 'rb+')
     except:
       self.__dict__['_data'] = open(_data, 'wb+')
     self.__dict__['_head'] = _head
+    self.__dict__['_jpath'] = _head + '.journal'
+    self.__dict__['_alloc'] = self._data.seek(0, 2)
     self.read_head()
+    if group_commit is not None:
+      self.__dict__['_gcthr'] = Thread(target=self._groupCommitter, daemon=True)
+      self._gcthr.start()
     return
 
 
@@ -79,15 +217,267 @@ class Lira:
     Если с предыдущего раза Лира изменилась, то
     все объекты, которые были записаны в файл данных
     извлекаются из буффера и переносятся непосредственно
-    в файл, а также перезаписывается файл заголовков
+    в файл, а изменения заголовков дописываются в журнал.
+    Внутри транзакции ничего не делает: изменения будут
+    записаны при выходе из самой внешней транзакции
     """
-    if not self._chng:
+    if getattr(self._txdp, 'depth', 0) > 0:
       return
-    self._data.flush()
-    self.write_head()
-    self.__dict__['_chng'] = False
+    if self._gcthr is not None:
+      self._groupFlush()
+    else:
+      self._flushNow()
+    return
+
+  @contextmanager
+  def transaction(self):
+    """
+    Контекст, внутри которого flush откладывается до
+    выхода из самой внешней транзакции; все изменения
+    транзакции попадают в журнал одной записью, т.е.
+    после сбоя восстанавливаются либо все, либо ни
+    одного. Пока транзакция открыта, flush из других
+    потоков ждёт её завершения. Откатить изменения
+    нельзя: при исключении сделанное всё равно
+    записывается
+
+    with lira.transaction():
+      lira.out(old_id)
+      lira.put(obj, cat='cat')
+    """
+    with self._txlk:
+      self._txdp.depth = getattr(self._txdp, 'depth', 0) + 1
+      try:
+        yield self
+      finally:
+        self._txdp.depth -= 1
+        if self._txdp.depth == 0:
+          self._flushNow()
+
+  def commitStats(self):
+    """
+    Счётчики записи заголовков: число сбросов журнала
+    (commits), контрольных точек (checkpoints), записанных
+    байт (bytes), суммарная и максимальная задержка
+    сброса в секундах (latency_total, latency_max)
+    """
+    with self._lock.read():
+      return dict(self._stat)
+
+  def cacheStats(self):
+    """
+    Статистика кэша объектов: попадания (hits), промахи
+    (misses), вытеснения (evictions), число объектов
+    в памяти (items, из них закреплённых pinned) и их
+    размер в файле данных (bytes)
+    """
+    with self._lock.read():
+      return self._objv.stats()
+
+  def close(self):
+    """
+    Сбрасывает изменения, останавливает поток группового
+    сброса, сворачивает журнал в контрольную точку (чтобы
+    следующее открытие не читало все заголовки) и
+    закрывает файлы; после этого Лирой пользоваться
+    нельзя
+    """
+    if self._gcthr is not None:
+      thread = self._gcthr
+      self.__dict__['_gcthr'] = None
+      with self._gccnd:
+        self._gccnd.notify_all()
+      thread.join()
+    self._flushNow()
+    with self._lock:
+      self._begin()
+      if self._jfile is not None and self._jfile.tell() > self._jbase:
+        self._checkpoint()
+      self._finish()
+      if self._jfile is not None:
+        self._jfile.close()
+        self.__dict__['_jfile'] = None
+      if self._hfile is not None:
+        self._hfile.close()
+        self.__dict__['_hfile'] = None
+      if self._flock is not None:
+        self._flock.close()
+      self._unmap()
+      self._data.close()
     return
 
+  def fragmentation(self):
+    """
+    Доля файла данных (до последнего живого объекта),
+    которую занимают дыры: 0 — файл плотный, близко
+    к 1 — почти весь файл пустой
+    """
+    with self._lock.read():
+      end = self._end()
+      return 0.0 if end == 0 else 1 - self._live / end
+
+  def arenaStats(self):
+    """
+    Размеры в файле данных, в байтах: живые объекты
+    (live), занятая часть файла — до конца последнего
+    объекта (used), весь файл вместе с заранее
+    выделенным местом (file), а также число дыр (holes)
+    и самая большая дыра (largest_hole)
+    """
+    with self._lock.read():
+      largest = self._fpls.largest()
+      return {
+        'live': self._live,
+        'used': self._tail,
+        'file': self._alloc,
+        'holes': len(self._fpls),
+        'largest_hole': 0 if largest is None else largest[1],
+      }
+
+  def stats(self):
+    """
+    Снимок всей статистики: commits (commitStats), cache
+    (cacheStats и доля попаданий hit_rate), arena
+    (arenaStats и fragmentation), files — размеры файлов
+    данных, заголовков и журнала в байтах; если Лира
+    создана с stats=LiraStats(), то ещё и ops, bytes
+    и timings (см. LiraStats.snapshot)
+    """
+    cache = self.cacheStats()
+    requests = cache['hits'] + cache['misses']
+    cache['hit_rate'] = cache['hits'] / requests if requests > 0 else 0.0
+    arena = self.arenaStats()
+    arena['fragmentation'] = self.fragmentation()
+    with self._lock.read():
+      files = {
+        'data': self._alloc,
+        'head': self._hsize,
+        'journal': 0 if self._jfile is None else self._jfile.tell(),
+      }
+    stats = {'commits': self.commitStats(), 'cache': cache, 'arena': arena, 'files': files}
+    if self._st is not None:
+      stats.update(self._st.snapshot())
+    return stats
+
+  def compact(self):
+    """
+    Уплотнение файла данных. Сначала самые дальние от
+    начала файла объекты переносятся в подходящие дыры
+    ближе к началу, затем оставшиеся объекты сдвигаются
+    к началу вплотную друг к другу, после чего файл
+    заголовков переписывается, а файл данных обрезается.
+    Переносы выполняются небольшими порциями, между
+    которыми Лира не заблокирована, поэтому get и put
+    во время уплотнения работают. Каждый перенос
+    фиксируется в журнале (а сдвиг внахлёст — вместе
+    с содержимым объекта и до его записи), так что сбой
+    посреди уплотнения ничего не портит
+
+    :return: на сколько байт уменьшился файл данных
+    """
+    with self._txlk:
+      self._data.flush()
+      with self._lock:
+        self._begin()
+        self._loadAll()
+        if self._jfile is None:
+          self._checkpoint()
+        before = self._end()
+        self._finish()
+
+    self._compactPass(self._fill, reverse=True)
+    self._compactPass(self._slide, reverse=False)
+
+    with self._txlk:
+      self._data.flush()
+      with self._lock:
+        self._begin()
+        self._checkpoint()
+        end = self._end()
+        self._unmap()
+        self._data.truncate(end)
+        self.__dict__['_alloc'] = end
+        self._finish()
+    return before - end
+
+  def snapshot(self, path, incremental=False):
+    """
+    Согласованная копия Лиры на момент вызова, которую
+    можно снимать, не останавливая работу. Изменения
+    ждут только копирования словарей заголовков; пока
+    объекты копируются, освобождённые участки файла
+    данных не отдаются под новые объекты, поэтому
+    копируемые объекты никто не перезапишет. Объекты
+    копируются по тем же смещениям, так что в каталоге
+    path получается готовая Лира (data.lr и head.lr),
+    а также manifest — список скопированных участков
+
+    incremental — если в path уже есть снимок с
+    манифестом, то копируются только участки, которые
+    изменились с тех пор (остальные уже на месте).
+    Пока снимок пишется, манифеста нет: прерванный
+    снимок неполон, и следующий будет полным
+
+    В совместном режиме межпроцессная блокировка тоже
+    держится только пока копируются словари заголовков.
+    Другие процессы о снимке не знают и могут занять
+    копируемые участки, поэтому каждая скопированная
+    запись проверяется: контрольная сумма, id и то, что
+    она записана до начала снимка. Если запись успели
+    перезаписать, снимок снимается заново как
+    инкрементальный поверх уже скопированного, а после
+    SNAPSHOT_RETRIES таких неудач — с блокировкой,
+    которая держится всё копирование, т.е. другие
+    процессы тогда ждут копирования. Объекты, записанные
+    до появления записей, проверить нельзя: если они
+    есть, снимок в конце концов снимается так же
+
+    :return: {'objects': число объектов в снимке,
+    'copied': сколько из них скопировано, 'bytes':
+    сколько байт скопировано}
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest = os.path.join(path, 'manifest')
+    base = {}
+    if incremental:
+      try:
+        with open(manifest, 'rb') as file:
+          base = pickle.load(file)['extents']
+      except Exception:
+        base = {}
+    if os.path.exists(manifest):
+      os.remove(manifest)
+
+    incremental = len(base) > 0
+    stat = {'objects': 0, 'copied': 0, 'bytes': 0}
+    attempt = 0
+    while True:
+      hold = self._flock is None or attempt >= Lira.SNAPSHOT_RETRIES
+      taken = self._snapTake(hold)
+      try:
+        extents, done = self._snapCopy(os.path.join(path, 'data.lr'), taken, base, not hold, stat)
+      finally:
+        self._snapDone(hold)
+      if done:
+        break
+      attempt += 1
+      base = extents
+
+    objs, cats, fpls, gen, info, _ = taken
+    stat['objects'] = len(objs)
+    Lira._write_head(os.path.join(path, 'head.lr'), info, fpls, Lira._blocks(objs, cats), Lira._idBlocks(cats))
+    with open(manifest + '.tmp', 'wb') as file:
+      pickle.dump({
+        'time': time.time(),
+        'gen': gen,
+        'incremental': incremental,
+        'extents': extents,
+      }, file)
+      file.flush()
+      os.fsync(file.fileno())
+    os.replace(manifest + '.tmp', manifest)
+    return stat
+
   def changed(self):
     """Проверяет, была ли Лира изменена"""
     return self.__dict__['_chng']
@@ -95,31 +485,58 @@ class Lira:
 
 
   def read_head(self, _head=None):
-    """Читает файл заголовков"""
+    """
+    Читает файл заголовков; если читается собственный
+    файл заголовков Лиры, то поверх него воспроизводится
+    журнал
+    """
     with self._lock:
-      if _head is None:
-        _head = self._head
+      own = _head is None or _head == self._head
+      hold = own and self._flock is not None and not self._held
+      if hold:
+        self._flock.acquire()
       try:
-        with open(_head, 'rb') as file:
-          self.__dict__['_fpls'] = pickle.load(file)
-          self.__dict__['_objs'] = pickle.load(file)
-          self.__dict__['_cats'] = pickle.load(file)
-        self.__dict__['_mnid'] = min(
-          filter(lambda x: isinstance(x, int), self._objs.keys())
-        ) - 1
-      except:
-        pass
+        self._readHead(_head, own)
+      finally:
+        if hold:
+          self._flock.release()
     return
 
+  def recover(self):
+    """
+    Восстанавливает заголовки по файлу данных: файл
+    последовательно просматривается, из целых (с верной
+    контрольной суммой) живых записей для каждого id
+    берётся самая поздняя, после чего пишется новая
+    контрольная точка. Вызывается автоматически при
+    открытии, если файла заголовков нет или он
+    повреждён, а файл данных не пуст. Объекты, записанные
+    до появления контрольных сумм, так восстановить
+    нельзя, поэтому после LiraMisplacedError recover
+    вызывается явно
+
+    :return: число восстановленных объектов
+    """
+    with self._txlk:
+      with self._lock:
+        self._begin()
+        self._recover()
+        self._finish()
+        return len(self._objs)
+
   def write_head(self, head=None):
-    """Пишет файл заголовков"""
+    """
+    Пишет файл заголовков; если не указано иное имя файла,
+    то это контрольная точка: файл заголовков атомарно
+    заменяется, а журнал начинается заново
+    """
     with self._lock:
+      self._begin()
       if head is None:
-        head = self._head
-      with open(head, 'wb') as file:
-        pickle.dump(self._fpls, file)
-        pickle.dump(self._objs, file)
-        pickle.dump(self._cats, file)
+        self._checkpoint()
+      else:
+        self._dump_head(head, self._jgen)
+      self._finish()
     return
 
   def cat(self, id):
@@ -127,34 +544,63 @@ class Lira:
     Возвращает категорию объекта с заданным id
     если такового нет, возбуждается KeyError
     """
-    with self._lock:
-      return self._objs[id][1]
+    entry = self._reading(lambda: self._find(id))
+    if entry is None:
+      raise KeyError(id)
+    return entry[1]
+
+  def meta(self, id):
+    """
+    Возвращает метаинформацию объекта с заданным id
+    если такового нет, возбуждается KeyError
+    """
+    entry = self._reading(lambda: self._find(id))
+    if entry is None:
+      raise KeyError(id)
+    return entry[2]
+
+  def metas(self, cat):
+    """
+    Список пар (id, метаинформация) всех объектов
+    категории в том же порядке, что и lira[cat]: то
+    же, что meta для каждого id, но под одной
+    блокировкой и без поиска по категориям
+    """
+    def metas():
+      self._load([cat])
+      return [(id, self._objs[id][2]) for id in self._cats.get(cat, [])]
+    return self._reading(metas)
 
   def id(self, obj):
     """
-    Возвращает id первого найденного в словаре
-    равного объекта объекту obj осторожно! —
-    если есть дублирующиеся объекты, будет выбран
-    первый попавшийся проверка идёт только среди
-    тех объектов, которые находятся в памети, т.е.
-    либо этот объект был записан в данной сессии,
-    либо получен. Если объект не найден, возвращается
-    None
+    Возвращает id объекта obj: ищется сам объект,
+    а если кэш создан с content_index=True, то и
+    объект с таким же содержимым (при дубликатах
+    будет выбран последний записанный). Поиск идёт
+    только среди тех объектов, которые находятся в
+    памяти, т.е. либо этот объект был записан или
+    получен в данной сессии и ещё не вытеснен из
+    кэша. Если объект не найден, возвращается None
     """
-    for id, val in self._objv.items():
-      if val == obj:
-        return id
-    return None
+    self._sync()
+    with self._lock.read():
+      return self._objv.find(obj)
 
 
 
   def cats(self):
-    """Итератор по всем категориям"""
-    return self._cats.keys()
+    """Список всех категорий"""
+    def cats():
+      lazy, cats = self._lazy, self._cats
+      return list(cats.keys()) + [cat for cat in lazy if cat not in cats]
+    return self._reading(cats)
 
   def __iter__(self):
     """Итератор по всем id"""
-    for key in self._objs.keys():
+    def keys():
+      self._loadAll()
+      return list(self._objs.keys())
+    for key in self._reading(keys):
       yield key
 
 
@@ -162,24 +608,45 @@ class Lira:
     """
     Получение объекта по id если такового
     нет, возвращается default (по умолчанию
-    None)
+    None). Если на месте объекта лежит запись
+    другого объекта (заголовки пережили сбой, а
+    файл данных — нет), возбуждается
+    LiraMisplacedError: чтение хранилище не
+    меняет, заголовки восстанавливает recover
     """
-    with self._lock:
-      obj = self._objv.get(id, None)
-      if obj is not None:
-        return obj
-
-      pl = self._objs.get(id, None)
+    self._sync()
+    obj = self._objv.get(id, None)
+    if obj is not None:
+      st = self._st
+      if st is not None:
+        entry = self._objs.get(id)
+        st.count('get', None if entry is None else entry[1])
+      return obj
+    def read():
+      pl = self._find(id)
       if pl is None:
         return default
-      pl = pl[0]
+      obj = self._read(pl, id)
+      st = self._st
+      if st is not None:
+        st.count('get', pl[1])
 
-      self._data.seek(pl[0], 0)
-      dump = self._data.read(pl[1])
-      obj = pickle.loads(dump)
+      self._objv.put(id, obj, pl[0][1], pl[1])
+      return obj
+    return self._reading(read)
 
-      self._objv[id] = obj
-    return obj
+  def cached(self, id, default=None):
+    """
+    Объект по id, если он есть в кэше в памяти, иначе
+    default; файлы при этом не читаются и блокировки
+    не берутся (в совместном режиме, если журнал
+    изменился, возвращается default). Промахом кэша
+    это не считается: за ним обычно следует get
+    """
+    if self._flock is not None and self._seen != self._jstat():
+      return default
+    obj = self._objv.probe(id, None)
+    return default if obj is None else obj
 
   def put(self, obj, *, id=None, cat=None, meta=None):
     """
@@ -193,8 +660,11 @@ class Lira:
     if id is not None:
       self.out(id)
     with self._lock:
+      self._begin()
       if id is None:
         id = self._nextid()
+      elif isinstance(id, int) and id <= self._mnid:
+        self.__dict__['_mnid'] = id - 1
       id = self._put(obj, id, cat, meta)
     return id
 
@@ -207,13 +677,8 @@ class Lira:
     """
     self.__dict__['_chng'] = True
     with self._lock:
-      obj = self._objs.pop(id, None)
-      if obj is None:
-        return None
-      self._objv.pop(id, None)
-
-      self._free(obj[0])
-      self._cats[obj[1]].remove(id)
+      self._begin()
+      self._out(id)
     return
 
   def pop(self, id, default=None):
@@ -222,6 +687,114 @@ class Lira:
     self.out(id)
     return val
 
+  def get_many(self, ids, default=None):
+    """
+    Получение сразу нескольких объектов: то же, что
+    get для каждого id, но блокировка берётся один
+    раз, а объекты, которых нет в памяти, читаются
+    в порядке расположения в файле данных, причём
+    близко лежащие — одним чтением
+
+    :return: список объектов в порядке ids (default
+    для отсутствующих)
+    """
+    ids = list(ids)
+    self._sync()
+    objs = [self._objv.get(id, None) for id in ids]
+    missed = [i for i, obj in enumerate(objs) if obj is None]
+    st = self._st
+    if st is not None:
+      for id, obj in zip(ids, objs):
+        entry = self._objs.get(id) if obj is not None else None
+        if entry is not None:
+          st.count('get', entry[1])
+    if len(missed) == 0:
+      return objs
+    self._reading(lambda: self._getMissed(ids, objs, missed, default))
+    return objs
+
+  def scan_cat(self, cat, where=None, batch=256):
+    """
+    Ленивый обход категории: генератор пар (id, объект)
+    в порядке расположения объектов в файле данных.
+    Объекты читаются порциями по batch штук и (если их
+    ещё нет в памяти) не кладутся в кэш, так что в
+    памяти одновременно находится не больше порции.
+    Во время обхода Лиру можно менять: объекты,
+    удалённые до чтения их порции, пропускаются,
+    перезаписанные — читаются в новом виде, каждый id
+    выдаётся не больше раза
+
+    :param where: условие на метаинформацию объекта;
+    объекты, для которых оно ложно, не читаются
+
+    :return: итератор по (id, объект)
+    """
+    def order():
+      self._load([cat])
+      return sorted(
+        (self._objs[id][0][0], id)
+        for id in self._cats.get(cat, ())
+        if where is None or where(self._objs[id][2])
+      )
+    order = self._reading(order)
+    for i in range(0, len(order), batch):
+      found, entries = [], []
+      def read():
+        for _, id in order[i:i + batch]:
+          entry = self._objs.get(id)
+          if entry is None or entry[1] != cat or where is not None and not where(entry[2]):
+            continue
+          obj = self._objv.get(id, None)
+          if obj is not None:
+            found.append((entry[0][0], id, obj))
+          else:
+            entries.append((entry, id))
+        entries.sort(key=lambda item: item[0][0][0])
+        for entry, id, obj in self._readMany(entries):
+          found.append((entry[0][0], id, obj))
+      self._reading(read)
+      st = self._st
+      if st is not None:
+        st.count('scan', cat, len(found))
+      found.sort(key=lambda item: item[0])
+      for _, id, obj in found:
+        yield id, obj
+
+  def put_many(self, objs, *, ids=None, cat=None, meta=None):
+    """
+    Запись сразу нескольких объектов одной категории:
+    то же, что put для каждого объекта, но под одной
+    блокировкой, в один непрерывный участок файла
+    данных и одной записью
+
+    :param ids: список id той же длины, что и objs
+    (None в списке или вместо списка — новый id)
+
+    :return: список id записанных объектов
+    """
+    objs = list(objs)
+    ids = [None] * len(objs) if ids is None else list(ids)
+    self.out_many([id for id in ids if id is not None])
+    with self._lock:
+      self._begin()
+      for i, id in enumerate(ids):
+        if id is None:
+          ids[i] = self._nextid()
+        elif isinstance(id, int) and id <= self._mnid:
+          self.__dict__['_mnid'] = id - 1
+      self._putMany(objs, ids, cat, meta)
+    return ids
+
+  def out_many(self, ids):
+    """Удаление сразу нескольких объектов под одной блокировкой"""
+    self.__dict__['_chng'] = True
+    with self._lock:
+      self._begin()
+      for id in ids:
+        self._out(id)
+    return
+
 
 
   def __call__(self, id, default=None):
@@ -248,64 +821,957 @@ class Lira:
     Через индексацию можно получить список
     всех id элементов данной категории
     """
-    with self._lock:
+    def ids():
+      self._load([item])
       return list(self._cats.get(item, []))
+    return self._reading(ids)
 
 
 
   def _put(self, obj, id, cat, meta):
     self.__dict__['_chng'] = True
-    dump = pickle.dumps(obj)
-    pl = self._malloc(len(dump))
+    dump, tag, record = self._frame(obj, id, cat, meta)
+    pl = self._malloc(len(record))
 
     self._data.seek(pl[0], 0)
-    self._data.write(dump)
+    self._data.write(record)
+    self._data.flush()
 
-    self._objs[id] = (pl, cat, meta)
-    self._objv[id] = obj
-    self._cats.setdefault(cat, set()).add(id)
+    self._place(obj, id, cat, meta, pl, dump, tag)
+    st = self._st
+    if st is not None:
+      st.count('put', cat)
+      st.written(len(record))
     return id
 
+  def _putMany(self, objs, ids, cat, meta):
+    self.__dict__['_chng'] = True
+    framed = [self._frame(obj, id, cat, meta) for obj, id in zip(objs, ids)]
+    records = [record for _, _, record in framed]
+    off = self._malloc(sum(len(record) for record in records))[0]
 
+    self._data.flush()
+    if hasattr(os, 'pwritev'):
+      pos = off
+      for i in range(0, len(records), Lira.IOV_MAX):
+        pos += os.pwritev(self._data.fileno(), records[i:i + Lira.IOV_MAX], pos)
+      self._data.flush()  # сбрасывает буфер чтения, в котором мог остаться прежний участок
+    else:
+      self._data.seek(off, 0)
+      self._data.write(b''.join(records))
+      self._data.flush()
+
+    for obj, id, (dump, tag, record) in zip(objs, ids, framed):
+      self._place(obj, id, cat, meta, (off, len(record)), dump, tag)
+      off += len(record)
+    st = self._st
+    if st is not None:
+      st.count('put', cat, len(records))
+      st.written(sum(len(record) for record in records))
+
+  def _frame(self, obj, id, cat, meta):
+    dump, tag = self._codec.encode(obj, cat)
+    self.__dict__['_seq'] = max(self._seq + 1, time.time_ns())
+    return dump, tag, frame(id, cat, meta, tag, self._seq, dump)
+
+  def _place(self, obj, id, cat, meta, pl, dump, tag):
+    if cat in self._lazy:
+      self._load([cat])
+    self._objs[id] = (pl, cat, meta) if tag is None else (pl, cat, meta, tag)
+    self._objv.put(id, obj, pl[1], cat, dump if tag is None else None)
+    self._cats.setdefault(cat, set()).add(id)
+    self._jrnl.append(('put', id) + self._objs[id])
+    self.__dict__['_live'] = self._live + pl[1]
 
-  def _free(self, pl):
-    self._fpls.add(pl)
-
-    l = r = None
-    for fpl in self._fpls:
-      if fpl[0] + fpl[1] == pl[0]:
-        l = fpl
-      elif pl[0] + pl[1] == fpl[0]:
-        r = fpl
-
-    if l is not None:
-      self._fpls.remove(l)
-      self._fpls.remove(pl)
-      pl = (l[0], l[1] + pl[1])
-      self._fpls.add(pl)
-
-    if r is not None:
-      self._fpls.remove(r)
-      self._fpls.remove(pl)
-      pl = (pl[0], pl[1] + r[1])
-      self._fpls.add(pl)
+  def _out(self, id):
+    if self._find(id) is None:
+      return
+    obj = self._objs.pop(id)
+    self._objv.pop(id, None)
+
+    self._bury(obj[0])
+    self._pend.append(obj[0])
+    self._cats[obj[1]].remove(id)
+    self._jrnl.append(('out', id))
+    self.__dict__['_live'] = self._live - obj[0][1]
+    st = self._st
+    if st is not None:
+      st.count('out', obj[1])
+
+
+
+  def _flushNow(self):
+    with self._txlk:
+      if not self._chng:
+        if self._held:
+          with self._lock:
+            self._finish()
+        return
+      start = time.perf_counter()
+      self._data.flush()
+      with self._lock:
+        self.__dict__['_chng'] = False
+        self._commit()
+        self._finish()
+        latency = time.perf_counter() - start
+        self._stat['commits'] += 1
+        self._stat['latency_total'] += latency
+        self._stat['latency_max'] = max(self._stat['latency_max'], latency)
+        st = self._st
+        if st is not None:
+          st.time('flush', latency)
+    self._autoCompact()
+
+  def _autoCompact(self):
+    """
+    Запускает уплотнение в фоне, если дыр стало больше
+    порога; проверка и запоминание потока — под
+    блокировкой на запись, чтобы два потока, одновременно
+    перешедшие порог, не запустили два уплотнения
+    """
+    if self._cmpth is None or self._cmpthr is not None:
+      return
+    def compact():
+      try:
+        self.compact()
+      finally:
+        with self._lock:
+          self.__dict__['_cmpthr'] = None
+    with self._lock:
+      if (self._cmpthr is not None or self._end() < Lira.COMPACT_MIN_SIZE or
+          1 - self._live / self._end() <= self._cmpth):
+        return
+      thread = Thread(target=compact, daemon=True)
+      self.__dict__['_cmpthr'] = thread
+    thread.start()
+
+  def _read(self, obj, id):
+    pl, cat = obj[0], obj[1]
+    tag = obj[3] if len(obj) > 3 else None
+    if not self._mmode:
+      return self._codec.decode(unframe(self._pread(pl), id), tag, cat)
+
+    mm = self._mmap
+    if mm is None or len(mm) < pl[0] + pl[1]:
+      with self._mlock:
+        mm = self._mmap
+        if mm is None or len(mm) < pl[0] + pl[1]:
+          mm = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+          self.__dict__['_mmap'] = mm
+    st = self._st
+    if st is not None:
+      st.read(pl[1])
+    with memoryview(mm)[pl[0]:pl[0] + pl[1]] as dump:
+      return self._codec.decode(unframe(dump, id), tag, cat)
+
+  def _readMany(self, entries, idOf=None):
+    """
+    Читает объекты entries [(заголовок, что угодно)],
+    упорядоченные по смещению: соседние участки,
+    между которыми не больше READ_GAP байт, читаются
+    одним вызовом (но не больше READ_SPAN байт за раз)
 
+    :param idOf: id объекта по «чему угодно» (по
+    умолчанию «что угодно» и есть id)
+
+    :return: итератор по (заголовок, что угодно, объект)
+    """
+    if idOf is None:
+      idOf = lambda key: key
+    if self._mmode:
+      for entry, key in entries:
+        yield entry, key, self._read(entry, idOf(key))
+      return
+    i = 0
+    while i < len(entries):
+      start = entries[i][0][0][0]
+      j, end = i, start
+      while j < len(entries):
+        pl = entries[j][0][0]
+        if pl[0] - end > Lira.READ_GAP or pl[0] + pl[1] - start > Lira.READ_SPAN and j > i:
+          break
+        end = max(end, pl[0] + pl[1])
+        j += 1
+      dump = memoryview(self._pread((start, end - start)))
+      for entry, key in entries[i:j]:
+        pl = entry[0]
+        tag = entry[3] if len(entry) > 3 else None
+        yield entry, key, self._codec.decode(
+          unframe(dump[pl[0] - start:pl[0] - start + pl[1]], idOf(key)), tag, entry[1]
+        )
+      i = j
+
+  def _getMissed(self, ids, objs, missed, default):
+    entries = []
+    for i in missed:
+      entry = self._find(ids[i])
+      if entry is None:
+        objs[i] = default
+      else:
+        entries.append((entry, i))
+    entries.sort(key=lambda item: item[0][0][0])
+    st = self._st
+    for entry, i, obj in self._readMany(entries, ids.__getitem__):
+      objs[i] = obj
+      self._objv.put(ids[i], obj, entry[0][1], entry[1])
+      if st is not None:
+        st.count('get', entry[1])
+
+  def _pread(self, pl):
+    st = self._st
+    if st is not None:
+      st.read(pl[1])
+    if hasattr(os, 'pread'):
+      return os.pread(self._data.fileno(), pl[1], pl[0])
+    with self._mlock:
+      self._data.seek(pl[0], 0)
+      return self._data.read(pl[1])
+
+  def _recover(self):
+    self._data.flush()
+    found = sorted(scan(self._data), key=lambda f: f[2][4], reverse=True)
+    self.__dict__['_fpls'] = FreeExtents()
+    self.__dict__['_tail'] = 0
+    self.__dict__['_pend'] = []
+    objs, cats = dict(), dict()
+    for off, size, (id, cat, meta, tag, seq) in found:
+      if id in objs:
+        continue
+      try:
+        self._claim((off, size))
+      except KeyError:
+        continue
+      objs[id] = ((off, size), cat, meta) if tag is None else ((off, size), cat, meta, tag)
+      cats.setdefault(cat, set()).add(id)
+
+    self.__dict__['_objs'] = objs
+    self.__dict__['_cats'] = cats
+    self.__dict__['_lazy'] = dict()
+    self.__dict__['_lzid'] = dict()
+    self.__dict__['_seq'] = max([self._seq] + [f[2][4] for f in found])
+    self.__dict__['_live'] = sum(obj[0][1] for obj in objs.values())
+    self.__dict__['_mnid'] = min(
+      [self._mnid] + [id - 1 for id in objs if isinstance(id, int)]
+    )
+    self._objv.clear()
+    self._unmap()
+    self._checkpoint()
+
+  def _bury(self, pl):
+    self._data.seek(pl[0], 0)
+    if self._data.read(len(MAGIC)) == MAGIC:
+      self._data.seek(pl[0], 0)
+      self._data.write(DEAD)
+      self._data.flush()
+
+  def _unmap(self):
+    if self._mmap is not None:
+      self._mmap.close()
+      self.__dict__['_mmap'] = None
+
+  def _compactPass(self, move, reverse):
+    with self._lock.read():
+      order = sorted(
+        ((obj[0][0], id) for id, obj in self._objs.items()),
+        reverse=reverse,
+      )
+    for i in range(0, len(order), Lira.COMPACT_STEP):
+      with self._txlk:
+        self._data.flush()
+        with self._lock:
+          self._begin()
+          for off, id in order[i:i + Lira.COMPACT_STEP]:
+            obj = self._objs.get(id)
+            if obj is not None and obj[0][0] == off:
+              move(id, obj)
+          self._data.flush()
+          self._commit()
+          self._finish()
+
+  def _fill(self, id, obj):
+    pl = obj[0]
+    hole = self._fpls.fit_below(pl[1], pl[0])
+    if hole is not None:
+      self._move(id, obj, hole[0])
+
+  def _slide(self, id, obj):
+    if self._snap > 0:
+      return
+    pl = obj[0]
+    if len(self._pend) > 0:  # прежний участок предыдущего объекта должен слиться с дырой перед этим
+      self._data.flush()
+      self._append()
+    hole = self._fpls.ending_at(pl[0])
+    if hole is not None:
+      self._move(id, obj, hole[0])
+
+  def _move(self, id, obj, off):
+    pl = obj[0]
+    npl = (off, pl[1])
+    self._data.seek(pl[0], 0)
+    dump = self._data.read(pl[1])
+
+    if npl[0] + npl[1] > pl[0]:
+      self._free(pl)  # сдвиг внахлёст фиксируется в журнале вместе с содержимым до записи
+    else:
+      self._pend.append(pl)
+    self._claim(npl)
+    self._objs[id] = (npl,) + obj[1:]
+    if npl[0] + npl[1] > pl[0]:
+      self._jrnl.append(('data', npl[0], dump))
+      self._jrnl.append(('out', id))
+      self._jrnl.append(('put', id) + self._objs[id])
+      self._data.flush()
+      self._append()
+      self._data.seek(npl[0], 0)
+      self._data.write(dump)
+    else:
+      self._data.seek(npl[0], 0)
+      self._data.write(dump)
+      self._bury(pl)
+      self._jrnl.append(('out', id))
+      self._jrnl.append(('put', id) + self._objs[id])
+
+  def _end(self):
+    return self._tail
+
+  def _groupFlush(self):
+    with self._gccnd:
+      self.__dict__['_gcreq'] = self._gcreq + 1
+      target = self._gcreq
+      self._gccnd.notify_all()
+      while self._gcdone < target and self._gcthr is not None:
+        self._gccnd.wait()
+    if self._gcthr is None:
+      self._flushNow()
+
+  def _groupCommitter(self):
+    while True:
+      with self._gccnd:
+        while self._gcreq == self._gcdone and self._gcthr is not None:
+          self._gccnd.wait()
+        if self._gcthr is None:
+          return
+      time.sleep(self._gcwnd)
+      with self._gccnd:
+        target = self._gcreq
+      self._flushNow()
+      with self._gccnd:
+        self.__dict__['_gcdone'] = target
+        self._gccnd.notify_all()
+
+  def _commit(self):
+    if self._jfile is None:
+      self._checkpoint()
+      return
+    self._append()
+    if self._jfile.tell() > max(Lira.JOURNAL_MIN_SIZE, self._hsize):
+      self._checkpoint()
+
+  def _append(self):
+    if len(self._jrnl) == 0:
+      return
+    start, pos = time.perf_counter(), self._jfile.tell()
+    self._jfile.write(pack_batch(self._jrnl))
+    self._jfile.flush()
+    self._stat['bytes'] += self._jfile.tell() - pos
+    st = self._st
+    if st is not None:
+      st.time('journal', time.perf_counter() - start)
+      st.written(self._jfile.tell() - pos)
+    self.__dict__['_jrnl'] = []
+    self.__dict__['_jpos'] = self._jfile.tell()
+    self._saw(self._jfile)
+    self._settle()
+
+  def _checkpoint(self):
+    start, gen = time.perf_counter(), self._jgen + 1
+    self.__dict__['_lazy'] = self._dump_head(self._head, gen)
+    self.__dict__['_hsize'] = os.path.getsize(self._head)
+    self._stat['checkpoints'] += 1
+    self._stat['bytes'] += self._hsize
+    st = self._st
+    if st is not None:
+      st.time('checkpoint', time.perf_counter() - start)
+      st.written(self._hsize)
+
+    if self._jfile is not None:
+      self._jfile.close()
+    with open(self._jpath + '.tmp', 'wb') as file:
+      pickle.dump({'gen': gen, 'framed': True}, file)
+    os.replace(self._jpath + '.tmp', self._jpath)
+    self.__dict__['_jfile'] = open(self._jpath, 'ab')
+    self.__dict__['_jbase'] = self._jfile.tell()
+    self.__dict__['_jgen'] = gen
+    self.__dict__['_jrnl'] = []
+    self.__dict__['_jpos'] = self._jbase
+    self._saw(self._jfile)
+    self._reopenHead()
+    self._settle()
+
+  def _dump_head(self, head, gen):
+    """
+    Пишет файл заголовков head; блоки ещё не прочитанных
+    категорий копируются из текущего файла заголовков как
+    есть, а их id — из оглавления (если там их нет, они
+    берутся из блока)
+
+    :return: {cat: (смещение, длина)} блоков непрочитанных
+    категорий в новом файле
+    """
+    blocks = Lira._blocks(self._objs, self._cats)
+    ids = Lira._idBlocks(self._cats)
+    lzid = dict(self._lzid)
+    for cat, (off, size) in self._lazy.items():
+      self._hfile.seek(off, 0)
+      blocks[cat] = self._hfile.read(size)
+      if cat not in lzid:  # в оглавлении прежнего файла id категории нет
+        packed = pack_ids(pickle.loads(blocks[cat]).keys())
+        lzid[cat] = None if packed is None else unpack_ids(packed)
+      if lzid[cat] is not None:
+        ids[cat] = lzid[cat].tobytes()
+    self.__dict__['_lzid'] = lzid
+    info = {'gen': gen, 'version': Lira.FORMAT_VERSION, 'live': self._live, 'mnid': self._mnid,
+            'tail': self._tail}
+    base, offsets = Lira._write_head(head, info, self._freeSet(), blocks, ids)
+    return {cat: (base + offsets[cat][0], offsets[cat][1]) for cat in self._lazy}
+
+  @staticmethod
+  def _blocks(objs, cats):
+    return {cat: pickle.dumps({id: objs[id] for id in ids}) for cat, ids in cats.items()}
+
+  @staticmethod
+  def _idBlocks(cats):
+    ids = {cat: pack_ids(catIds) for cat, catIds in cats.items()}
+    return {cat: packed for cat, packed in ids.items() if packed is not None}
+
+  @staticmethod
+  def _loadBlock(block, objs):
+    block = pickle.loads(block)
+    objs.update(block)
+    return set(block.keys())
+
+  @staticmethod
+  def _write_head(head, info, fpls, blocks, ids):
+    with open(head + '.tmp', 'wb') as file:
+      result = write_index(file, info, pickle.dumps(fpls), blocks, ids)
+      file.flush()
+      os.fsync(file.fileno())
+    os.replace(head + '.tmp', head)
+    return result
+
+  def _find(self, id):
+    """
+    Заголовок объекта id (или None); если его нет среди
+    прочитанных категорий, то непрочитанные категории
+    читаются, начиная с самых маленьких, пока он не
+    найдётся. Категории, в оглавлении которых есть их
+    id, читаются, только если id среди них есть, так
+    что отсутствующий объект обычно не стоит ни одного
+    чтения. Вызывается под блокировкой (на чтение или
+    на запись)
+    """
+    entry = self._objs.get(id)
+    if entry is not None or len(self._lazy) == 0:
+      return entry
+    lazy, lzid = self._lazy, self._lzid
+    for cat in sorted(lazy, key=lambda cat: lazy[cat][1]):
+      if lzid.get(cat) is not None and not has_id(lzid[cat], id):
+        continue
+      self._load([cat])
+      entry = self._objs.get(id)
+      if entry is not None:
+        return entry
+    return self._objs.get(id)
+
+  def _loadAll(self):
+    if len(self._lazy) > 0:
+      self._load(list(self._lazy))
+
+  def _load(self, cats):
+    """
+    Читает заголовки категорий cats из файла заголовков.
+    Вызывается под блокировкой, в том числе на чтение,
+    поэтому словари не меняются на месте, а заменяются
+    новыми, и параллельные читатели видят либо старые,
+    либо новые
+    """
+    if all(cat not in self._lazy for cat in cats):
+      return
+    with self._lzlk:
+      cats = [cat for cat in cats if cat in self._lazy]
+      if len(cats) == 0:
+        return
+      objs, allCats, lazy = dict(self._objs), dict(self._cats), dict(self._lazy)
+      for cat in cats:
+        off, size = lazy.pop(cat)
+        self._hfile.seek(off, 0)
+        allCats[cat] = Lira._loadBlock(self._hfile.read(size), objs)
+      self.__dict__['_objs'] = objs
+      self.__dict__['_cats'] = allCats
+      self.__dict__['_lazy'] = lazy
+      self.__dict__['_lzid'] = {cat: ids for cat, ids in self._lzid.items() if cat in lazy}
+
+  def _readHead(self, _head, own, refresh=False):
+    """
+    refresh — перечитать собственные заголовки после
+    чужой контрольной точки (в совместном режиме): без
+    восстановления, обрезки журнала и контрольной точки
+    """
+    if _head is None:
+      _head = self._head
+    version = 1
+    loaded = False
+    lazy, lzid = dict(), dict()
+    try:
+      with open(_head, 'rb') as file:
+        index = read_index(file)
+        if index is None:
+          fpls = pickle.load(file)
+          objs = pickle.load(file)
+          cats = pickle.load(file)
+          try:
+            info = pickle.load(file)
+          except EOFError:
+            info = {'gen': 0}
+        else:
+          index, base = index
+          info = index['info']
+          file.seek(base + index['fpls'][0], 0)
+          fpls = pickle.loads(file.read(index['fpls'][1]))
+          objs, cats = dict(), dict()
+          for cat, (off, size) in index['cats'].items():
+            lazy[cat] = (base + off, size)
+          lzid = {cat: unpack_ids(ids) for cat, ids in index.get('ids', {}).items() if cat in lazy}
+          if not own:
+            for cat, (off, size) in lazy.items():
+              file.seek(off, 0)
+              cats[cat] = Lira._loadBlock(file.read(size), objs)
+            lazy, lzid = dict(), dict()
+      version = info.get('version', 1)
+      if version <= Lira.FORMAT_VERSION:
+        self._arena(fpls, info.get('tail'), objs)
+        self.__dict__['_objs'] = objs
+        self.__dict__['_cats'] = cats
+        self.__dict__['_lazy'] = lazy
+        self.__dict__['_lzid'] = lzid
+        self.__dict__['_jgen'] = info['gen']
+        loaded = True
+    except:
+      pass
+    if version > Lira.FORMAT_VERSION:
+      raise ValueError(f'Lira header {_head} has format {version}, '
+                       f'only {Lira.FORMAT_VERSION} is supported')
+    if own and not loaded and not refresh and self._data.seek(0, 2) > 0:
+      self._recover()
+      return
+    if own:
+      self._reopenHead()
+    replayed = own and self._replay(writable=not refresh)
+    if len(self._lazy) > 0:
+      self.__dict__['_live'] = info['live']
+      self.__dict__['_mnid'] = info['mnid']
+    else:
+      self.__dict__['_live'] = sum(obj[0][1] for obj in self._objs.values())
+      try:
+        self.__dict__['_mnid'] = min(
+          filter(lambda x: isinstance(x, int), self._objs.keys())
+        ) - 1
+      except ValueError:
+        pass
+    if own and loaded and not refresh and (replayed or version < Lira.FORMAT_VERSION):
+      self._checkpoint()
+
+  def _replay(self, writable=True):
+    """
+    writable — журнал воспроизводится при открытии:
+    недописанный хвост обрезается, а переносы уплотнения
+    повторяются; иначе (при перечитывании заголовков в
+    совместном режиме) журнал только читается
+    """
+    if self._jfile is not None:
+      self._jfile.close()
+      self.__dict__['_jfile'] = None
+    try:
+      self.__dict__['_hsize'] = os.path.getsize(self._head)
+      with open(self._jpath, 'rb') as file:
+        info = pickle.load(file)
+        if info['gen'] != self._jgen:
+          raise ValueError('stale journal')
+        good = file.tell()
+        base = good
+        for records in self._batches(file, info.get('framed', False)):
+          self._loadAll()
+          for record in records:
+            self._apply(record, writable)
+          good = file.tell()
+        self._saw(file)
+      self._data.flush()
+    except Exception:
+      self.__dict__['_hsize'] = 0
+      return False
+    self.__dict__['_jfile'] = open(self._jpath, 'ab')
+    if writable:
+      self._jfile.truncate(good)
+      self._jfile.seek(good, 0)
+      self._saw(self._jfile)
+    self.__dict__['_jbase'] = base
+    self.__dict__['_jpos'] = good
+    return good > base
+
+  @staticmethod
+  def _batches(file, framed):
+    if framed:
+      yield from read_batches(file)
+      return
+    while True:
+      try:
+        yield pickle.load(file)
+      except Exception:
+        return
+
+  def _apply(self, record, redo=True):
+    """
+    Применяет запись журнала; redo — повторить и перенос
+    содержимого при уплотнении (иначе он уже сделан
+    процессом, писавшим журнал)
+    """
+    if record[0] == 'data':
+      if redo:
+        self._data.seek(record[1], 0)
+        self._data.write(record[2])
+    elif record[0] == 'put':
+      id, obj = record[1], record[2:]
+      if obj[1] in self._lazy:
+        self._load([obj[1]])
+      self._claim(obj[0])
+      self._objs[id] = obj
+      self._objv.pop(id, None)
+      self._cats.setdefault(obj[1], set()).add(id)
+      self.__dict__['_live'] = self._live + obj[0][1]
+      if isinstance(id, int) and id <= self._mnid:
+        self.__dict__['_mnid'] = id - 1
+    else:
+      if self._find(record[1]) is None:
+        return
+      obj = self._objs.pop(record[1])
+      self._objv.pop(record[1], None)
+      self._free(obj[0])
+      self._cats[obj[1]].remove(record[1])
+      self.__dict__['_live'] = self._live - obj[0][1]
+
+  def _begin(self):
+    """
+    Вызывается под блокировкой на запись перед любым
+    изменением; в совместном режиме берёт монопольную
+    межпроцессную блокировку (если её ещё нет) и
+    дочитывает чужие изменения
+    """
+    if self._flock is None or self._held:
+      return
+    self._flock.acquire()
+    self.__dict__['_held'] = True
+    self._refresh()
+    if self._jfile is not None and self._seen is not None and self._seen[1] > self._jpos:
+      self._jfile.truncate(self._jpos)  # недописанный хвост от упавшего процесса
+      self._saw(self._jfile)
+
+  def _finish(self):
+    """
+    Отпускает монопольную межпроцессную блокировку, если
+    все изменения записаны в журнал и не снимается снимок
+    с удержанием блокировки
+    """
+    if self._held and self._shold == 0 and len(self._jrnl) == 0:
+      self._flock.release()
+      self.__dict__['_held'] = False
+
+  def _sync(self):
+    """В совместном режиме дочитывает чужие изменения, если журнал изменился"""
+    if self._flock is None or self._seen == self._jstat():
+      return
+    with self._lock:
+      if self._held or self._seen == self._jstat():
+        return
+      self._flock.acquire(shared=True)
+      try:
+        self._refresh()
+      finally:
+        self._flock.release()
+
+  def _reading(self, fn):
+    """
+    fn() под блокировкой на чтение; в совместном режиме
+    ещё и под разделяемой межпроцессной блокировкой и
+    с актуальными заголовками, чтобы другой процесс не
+    занял участки, которые читаются. Разделяемую
+    блокировку берёт первый читатель процесса, а
+    отпускает последний: блокировка принадлежит файлу,
+    а не потоку
+    """
+    if self._flock is None:
+      with self._lock.read():
+        return fn()
+    while True:
+      self._sync()
+      with self._lock.read():
+        if self._held:
+          return fn()
+        with self._slk:
+          if self._rdrs == 0:
+            self._flock.acquire(shared=True)
+          self.__dict__['_rdrs'] = self._rdrs + 1
+        try:
+          if self._seen == self._jstat():
+            return fn()
+        finally:
+          with self._slk:
+            self.__dict__['_rdrs'] = self._rdrs - 1
+            if self._rdrs == 0:
+              self._flock.release()
+
+  def _refresh(self):
+    """
+    Дочитывает чужие изменения (под межпроцессной
+    блокировкой и блокировкой на запись): новые пакеты
+    журнала применяются к заголовкам в памяти, а если
+    журнал начат заново после контрольной точки — заново
+    читаются оглавление заголовков и весь журнал
+    """
+    self._data.flush()
+    self._unmap()
+    self.__dict__['_alloc'] = max(self._alloc, self._data.seek(0, 2))
+    try:
+      file = open(self._jpath, 'rb')
+    except OSError:
+      self.__dict__['_seen'] = None
+      return
+    with file:
+      if pickle.load(file)['gen'] != self._jgen:
+        self._objv.clear()
+        self._readHead(None, True, refresh=True)
+        return
+      file.seek(self._jpos, 0)
+      for records in read_batches(file):
+        for record in records:
+          self._apply(record, redo=False)
+      self.__dict__['_jpos'] = file.tell()
+      self._saw(file)
+
+  def _reopenHead(self):
+    """Файл заголовков, из которого читаются ещё не прочитанные категории"""
+    if self._hfile is not None:
+      self._hfile.close()
+      self.__dict__['_hfile'] = None
+    if len(self._lazy) > 0:
+      self.__dict__['_hfile'] = open(self._head, 'rb')
+
+  def _jstat(self):
+    try:
+      st = os.stat(self._jpath)
+    except OSError:
+      return None
+    return st.st_ino, st.st_size
+
+  def _saw(self, file):
+    st = os.fstat(file.fileno())
+    self.__dict__['_seen'] = (st.st_ino, st.st_size)
+
+
+
+  def _settle(self):
+    """
+    Отдаёт под новые объекты участки, освобождённые
+    удалениями и переносами, которые уже записаны в
+    журнал или в контрольную точку. До этого участки
+    не занимаются: иначе после сбоя заголовки из журнала
+    указывали бы на участок с записью другого объекта
+    """
+    pend = self._pend
+    self.__dict__['_pend'] = []
+    for pl in pend:
+      self._free(pl)
+
+  def _free(self, pl):
+    if self._snap > 0:
+      self._dfrd.append(pl)
+      return
+    self._release(pl)
     return
 
-  def _malloc(self, s):
-    best = None
-    for el in self._fpls:
-      if el[1] >= s and (best is None or el[1] < best[1]):
-        best = el
+  def _release(self, pl):
+    self._fpls.free(pl)
+    last = self._fpls.last()
+    if last is not None and last[0] + last[1] == self._tail:
+      self._fpls.remove(last)
+      self.__dict__['_tail'] = last[0]
 
-    if best is None:
-      raise Exception("memory out")
+  def _claim(self, pl):
+    """
+    Занимает конкретный участок pl: внутри дыры или за
+    концом занятой части файла (при воспроизведении
+    журнала, восстановлении и уплотнении)
+    """
+    if pl[0] < self._tail:
+      self._fpls.take(pl)
+      return
+    if pl[0] > self._tail:
+      self._fpls.free((self._tail, pl[0] - self._tail))
+    self.__dict__['_tail'] = pl[0] + pl[1]
 
-    self._fpls.remove(best)
-    if s != best[1]:
-      self._fpls.add( (best[0] + s, best[1] - s) )
+  def _arena(self, fpls, tail, objs):
+    """
+    Восстанавливает дыры и конец занятой части файла по
+    заголовкам; в заголовках до версии 5 вместо конца
+    хранился хвостовой свободный участок до ARENA_SIZE
+    """
+    fpls = FreeExtents(fpls)
+    if tail is None:
+      last = fpls.last()
+      if last is not None and last[0] + last[1] == Lira.ARENA_SIZE:
+        fpls.remove(last)
+        tail = last[0]
+      else:
+        tail = max([0] + [pl[0] + pl[1] for pl in fpls] +
+                   [obj[0][0] + obj[0][1] for obj in objs.values()])
+    self.__dict__['_fpls'] = fpls
+    self.__dict__['_tail'] = tail
+    last = fpls.last()
+    while last is not None and last[0] + last[1] == self._tail:
+      fpls.remove(last)
+      self.__dict__['_tail'] = last[0]
+      last = fpls.last()
+
+  def _freeSet(self):
+    if len(self._dfrd) == 0 and len(self._pend) == 0:
+      return set(self._fpls)
+    fpls = FreeExtents(self._fpls)
+    for pl in self._dfrd + self._pend:
+      fpls.free(pl)
+    return set(fpls)
+
+  def _snapTake(self, hold):
+    """
+    Копирует заголовки для снимка и запрещает отдавать
+    освобождённые участки под новые объекты до _snapDone;
+    hold — не отпускать до _snapDone и межпроцессную
+    блокировку
+
+    :return: (заголовки объектов, категории, свободные
+    участки, поколение журнала, info файла заголовков,
+    seq начала снимка)
+    """
+    with self._txlk:
+      self._data.flush()
+      with self._lock:
+        self._begin()
+        self._loadAll()
+        taken = (
+          dict(self._objs),
+          {cat: set(ids) for cat, ids in self._cats.items()},
+          self._freeSet(),
+          self._jgen,
+          {'gen': 0, 'version': Lira.FORMAT_VERSION, 'live': self._live, 'mnid': self._mnid,
+           'tail': self._tail},
+          max(self._seq, time.time_ns()),
+        )
+        self.__dict__['_snap'] = self._snap + 1
+        if hold:
+          self.__dict__['_shold'] = self._shold + 1
+        self._finish()
+    return taken
+
+  def _snapCopy(self, data, taken, base, verify, stat):
+    """
+    Копирует объекты снимка в файл data и пополняет
+    статистику stat; base — манифест того, что уже
+    лежит в файле; verify — проверять скопированные
+    записи (см. snapshot)
+
+    :return: (манифест файла, скопированы ли все
+    объекты); если запись успели перезаписать, то
+    копирование прерывается, а манифест описывает
+    скопированное до этого
+    """
+    objs, started = taken[0], taken[5]
+    extents = {}
+    kept = {}  # записи из base, которые остались на месте
+    with open(data, 'rb+' if len(base) > 0 and os.path.exists(data) else 'wb+') as file:
+      for id, (pl, head) in base.items():
+        obj = objs.get(id)
+        if head is not None and (obj is None or obj[0] != pl):
+          file.seek(pl[0], 0)
+          file.write(DEAD)
+        else:
+          kept[id] = (pl, head)
+      end = 0
+      for id, obj in sorted(objs.items(), key=lambda item: item[1][0]):
+        pl = obj[0]
+        end = max(end, pl[0] + pl[1])
+        head = self._pread((pl[0], min(pl[1], HEAD.size)))
+        if head[:len(MAGIC)] not in (MAGIC, DEAD):
+          head = None
+        elif head[:len(DEAD)] == DEAD:
+          head = MAGIC + head[len(DEAD):]
+        if head is not None and base.get(id) == (pl, head):
+          extents[id] = (pl, head)
+          continue
+        dump = self._pread(pl)
+        if verify:
+          info = record_info(dump)
+          if info is None or info[0] != id or info[4] > started:
+            return {**kept, **extents}, False
+        if head is not None:
+          dump = MAGIC + dump[len(MAGIC):]
+          head = dump[:HEAD.size]
+        extents[id] = (pl, head)
+        file.seek(pl[0], 0)
+        file.write(dump)
+        stat['copied'] += 1
+        stat['bytes'] += pl[1]
+      file.truncate(end)
+      file.flush()
+      os.fsync(file.fileno())
+    return extents, True
+
+  def _snapDone(self, hold):
+    with self._lock:
+      self.__dict__['_snap'] = self._snap - 1
+      if hold:
+        self.__dict__['_shold'] = self._shold - 1
+      if self._snap == 0:
+        for pl in self._dfrd:
+          self._release(pl)
+        self.__dict__['_dfrd'] = []
+      self._finish()
 
-    return best[0], s
+  def _malloc(self, s):
+    """
+    Дыра используется, только если объект занимает её
+    почти целиком (остаток не больше 1/HOLE_FIT объекта)
+    или если дыра так велика, что после отделения объекта
+    остаётся не меньше HOLE_SPLIT байт; иначе объект
+    дописывается в конец, а файл растёт порциями
+    """
+    pl = self._fpls.malloc(s, Lira.HOLE_FIT, Lira.HOLE_SPLIT)
+    if pl is not None:
+      return pl
+    pl = (self._tail, s)
+    self.__dict__['_tail'] = self._tail + s
+    self._grow(self._tail)
+    return pl
+
+  def _grow(self, end):
+    if end <= self._alloc:
+      return
+    step = min(max(Lira.PREALLOC_MIN, self._alloc // 8), Lira.PREALLOC_MAX)
+    size = max(end, self._alloc + step)
+    self._data.flush()
+    if hasattr(os, 'posix_fallocate'):
+      os.posix_fallocate(self._data.fileno(), self._alloc, size - self._alloc)
+    elif self._data.seek(0, 2) < size:
+      self._data.truncate(size)
+    self.__dict__['_alloc'] = size
 
   def _nextid(self):
     self.__dict__['_mnid'] = self._mnid - 1
@@ -0,0 +1,204 @@
+import asyncio
+import functools
+import weakref
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+
+class AsyncLira:
+  """
+  Асинхронный фасад над Lira (а также SqliteLira и
+  ShardedLira) для asyncio: чтение файлов и блокировки
+  Лиры не останавливают цикл событий, потому что вся
+  работа с диском выполняется в отдельном потоке
+  ввода-вывода (одном на хранилище, так что операции
+  выполняются в порядке вызова)
+
+  Объекты, которые уже есть в кэше Лиры, возвращаются
+  сразу, без перехода в поток ввода-вывода. Остальные
+  get, вызванные одновременно, собираются вместе и
+  читаются одним Lira.get_many, а одновременные flush —
+  одним Lira.flush
+
+  Фасад не держит хранилище (ссылается на него слабо), а
+  реестр AsyncLira.of не держит ни хранилище, ни фасад:
+  фасад живёт, пока живо хранилище, и пропадает из
+  реестра вместе с ним или при close
+
+  alira = AsyncLira.of(lira)
+  event = await alira.get(event_id)
+  await alira.put(obj, id=event_id, cat='event')
+  await alira.flush()
+  """
+
+  _facades = weakref.WeakKeyDictionary()  # {хранилище: фасад}
+  _facadesLock = Lock()
+
+  def __init__(self, lira, *, max_batch=256):
+    """
+    :param lira: хранилище
+
+    :param max_batch: сколько id читать одним get_many
+    """
+    self._lira = weakref.ref(lira)
+    self._maxBatch = max_batch
+    self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix='lira-io')
+    self._lock = Lock()
+    self._gets = dict()  # {id: [future, ...]} — ждущие get
+    self._draining = False
+    self._flushing = None
+
+
+  @property
+  def lira(self):
+    """Хранилище фасада"""
+    return self._lira()
+
+  @staticmethod
+  def of(lira) -> 'AsyncLira':
+    """Фасад хранилища lira (один на хранилище, чтобы у него был один поток ввода-вывода)"""
+    with AsyncLira._facadesLock:
+      facade = AsyncLira._facades.get(lira)
+      if facade is None:
+        facade = AsyncLira._facades[lira] = AsyncLira(lira)
+      return facade
+
+
+  async def get(self, id, default=None):
+    """Lira.get: из кэша — сразу, иначе — вместе с другими одновременными get"""
+    obj = self.lira.cached(id)
+    if obj is not None:
+      return obj
+    future = asyncio.get_running_loop().create_future()
+    with self._lock:
+      self._gets.setdefault(id, []).append(future)
+      drain = not self._draining
+      self._draining = True
+    if drain:
+      self._io.submit(self._drain)
+    obj = await future
+    return default if obj is None else obj
+
+  async def get_many(self, ids, default=None):
+    """Lira.get_many; объекты из кэша — сразу, в потоке ввода-вывода читаются только остальные"""
+    ids = list(ids)
+    objs = [self.lira.cached(id) for id in ids]
+    missed = [i for i, obj in enumerate(objs) if obj is None]
+    if len(missed) == 0:
+      return objs
+    found = await self._call(self.lira.get_many, [ids[i] for i in missed], default)
+    for i, obj in zip(missed, found):
+      objs[i] = obj
+    return objs
+
+  async def put(self, obj, *, id=None, cat=None, meta=None):
+    """Lira.put"""
+    return await self._call(self.lira.put, obj, id=id, cat=cat, meta=meta)
+
+  async def put_many(self, objs, *, ids=None, cat=None, meta=None):
+    """Lira.put_many"""
+    return await self._call(self.lira.put_many, list(objs), ids=ids, cat=cat, meta=meta)
+
+  async def out(self, id):
+    """Lira.out"""
+    return await self._call(self.lira.out, id)
+
+  async def out_many(self, ids):
+    """Lira.out_many"""
+    return await self._call(self.lira.out_many, list(ids))
+
+  async def pop(self, id, default=None):
+    """Lira.pop"""
+    return await self._call(self.lira.pop, id, default)
+
+  async def cat(self, id):
+    """Lira.cat"""
+    return await self._call(self.lira.cat, id)
+
+  async def meta(self, id):
+    """Lira.meta"""
+    return await self._call(self.lira.meta, id)
+
+  async def cats(self):
+    """Lira.cats"""
+    return await self._call(self.lira.cats)
+
+  async def ids(self, cat):
+    """Список id объектов категории (lira[cat])"""
+    return await self._call(self.lira.__getitem__, cat)
+
+  async def flush(self):
+    """
+    Lira.flush; flush, вызванные, пока предыдущий ещё не
+    начался, выполняются одним вызовом
+    """
+    with self._lock:
+      future = self._flushing
+      if future is None:
+        future = self._flushing = self._io.submit(self._flush)
+    await asyncio.wrap_future(future)
+
+  async def run(self, fn, *args, **kwargs):
+    """
+    Выполнить fn(*args, **kwargs) в потоке ввода-вывода, например
+    несколько изменений в одной транзакции:
+
+    def move(lira):
+      with lira.transaction():
+        lira.out(old_id)
+        lira.put(obj, cat='cat')
+    await alira.run(move, alira.lira)
+    """
+    return await self._call(fn, *args, **kwargs)
+
+  async def close(self):
+    """Закрывает хранилище, останавливает поток ввода-вывода и убирает фасад из реестра"""
+    lira = self.lira
+    await self._call(lira.close)
+    self._io.shutdown(wait=False)
+    with AsyncLira._facadesLock:
+      if AsyncLira._facades.get(lira) is self:
+        del AsyncLira._facades[lira]
+
+
+  async def _call(self, fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(
+      self._io, functools.partial(fn, *args, **kwargs),
+    )
+
+  def _drain(self):
+    """
+    Читает одной порцией ждущие get (не больше max_batch id); если
+    после этого остались ещё, то следующая порция ставится в очередь
+    потока ввода-вывода после уже поставленных в неё операций
+    """
+    with self._lock:
+      ids = list(self._gets)[:self._maxBatch]
+      waiters = [self._gets.pop(id) for id in ids]
+    try:
+      objs = self.lira.get_many(ids)
+      results = [(obj, None) for obj in objs]
+    except Exception as e:
+      results = [(None, e)] * len(ids)
+    for futures, (obj, error) in zip(waiters, results):
+      for future in futures:
+        future.get_loop().call_soon_threadsafe(AsyncLira._resolve, future, obj, error)
+    with self._lock:
+      self._draining = len(self._gets) > 0
+      if self._draining:
+        self._io.submit(self._drain)
+
+  @staticmethod
+  def _resolve(future, obj, error):
+    if future.cancelled():
+      return
+    if error is not None:
+      future.set_exception(error)
+    else:
+      future.set_result(obj)
+
+  def _flush(self):
+    with self._lock:
+      self._flushing = None
+    self.lira.flush()
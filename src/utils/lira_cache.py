@@ -0,0 +1,241 @@
+import builtins
+import copy
+import hashlib
+import pickle
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Iterable, Optional
+
+
+class EvictionPolicy:
+  """
+  Политика вытеснения для LiraCache: решает, переполнен ли кэш. Базовая
+  политика кэш не ограничивает
+  """
+
+  def overflow(self, count: int, size: int) -> bool:
+    """
+    :param count: число вытесняемых (не закреплённых) объектов в кэше
+
+    :param size: их суммарный размер в байтах (размер в файле данных)
+
+    :return: нужно ли вытеснить ещё один объект
+    """
+    return False
+
+
+class LruPolicy(EvictionPolicy):
+  """Хранить не больше max_items объектов, вытесняя давно не использованные"""
+
+  def __init__(self, max_items: int):
+    self.maxItems = max_items
+
+  def overflow(self, count: int, size: int) -> bool:
+    return count > self.maxItems
+
+
+class ByteBudgetPolicy(EvictionPolicy):
+  """
+  Хранить объекты суммарным размером не больше max_bytes, вытесняя давно не
+  использованные; размер объекта считается по его записи в файле данных
+  """
+
+  def __init__(self, max_bytes: int):
+    self.maxBytes = max_bytes
+
+  def overflow(self, count: int, size: int) -> bool:
+    return size > self.maxBytes
+
+
+class LiraCache:
+  """
+  Кэш объектов Лиры в оперативной памяти. Объекты закреплённых категорий
+  никогда не вытесняются, остальные вытесняются в порядке давности
+  использования, пока политика считает кэш переполненным.
+
+  Кэш также поддерживает обратный индекс объект → id: по тождеству объекта
+  (builtins.id, пока объект в кэше, он жив, поэтому тождество устойчиво)
+  и, если включено, по хэшу сериализованного содержимого
+  """
+
+  def __init__(
+    self,
+    policy: EvictionPolicy = None,
+    pinned: Iterable = (),
+    content_index: bool = False,
+  ):
+    """
+    :param policy: политика вытеснения (по умолчанию кэш не ограничен)
+
+    :param pinned: категории, объекты которых всегда остаются в памяти
+
+    :param content_index: искать объекты также по содержимому, а не только по
+    тождеству (стоит одного хэширования на каждое чтение и запись)
+    """
+    self.policy = policy or EvictionPolicy()
+    self.pinned = set(pinned)
+    self._lru = OrderedDict()  # {id: (obj, size)}
+    self._pin = dict()         # {id: (obj, size)}
+    self._lock = Lock()
+    self._byIdentity = dict()  # {builtins.id(obj): id}
+    self._byContent = dict() if content_index else None  # {digest: id}
+    self._digests = dict()     # {id: digest}
+    self._size = 0
+    self._hits = 0
+    self._misses = 0
+    self._evictions = 0
+
+
+  def get(self, id, default=None) -> Any:
+    """Объект по id или default, если его нет в кэше"""
+    with self._lock:
+      item = self._pin.get(id)
+      if item is None:
+        item = self._lru.get(id)
+        if item is not None:
+          self._lru.move_to_end(id)
+      if item is None:
+        self._misses += 1
+        return default
+      self._hits += 1
+      return item[0]
+
+
+  def probe(self, id, default=None) -> Any:
+    """
+    То же, что get, но промах не считается: после промаха объект
+    читается обычным путём, который и посчитает его
+    """
+    with self._lock:
+      item = self._pin.get(id)
+      if item is None:
+        item = self._lru.get(id)
+        if item is not None:
+          self._lru.move_to_end(id)
+      if item is None:
+        return default
+      self._hits += 1
+      return item[0]
+
+
+  def put(self, id, obj, size: int, cat=None, dump: bytes = None):
+    """
+    Положить объект в кэш
+
+    :param size: размер объекта в файле данных
+
+    :param cat: категория объекта (для закрепления)
+
+    :param dump: сериализованный объект (для индекса по содержимому;
+    если не указан, объект будет сериализован заново)
+    """
+    with self._lock:
+      self._pop(id)
+      self._index(id, obj, dump)
+      if cat in self.pinned:
+        self._pin[id] = obj, size
+        return
+      self._lru[id] = obj, size
+      self._size += size
+      while len(self._lru) > 0 and self.policy.overflow(len(self._lru), self._size):
+        evicted, (obj, evictedSize) = self._lru.popitem(last=False)
+        self._size -= evictedSize
+        self._unindex(evicted, obj)
+        self._evictions += 1
+
+
+  def pop(self, id, default=None) -> Any:
+    """Убрать объект из кэша и вернуть его"""
+    with self._lock:
+      return self._pop(id, default)
+
+
+  def find(self, obj) -> Optional[Any]:
+    """
+    id объекта obj, находящегося в кэше: сначала по тождеству, затем (если
+    включён индекс по содержимому) по содержимому; если не найден — None
+    """
+    with self._lock:
+      id = self._byIdentity.get(builtins.id(obj))
+    if id is not None or self._byContent is None:
+      return id
+    digest = LiraCache.digest(pickle.dumps(obj))
+    with self._lock:
+      return self._byContent.get(digest)
+
+
+  def clear(self):
+    with self._lock:
+      self._lru.clear()
+      self._pin.clear()
+      self._byIdentity.clear()
+      self._digests.clear()
+      if self._byContent is not None:
+        self._byContent.clear()
+      self._size = 0
+
+
+  def fresh(self) -> 'LiraCache':
+    """Новый пустой кэш с теми же политикой (её копией), закреплёнными категориями и индексом"""
+    return LiraCache(copy.copy(self.policy), self.pinned, content_index=self._byContent is not None)
+
+
+  @staticmethod
+  def digest(dump) -> bytes:
+    return hashlib.blake2b(dump, digest_size=16).digest()
+
+
+  def items(self):
+    """Итератор по парам (id, объект)"""
+    with self._lock:
+      items = list(self._pin.items()) + list(self._lru.items())
+    for id, (obj, _) in items:
+      yield id, obj
+
+
+  def stats(self) -> {str: int}:
+    """Попадания, промахи, вытеснения, а также текущий объём кэша"""
+    with self._lock:
+      return {
+        'hits': self._hits,
+        'misses': self._misses,
+        'evictions': self._evictions,
+        'items': len(self._lru) + len(self._pin),
+        'pinned': len(self._pin),
+        'bytes': self._size,
+      }
+
+
+  def __len__(self):
+    return len(self._lru) + len(self._pin)
+
+  def __contains__(self, id):
+    return id in self._pin or id in self._lru
+
+
+  def _pop(self, id, default=None):
+    item = self._pin.pop(id, None)
+    if item is None:
+      item = self._lru.pop(id, None)
+      if item is not None:
+        self._size -= item[1]
+    if item is None:
+      return default
+    self._unindex(id, item[0])
+    return item[0]
+
+  def _index(self, id, obj, dump):
+    self._byIdentity[builtins.id(obj)] = id
+    if self._byContent is None:
+      return
+    digest = LiraCache.digest(pickle.dumps(obj) if dump is None else dump)
+    self._byContent[digest] = id
+    self._digests[id] = digest
+
+  def _unindex(self, id, obj):
+    if self._byIdentity.get(builtins.id(obj)) == id:
+      del self._byIdentity[builtins.id(obj)]
+    digest = self._digests.pop(id, None)
+    if digest is not None and self._byContent.get(digest) == id:
+      del self._byContent[digest]
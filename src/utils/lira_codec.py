@@ -0,0 +1,163 @@
+import pickle
+import struct
+import zlib
+
+from typing import Any, Optional, Tuple
+
+
+class Codec:
+  """
+  Способ превращения объекта в байты для файла данных Лиры. Тег кодека
+  записывается в заголовок рядом с объектом, поэтому тег однажды записанного
+  кодека менять нельзя
+  """
+  tag: str = None
+
+  def encode(self, obj, cat) -> bytes:
+    pass
+
+  def decode(self, dump, cat) -> Any:
+    pass
+
+
+class PickleCodec(Codec):
+  """pickle с протоколом по умолчанию — формат объектов без тега"""
+  tag = None
+
+  def encode(self, obj, cat) -> bytes:
+    return pickle.dumps(obj)
+
+  def decode(self, dump, cat) -> Any:
+    return pickle.loads(dump)
+
+
+class Pickle5Codec(Codec):
+  """
+  pickle протокола 5 с внеполосными буферами: большие буферы (bytearray,
+  PickleBuffer и т.п.) пишутся после основного потока без копирования в него
+  и при чтении не копируются обратно. Формат: число буферов, их длины,
+  длина основного потока, основной поток, буферы
+  """
+  tag = 'p5'
+
+  def encode(self, obj, cat) -> bytes:
+    buffers = []
+    main = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raws = [b.raw() for b in buffers]
+    head = struct.pack(f'<I{len(raws)}QQ', len(raws), *(len(r) for r in raws), len(main))
+    return b''.join([head, main, *raws])
+
+  def decode(self, dump, cat) -> Any:
+    dump = memoryview(dump)
+    count, = struct.unpack_from('<I', dump)
+    lens = struct.unpack_from(f'<{count}QQ', dump, 4)
+    pos = 4 + 8 * (count + 1)
+    main = dump[pos:pos + lens[-1]]
+    pos += lens[-1]
+    buffers = []
+    for size in lens[:-1]:
+      buffers.append(dump[pos:pos + size])
+      pos += size
+    return pickle.loads(main, buffers=buffers)
+
+
+class EntityCodec(Codec):
+  """
+  Компактный кодек для словарей сущностей бота: если набор ключей словаря
+  совпадает с одной из известных схем категории, то пишется только номер
+  схемы и кортеж значений в порядке схемы (без строк ключей); иначе — номер
+  RAW и сам словарь. Схемы можно только дописывать в конец списка категории:
+  номер схемы хранится в файле
+  """
+  tag = 'e'
+  RAW = 255
+  SCHEMAS = {
+    'event': [
+      ('start', 'finish', 'place', 'url', 'desc', 'creator', 'id'),
+    ],
+    'timesheet': [
+      ('id', 'name', 'password', 'destination_sets', 'events', 'places', 'orgs'),
+    ],
+    'destination': [
+      ('id', 'chat', 'sets'),
+    ],
+    'translation': [
+      ('id', 'destination_id', 'message_id', 'timesheet_id', 'creator'),
+    ],
+    'user': [
+      ('chat', 'timesheet_id', 'destination_id'),
+    ],
+    'action': [
+      ('id', 'creator', 'type', 'period', 'last_update'),
+      ('id', 'creator', 'type', 'period', 'last_update',
+       'chat', 'timesheet_id', 'translation_id'),
+    ],
+  }
+
+  def encode(self, obj, cat) -> bytes:
+    if isinstance(obj, dict):
+      keys = set(obj.keys())
+      for i, schema in enumerate(EntityCodec.SCHEMAS.get(cat, [])):
+        if len(schema) == len(keys) and keys.issuperset(schema):
+          values = tuple(obj[key] for key in schema)
+          return bytes([i]) + pickle.dumps(values, protocol=5)
+    return bytes([EntityCodec.RAW]) + pickle.dumps(obj, protocol=5)
+
+  def decode(self, dump, cat) -> Any:
+    dump = memoryview(dump)
+    value = pickle.loads(dump[1:])
+    if dump[0] == EntityCodec.RAW:
+      return value
+    return dict(zip(EntityCodec.SCHEMAS[cat][dump[0]], value))
+
+
+class LiraCodec:
+  """
+  Кодирование объектов Лиры: выбранным кодеком при записи и по тегу из
+  заголовка при чтении, так что объекты, записанные разными кодеками (в том
+  числе старые, без тега), читаются вместе. Если задан порог сжатия, то
+  закодированные объекты не меньше порога сжимаются zlib, а к тегу
+  добавляется '+z'
+  """
+  CODECS = {
+    None: PickleCodec(),
+    Pickle5Codec.tag: Pickle5Codec(),
+    EntityCodec.tag: EntityCodec(),
+  }
+  ZLIB_SUFFIX = '+z'
+
+  def __init__(
+    self,
+    codec: str = None,
+    compress_threshold: int = None,
+    compress_level: int = 6,
+  ):
+    """
+    :param codec: тег кодека для записи (None — pickle без тега, 'p5', 'e')
+
+    :param compress_threshold: размер в байтах, начиная с которого объекты
+    сжимаются (None — не сжимать)
+
+    :param compress_level: уровень сжатия zlib
+    """
+    self.codec = LiraCodec.CODECS[codec]
+    self.compressThreshold = compress_threshold
+    self.compressLevel = compress_level
+
+
+  def encode(self, obj, cat) -> Tuple[bytes, Optional[str]]:
+    """
+    :return: байты для файла данных и тег для заголовка
+    """
+    dump = self.codec.encode(obj, cat)
+    if self.compressThreshold is None or len(dump) < self.compressThreshold:
+      return dump, self.codec.tag
+    return (zlib.compress(dump, self.compressLevel),
+            (self.codec.tag or '') + LiraCodec.ZLIB_SUFFIX)
+
+
+  def decode(self, dump, tag: Optional[str], cat) -> Any:
+    if tag is not None and tag.endswith(LiraCodec.ZLIB_SUFFIX):
+      dump = zlib.decompress(dump)
+      tag = tag[:-len(LiraCodec.ZLIB_SUFFIX)] or None
+    return LiraCodec.CODECS[tag].decode(dump, cat)
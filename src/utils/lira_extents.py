@@ -0,0 +1,233 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable, Iterator, Optional, Tuple
+
+
+Extent = Tuple[int, int]
+
+
+class FreeExtents:
+  """
+  Индекс свободных участков файла данных Лиры. Участок — это пара
+  (смещение, размер). Участки хранятся сразу в двух упорядоченных
+  структурах: по размеру (для поиска наиболее подходящего участка)
+  и по смещению (для поиска соседей при слиянии), поэтому и выделение,
+  и освобождение выполняются двоичным поиском, а не перебором всех
+  участков. Смещения разбиты на порции не длиннее 2 * BLOCK, и для
+  каждой порции хранится оценка сверху размеров её участков: fit_below
+  пропускает порции, в которых подходящего участка нет, не перебирая их
+  (оценка уточняется, когда порция перебрана впустую)
+  """
+
+  BLOCK = 256
+
+  def __init__(self, extents: Iterable[Extent] = ()):
+    """
+    :param extents: начальный набор свободных участков (например, множество
+    из старого файла заголовков); соседние участки не сливаются
+    """
+    self._bySize = []  # [(size, offset)] по возрастанию
+    self._offs = []    # [[offset]] — порции смещений по возрастанию
+    self._heads = []   # [первое смещение порции]
+    self._maxs = []    # [оценка сверху размеров участков порции, уточняется в fit_below]
+    self._size = {}    # {offset: size}
+    for extent in extents:
+      self.add(extent)
+
+
+  def add(self, extent: Extent):
+    """Добавить участок как есть, без слияния с соседями"""
+    off, size = extent
+    insort(self._bySize, (size, off))
+    self._size[off] = size
+    if len(self._offs) == 0:
+      self._offs.append([off])
+      self._heads.append(off)
+      self._maxs.append(size)
+      return
+    k = max(bisect_right(self._heads, off) - 1, 0)
+    block = self._offs[k]
+    insort(block, off)
+    self._heads[k] = block[0]
+    self._maxs[k] = max(self._maxs[k], size)
+    if len(block) > 2 * FreeExtents.BLOCK:
+      half = block[FreeExtents.BLOCK:]
+      del block[FreeExtents.BLOCK:]
+      self._offs.insert(k + 1, half)
+      self._heads.insert(k + 1, half[0])
+      self._maxs.insert(k + 1, 0)
+      self._remax(k)
+      self._remax(k + 1)
+
+
+  def remove(self, extent: Extent):
+    """Удалить участок; если такого участка нет, возбуждается KeyError"""
+    off, size = extent
+    if self._size.get(off) != size:
+      raise KeyError(extent)
+    del self._size[off]
+    del self._bySize[bisect_left(self._bySize, (size, off))]
+    k = bisect_right(self._heads, off) - 1
+    block = self._offs[k]
+    del block[bisect_left(block, off)]
+    if len(block) == 0:
+      del self._offs[k], self._heads[k], self._maxs[k]
+      return
+    self._heads[k] = block[0]
+
+
+  def malloc(self, size: int, fit: int = None, split: int = 0) -> Optional[Extent]:
+    """
+    Выделить участок размера size из наименьшего подходящего свободного
+    участка (при равенстве размеров — из ближайшего к началу файла)
+
+    :param fit: если указан, то наименьший подходящий участок занимается,
+    только если объект занимает его почти целиком (остаток не больше 1/fit
+    размера), а иначе участок отделяется от наибольшего свободного, если в
+    том после этого остаётся не меньше split байт
+
+    :return: выделенный участок или None, если подходящего нет
+    """
+    hole = self.best(size)
+    if fit is not None and (hole is None or hole[1] - size > size // fit):
+      hole = self.largest()
+      if hole is not None and hole[1] - size < split:
+        hole = None
+    if hole is None:
+      return None
+    self.take((hole[0], size))
+    return hole[0], size
+
+
+  def best(self, size: int) -> Optional[Extent]:
+    """
+    Наименьший свободный участок размера не меньше size (при равенстве
+    размеров — ближайший к началу файла); участок не занимается
+
+    :return: найденный участок или None
+    """
+    i = bisect_left(self._bySize, (size, -1))
+    if i == len(self._bySize):
+      return None
+    best_size, best_off = self._bySize[i]
+    return best_off, best_size
+
+
+  def largest(self) -> Optional[Extent]:
+    """Наибольший свободный участок или None, если участков нет"""
+    if len(self._bySize) == 0:
+      return None
+    size, off = self._bySize[-1]
+    return off, size
+
+
+  def fit_below(self, size: int, limit: int) -> Optional[Extent]:
+    """
+    Найти свободный участок размера не меньше size, в котором объект
+    целиком лежит левее смещения limit (нужно для уплотнения: объект
+    переносится только ближе к началу файла): наименьший подходящий, если
+    он лежит левее limit, иначе ближайший к началу файла; участок не
+    занимается
+
+    :return: найденный участок или None
+    """
+    best = self.best(size)
+    if best is None:
+      return None
+    if best[0] + size <= limit:
+      return best
+    for k, head in enumerate(self._heads):
+      if head + size > limit:
+        break
+      if self._maxs[k] < size:
+        continue
+      largest = 0
+      for hoff in self._offs[k]:
+        if hoff + size > limit:
+          return None
+        hsize = self._size[hoff]
+        if hsize >= size:
+          return hoff, hsize
+        if hsize > largest:
+          largest = hsize
+      self._maxs[k] = largest
+    return None
+
+
+  def ending_at(self, off: int) -> Optional[Extent]:
+    """Свободный участок, заканчивающийся ровно на смещении off, или None"""
+    hoff = self._before(off)
+    if hoff is None or hoff + self._size[hoff] != off:
+      return None
+    return hoff, self._size[hoff]
+
+
+  def last(self) -> Optional[Extent]:
+    """Участок с наибольшим смещением или None, если участков нет"""
+    if len(self._offs) == 0:
+      return None
+    off = self._offs[-1][-1]
+    return off, self._size[off]
+
+
+  def take(self, extent: Extent):
+    """
+    Занять конкретный участок extent (например, при воспроизведении журнала);
+    участок должен целиком лежать внутри одного свободного, иначе возбуждается
+    KeyError
+    """
+    off, size = extent
+    hoff = self._before(off + 1)
+    if hoff is None:
+      raise KeyError(extent)
+    hsize = self._size[hoff]
+    if off + size > hoff + hsize:
+      raise KeyError(extent)
+    self.remove((hoff, hsize))
+    if hoff < off:
+      self.add((hoff, off - hoff))
+    if off + size < hoff + hsize:
+      self.add((off + size, hoff + hsize - off - size))
+
+
+  def free(self, extent: Extent):
+    """Вернуть участок в индекс, слив его с соседними свободными участками"""
+    off, size = extent
+
+    loff = self._before(off + 1)
+    if loff is not None:
+      lsize = self._size[loff]
+      if loff + lsize == off:
+        self.remove((loff, lsize))
+        off, size = loff, lsize + size
+
+    rsize = self._size.get(off + size)
+    if rsize is not None:
+      self.remove((off + size, rsize))
+      size += rsize
+
+    self.add((off, size))
+
+
+  def __iter__(self) -> Iterator[Extent]:
+    """Итератор по участкам в порядке возрастания смещения"""
+    for block in self._offs:
+      for off in block:
+        yield off, self._size[off]
+
+  def __len__(self):
+    return len(self._size)
+
+  def __contains__(self, extent: Extent):
+    return self._size.get(extent[0]) == extent[1]
+
+
+  def _before(self, off: int) -> Optional[int]:
+    """Наибольшее смещение участка, меньшее off, или None"""
+    k = bisect_left(self._heads, off) - 1
+    if k < 0:
+      return None
+    block = self._offs[k]
+    return block[bisect_left(block, off) - 1]
+
+  def _remax(self, k: int):
+    self._maxs[k] = max(self._size[off] for off in self._offs[k])
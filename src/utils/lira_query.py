@@ -0,0 +1,250 @@
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from operator import attrgetter
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Union
+
+
+class LiraQuery:
+  """
+  Запрос к LiraRepo (создаётся repo.query()): условия, сортировка, offset / limit и проекция
+
+  posts = (repo.query()
+           .where('type', Action.TG_AUTO_FORWARD)  # равенство
+           .where(lambda a: a.creator == chat)     # произвольное условие
+           .between('start', since, until)         # since <= start <= until
+           .orderBy('id', reverse=True)
+           .offset(20).limit(10)
+           .select('id', 'chat')
+           .all())
+
+  Поле — это имя индекса репозитория (значение поля — ключ значения в этом индексе), 'key' — ключ значения
+  в репозитории, иначе — атрибут значения
+
+  Одно условие выбирается для доступа к значениям: равенство или whereIn по ключу, затем по индексу (поиск в
+  индексе), затем between по упорядоченному индексу (диапазон индекса). Если таких условий нет, а orderBy —
+  по упорядоченному индексу, в котором есть все значения, то значения обходятся в его порядке, и обход
+  останавливается, как только набраны offset + limit значений; если же значения найдены поиском, а orderBy —
+  по упорядоченному индексу, то по ключам этого индекса упорядочиваются найденные ключи, и значения не нужно
+  строить, чтобы их отсортировать. Иначе перебираются все значения, причём все
+  условия проверяются при переборе (у ленивого репозитория — по проекции, не строя значения). Остальные
+  условия проверяются для каждого найденного значения; сортировка выполняется, только если порядок обхода не
+  совпадает с orderBy. Ещё не построенные значения ленивого репозитория, найденные по ключам, читаются
+  порциями — одним get_many на порцию. explain() показывает выбранный план
+  """
+
+  def __init__(self, repo):
+    self.repo = repo
+    self._conds = []  # [(вид, поле, аргументы)], вид — '=', 'in', 'between' или 'if'
+    self._order = None  # (поле, reverse)
+    self._offset = 0
+    self._limit = None
+    self._select = None
+
+
+  def where(self, field: Union[str, Callable], value: Any = None) -> 'LiraQuery':
+    """
+    Условие «поле равно value» или, если вместо поля передана функция, условие «функция от значения истинна»
+    """
+    if callable(field):
+      self._conds.append(('if', None, field))
+    else:
+      self._conds.append(('=', field, value))
+    return self
+
+  def whereIn(self, field: str, values: Iterable) -> 'LiraQuery':
+    """Условие «поле равно одному из values»"""
+    self._conds.append(('in', field, list(values)))
+    return self
+
+  def between(self, field: str, lo: Any = None, hi: Any = None) -> 'LiraQuery':
+    """Условие lo <= поле <= hi (None — без границы; значения, у которых поле None, не подходят)"""
+    self._conds.append(('between', field, (lo, hi)))
+    return self
+
+  def orderBy(self, field: str, reverse: bool = False) -> 'LiraQuery':
+    """Упорядочить значения по полю"""
+    self._order = field, reverse
+    return self
+
+  def offset(self, n: int) -> 'LiraQuery':
+    """Пропустить первые n значений"""
+    self._offset = n
+    return self
+
+  def limit(self, n: int) -> 'LiraQuery':
+    """Вернуть не больше n значений"""
+    self._limit = n
+    return self
+
+  def select(self, *fields: Union[str, Callable]) -> 'LiraQuery':
+    """
+    Возвращать вместо значений поле (одно поле), кортеж полей (несколько) или результат функции от значения
+    """
+    self._select = fields
+    return self
+
+
+  def all(self) -> List[Any]:
+    """Все найденные значения"""
+    return list(self)
+
+  def first(self) -> Optional[Any]:
+    """Первое найденное значение или None"""
+    return next(iter(self), None)
+
+  def count(self) -> int:
+    """Число найденных значений (с учётом offset и limit)"""
+    return sum(1 for _ in self)
+
+  def explain(self) -> str:
+    """План выполнения запроса: по строке на шаг (SEARCH — поиск по ключу или индексу, SCAN — обход)"""
+    return '\n'.join(self._plan()[0])
+
+  def __iter__(self) -> Iterator[Any]:
+    _, values, ordered = self._plan()
+    if self._order is not None and not ordered:
+      field, reverse = self._order
+      get = self._field(field)
+
+      def key(value):
+        fieldValue = get(value)
+        return fieldValue is None, fieldValue
+      values = iter(sorted(values, key=key, reverse=reverse))
+    stop = None if self._limit is None else self._offset + self._limit
+    values = islice(values, self._offset, stop)
+    if self._select is None:
+      return values
+    getters = [field if callable(field) else self._field(field) for field in self._select]
+    if len(getters) == 1:
+      return map(getters[0], values)
+    return (tuple(get(value) for get in getters) for value in values)
+
+
+  def _plan(self) -> (List[str], Iterator[Any], bool):
+    """(шаги плана для explain, итератор по найденным значениям, совпадает ли их порядок с orderBy)"""
+    repo = self.repo
+    cat = repo.liraCat
+    access, rank = None, None
+    for cond in self._conds:
+      kind, field, _ = cond
+      if kind in ('=', 'in') and field == 'key':
+        condRank = 0
+      elif kind in ('=', 'in') and field in repo.INDEXES:
+        condRank = 1
+      elif kind == 'between' and field in repo.INDEXES and repo.INDEXES[field].sorted:
+        condRank = 2
+      else:
+        continue
+      if rank is None or condRank < rank:
+        access, rank = cond, condRank
+    rest = [cond for cond in self._conds if cond is not access]
+    order, reverse = self._order if self._order is not None else (None, False)
+    ordered = False
+    if rank == 0:
+      keys = [access[2]] if access[0] == '=' else list(dict.fromkeys(access[2]))
+      steps = [f'SEARCH {cat} USING KEY ({self._describe(access)})']
+    elif rank == 1:
+      keys = self._indexed(access)
+      steps = [f'SEARCH {cat} USING INDEX {access[1]} ({self._describe(access)})']
+    elif rank == 2:
+      indexKeys, keysInOrder = repo._sortedIndex(access[1])
+      lo, hi = access[2]
+      keys = keysInOrder[0 if lo is None else bisect_left(indexKeys, lo):
+                         len(indexKeys) if hi is None else bisect_right(indexKeys, hi)]
+      ordered = order == access[1]
+      steps = [f'SEARCH {cat} USING SORTED INDEX {access[1]} ({self._describe(access)})']
+    elif order in repo.INDEXES and repo.INDEXES[order].sorted and \
+        len(repo._sortedIndex(order)[1]) == len(repo.values):
+      keys = list(repo._sortedIndex(order)[1])
+      ordered = True
+      steps = [f'SCAN {cat} USING SORTED INDEX {order}']
+    else:
+      keys = None
+      tests = [self._test(cond) for cond in rest]
+      values = (value for _, _, value in repo._matching(lambda value: all(test(value) for test in tests)))
+      steps = [f'SCAN {cat}' + (' (BY PROJECTION)' if repo.LAZY else '')]
+      steps.extend(f'  WHERE {self._describe(cond)}' for cond in rest)
+      rest = []
+    if keys is not None and not ordered and order in repo.INDEXES and repo.INDEXES[order].sorted:
+      at = list(repo.INDEXES).index(order)
+
+      def indexKey(key):
+        indexKeys = repo._indexKeys.get(key)
+        indexKey = None if indexKeys is None else indexKeys[at]
+        return indexKey is None, indexKey
+      keys.sort(key=indexKey)
+      ordered = True
+    if keys is not None:
+      if ordered and reverse:
+        keys.reverse()
+      batch = None
+      if ordered and len(rest) == 0 and self._limit is not None:
+        batch = self._offset + self._limit
+      values = repo._valuesOf(keys, batch)
+    if len(rest) > 0:
+      tests = [self._test(cond) for cond in rest]
+      values = (value for value in values if all(test(value) for test in tests))
+      steps.extend(f'FILTER {self._describe(cond)}' for cond in rest)
+    if order is not None:
+      desc = ' DESC' if reverse else ''
+      steps.append(f'ORDER BY {order}{desc} USING SORTED INDEX' if ordered else f'SORT BY {order}{desc}')
+    if self._offset > 0 or self._limit is not None:
+      steps.append(f'OFFSET {self._offset} LIMIT {"ALL" if self._limit is None else self._limit}')
+    if self._select is not None:
+      steps.append('SELECT ' + ', '.join(field if isinstance(field, str) else '<function>'
+                                         for field in self._select))
+    return steps, values, ordered
+
+  def _indexed(self, cond) -> list:
+    """Ключи значений, найденных по индексу условием '=' или 'in'"""
+    kind, field, arg = cond
+    index = self.repo._indexes[field]
+    keys = dict()
+    for indexKey in ([arg] if kind == '=' else arg):
+      found = index.get(indexKey)
+      if found is None:
+        continue
+      if not isinstance(found, dict):
+        keys[found] = None
+      else:
+        keys.update(found)
+    return list(keys)
+
+  def _field(self, field: str) -> Callable:
+    if field == 'key':
+      return self.repo.keyByValue
+    index = self.repo.INDEXES.get(field)
+    if index is not None:
+      return index.key
+    return attrgetter(field)
+
+  def _test(self, cond) -> Callable:
+    kind, field, arg = cond
+    if kind == 'if':
+      return arg
+    get = self._field(field)
+    if kind == '=':
+      return lambda value: get(value) == arg
+    if kind == 'in':
+      try:
+        arg = set(arg)
+      except TypeError:
+        pass
+      return lambda value: get(value) in arg
+    lo, hi = arg
+
+    def between(value):
+      fieldValue = get(value)
+      return fieldValue is not None and (lo is None or lo <= fieldValue) and (hi is None or fieldValue <= hi)
+    return between
+
+  @staticmethod
+  def _describe(cond) -> str:
+    kind, field, arg = cond
+    if kind == 'if':
+      return '<function>'
+    if kind == '=':
+      return f'{field} = ?'
+    if kind == 'in':
+      return f'{field} IN ({len(arg)})'
+    return f'{field} BETWEEN {"?" if arg[0] is not None else "-inf"} AND {"?" if arg[1] is not None else "+inf"}'
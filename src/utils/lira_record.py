@@ -0,0 +1,231 @@
+import pickle
+import struct
+import zlib
+
+from array import array
+from bisect import bisect_left
+from typing import Any, BinaryIO, Iterator, Optional, Tuple
+
+
+class LiraCorruptedError(Exception):
+  """Запись в файле данных или журнале Лиры повреждена"""
+  pass
+
+
+class LiraMisplacedError(LiraCorruptedError):
+  """На месте объекта в файле данных лежит запись другого объекта"""
+  pass
+
+
+# Запись в файле данных:
+#   MAGIC | длина описания | длина содержимого | crc32(описание + содержимое)
+#   описание — pickle кортежа (id, cat, meta, tag, seq)
+#   содержимое — объект, закодированный кодеком
+# При удалении объекта MAGIC записи заменяется на DEAD, чтобы восстановление
+# не воскрешало удалённые объекты; seq растёт от записи к записи, поэтому из
+# нескольких живых записей одного id восстанавливается последняя
+MAGIC = b'LRc\x01'
+DEAD = b'LRd\x01'
+HEAD = struct.Struct('<4sIII')
+
+# Пакет в журнале: длина | crc32 | pickle списка записей
+BATCH = struct.Struct('<II')
+
+
+def frame(id, cat, meta, tag, seq: int, payload: bytes) -> bytes:
+  """Упаковать объект в запись файла данных"""
+  info = pickle.dumps((id, cat, meta, tag, seq))
+  crc = zlib.crc32(payload, zlib.crc32(info))
+  return b''.join([HEAD.pack(MAGIC, len(info), len(payload), crc), info, payload])
+
+
+def unframe(dump, id=None) -> Any:
+  """
+  Достать содержимое из записи файла данных, проверив контрольную сумму
+  (запись, уже помеченная DEAD, но ещё не удалённая из заголовка, читается
+  как обычно); объекты, записанные до появления записей, возвращаются как есть
+
+  :param id: если указан, то проверяется, что запись принадлежит объекту id
+  """
+  if dump[:4] != MAGIC and dump[:4] != DEAD:
+    return dump
+  _, ilen, plen, crc = HEAD.unpack_from(dump)
+  body = memoryview(dump)[HEAD.size:HEAD.size + ilen + plen]
+  if len(body) != ilen + plen or zlib.crc32(body) != crc:
+    raise LiraCorruptedError('checksum mismatch')
+  if id is not None and pickle.loads(body[:ilen])[0] != id:
+    raise LiraMisplacedError(f'record of another object in place of {id!r}')
+  return body[ilen:]
+
+
+def record_info(dump) -> Optional[tuple]:
+  """
+  Описание (id, cat, meta, tag, seq) записи файла данных или None, если это
+  не целая запись (повреждена, недописана или объект записан до появления записей)
+  """
+  if len(dump) < HEAD.size or dump[:4] != MAGIC and dump[:4] != DEAD:
+    return None
+  _, ilen, plen, crc = HEAD.unpack_from(dump)
+  body = memoryview(dump)[HEAD.size:HEAD.size + ilen + plen]
+  if len(body) != ilen + plen or zlib.crc32(body) != crc:
+    return None
+  return pickle.loads(body[:ilen])
+
+
+def pack_batch(records: list) -> bytes:
+  dump = pickle.dumps(records)
+  return BATCH.pack(len(dump), zlib.crc32(dump)) + dump
+
+
+def read_batches(file: BinaryIO) -> Iterator[list]:
+  """
+  Пакеты журнала по порядку; чтение останавливается на первом неполном или
+  повреждённом пакете (хвост, недописанный из-за сбоя)
+  """
+  while True:
+    head = file.read(BATCH.size)
+    if len(head) < BATCH.size:
+      return
+    size, crc = BATCH.unpack(head)
+    dump = file.read(size)
+    if len(dump) < size or zlib.crc32(dump) != crc:
+      return
+    yield pickle.loads(dump)
+
+
+def scan(file: BinaryIO, chunk: int = 16 * 1024 * 1024) -> Iterator[Tuple[int, int, tuple]]:
+  """
+  Последовательно просмотреть файл данных и найти все целые живые записи
+
+  :param file: файл данных, открытый на чтение
+
+  :param chunk: размер блока чтения
+
+  :return: итератор по (смещение, размер записи, (id, cat, meta, tag, seq))
+  """
+  size = file.seek(0, 2)
+  file.seek(0, 0)
+  buf = file.read(chunk)
+  eof = len(buf) < chunk
+  base = 0  # смещение buf в файле
+  pos = 0   # позиция поиска в buf
+  while True:
+    i = buf.find(MAGIC, pos)
+    if i < 0 or len(buf) - i < HEAD.size:
+      if eof:
+        return
+      drop = max(pos, len(buf) - len(MAGIC) + 1) if i < 0 else i
+      more = file.read(chunk)
+      eof = len(more) < chunk
+      base += drop
+      buf = buf[drop:] + more
+      pos = 0
+      continue
+
+    _, ilen, plen, crc = HEAD.unpack_from(buf, i)
+    end = i + HEAD.size + ilen + plen
+    if base + end > size:
+      pos = i + 1
+      continue
+    if end > len(buf) and not eof:
+      more = file.read(max(chunk, end - len(buf)))
+      eof = len(more) < max(chunk, end - len(buf))
+      base += i
+      buf = buf[i:] + more
+      pos = 0
+      continue
+    if end > len(buf):
+      pos = i + 1
+      continue
+
+    body = memoryview(buf)[i + HEAD.size:end]
+    if zlib.crc32(body) != crc:
+      pos = i + 1
+      continue
+    try:
+      info = pickle.loads(body[:ilen])
+    except Exception:
+      pos = i + 1
+      continue
+    yield base + i, end - i, info
+    pos = end
+
+
+# Файл заголовков (начиная с версии 4):
+#   HEADS | длина оглавления | оглавление | блоки
+#   оглавление — pickle словаря {'info': ..., 'fpls': (смещение, длина),
+#   'cats': {cat: (смещение, длина)}, 'ids': {cat: id категории}}, смещения
+#   блоков отсчитываются от конца оглавления; блок свободных участков — pickle
+#   множества участков, блок категории — pickle словаря {id: заголовок объекта}.
+#   Оглавление читается при открытии, блоки категорий — при первом обращении к
+#   категории. id категории — упорядоченный массив int64 (см. pack_ids), по
+#   нему объект ищется без чтения блоков; категорий, среди id которых есть не
+#   целые, в 'ids' нет (как и самого 'ids' в файлах, записанных раньше)
+HEADS = b'LRh\x04'
+INDEX = struct.Struct('<4sQ')
+
+
+def write_index(file: BinaryIO, info: dict, fpls: bytes, blocks: dict, ids: dict = None) -> Tuple[int, dict]:
+  """
+  Записать файл заголовков
+
+  :param fpls: блок свободных участков
+
+  :param blocks: {cat: блок категории}
+
+  :param ids: {cat: id категории, упакованные pack_ids}
+
+  :return: смещение первого блока в файле и {cat: (смещение, длина)}
+  относительно него
+  """
+  cats, pos = {}, len(fpls)
+  for cat, block in blocks.items():
+    cats[cat] = (pos, len(block))
+    pos += len(block)
+  index = pickle.dumps({'info': info, 'fpls': (0, len(fpls)), 'cats': cats, 'ids': ids or {}})
+  file.write(INDEX.pack(HEADS, len(index)))
+  file.write(index)
+  file.write(fpls)
+  for block in blocks.values():
+    file.write(block)
+  return INDEX.size + len(index), cats
+
+
+def read_index(file: BinaryIO) -> Optional[Tuple[dict, int]]:
+  """
+  Прочитать оглавление файла заголовков
+
+  :return: оглавление и смещение первого блока или None, если файл записан
+  в прежнем формате (тогда позиция в файле возвращается в начало)
+  """
+  head = file.read(INDEX.size)
+  if len(head) < INDEX.size or head[:len(HEADS)] != HEADS:
+    file.seek(0, 0)
+    return None
+  _, size = INDEX.unpack(head)
+  return pickle.loads(file.read(size)), INDEX.size + size
+
+
+def pack_ids(ids) -> Optional[bytes]:
+  """
+  Упаковать id категории для оглавления: упорядоченный массив int64 или None,
+  если среди id есть не целые (или не помещающиеся в int64)
+  """
+  if not all(type(id) is int and -2 ** 63 <= id < 2 ** 63 for id in ids):
+    return None
+  return array('q', sorted(ids)).tobytes()
+
+
+def unpack_ids(packed: bytes) -> array:
+  """Массив id, упакованный pack_ids"""
+  ids = array('q')
+  ids.frombytes(packed)
+  return ids
+
+
+def has_id(ids: array, id) -> bool:
+  """Есть ли id в массиве, распакованном unpack_ids"""
+  if type(id) is not int:
+    return False
+  i = bisect_left(ids, id)
+  return i < len(ids) and ids[i] == id
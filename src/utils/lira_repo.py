@@ -1,34 +1,102 @@
 from abc import abstractmethod
-from typing import Optional, TypeVar, Callable, List, Any
+from bisect import bisect_left, bisect_right
+from threading import Lock, RLock
+from typing import Optional, TypeVar, Callable, List, Any, Union
 
 from src.utils.lira import Lira
+from src.utils.lira_async import AsyncLira
+from src.utils.lira_query import LiraQuery
+from src.utils.lira_writer import LiraWriter
 
 T = TypeVar('T')
 Key = TypeVar('Key')
 
 
+class LiraIndex:
+  """
+  Объявление вторичного индекса репозитория (см. LiraRepo.INDEXES)
+  """
+  
+  def __init__(self, key: Callable, unique: bool = False, sorted: bool = False):
+    """
+    :param key: функция, которая по значению возвращает его ключ в индексе (если None, то значение в индекс не
+    попадает)
+    
+    :param unique: по ключу находится одно значение (иначе — список всех значений с этим ключом); если значений с
+    одним ключом всё же несколько, то находится первое добавленное, а после его удаления — следующее
+    
+    :param sorted: поддерживать ещё и упорядоченный по ключу список значений — по нему запросы (LiraRepo.query)
+    выполняют orderBy и between без сортировки и полного перебора
+    """
+    self.key = key
+    self.unique = unique
+    self.sorted = sorted
+
+
 class LiraRepo:
   """
   Базовый класс для классов, представляющих собой репозиторий сериализуемых объектов, сохраняющихся на диске с
   помощью Lira
+  
+  Наследники могут объявить вторичные индексы — словарь INDEXES {имя: LiraIndex}; индексы поддерживаются
+  при put, remove и изменении значений, а значения по ключу индекса находятся за O(1) методом findBy:
+  
+  INDEXES = {'chat_id': LiraIndex(lambda d: d.chat.chatId, unique=True)}
+  destination = repo.findBy('chat_id', chat_id)
+  
+  Если передан writer (LiraWriter), то изменения значений записываются на диск не сразу, а пачками из его
+  фонового потока (добавление и удаление значений по-прежнему записываются сразу); записать отложенное
+  немедленно — sync
+  
+  Ленивый репозиторий (LAZY = True) при создании не читает значения: ключ значения и его ключи в индексах
+  хранятся в метаинформации Lira, а само значение строится при первом обращении к нему (find, findBy);
+  findIf, findAll и removeAll проверяют незагруженные значения по проекции (projectSerialized) и строят только
+  подошедшие. Значения, записанные без метаинформации, при первом запуске читаются один раз (ключ берётся
+  из keyBySerialized) и перезаписываются уже с ней
+  
+  Запросы с условиями, сортировкой, limit / offset и проекцией — query() (см. LiraQuery); там, где можно,
+  они выполняются по индексам, а explain() показывает план
+  
+  newId резервирует идентификаторы блоками по ID_BLOCK одной записью счётчика в Lira и выдаёт их из памяти;
+  в счётчике хранится граница зарезервированного, поэтому после сбоя невыданные идентификаторы блока
+  пропускаются, но никогда не выдаются повторно
   """
   LIRA_COUNTER_ID_CATEGORY = 'id_counter'
+  INDEXES: {str: LiraIndex} = {}
+  LAZY = False
+  LAZY_BATCH = 256
+  ID_BLOCK = 64
   
   
-  def __init__(self, lira: Lira, lira_cat: str, lira_counter_id: str = None):
+  def __init__(self, lira: Lira, lira_cat: str, lira_counter_id: str = None, writer: LiraWriter = None):
     """
     :param lira: объект Lira, с помощью которого будут сохраняться объекты
     
     :param lira_cat: категория объектов, которая будет использоваться в Lira
     
     :param lira_counter_id: идентификатор счётчика идентификаторов (будет сформирован автоматически)
+    
+    :param writer: отложенная запись изменений значений (если None, то каждое изменение записывается сразу)
     """
     self.lira = lira
+    self.writer = writer
     self.liraCat = lira_cat
     self.liraCounterId = (lira_cat + '_id_counter'
                           if lira_counter_id is None else
                           lira_counter_id)
-    self.values: {Key, (int, T)} = self._deserializeValues()
+    # индекс — {ключ индекса: ключ}, а если у нескольких значений один ключ индекса — {ключ индекса: {ключ:
+    # None}} в порядке добавления (словарь на каждый ключ индекса дорог, когда почти все ключи различны)
+    self._indexes: {str: dict} = {name: dict() for name in self.INDEXES}
+    self._indexKeys: {Key: tuple} = dict()  # ключи значения в индексах (в порядке INDEXES)
+    # упорядоченные индексы — ([ключ индекса, ...], [ключ, ...]) по возрастанию ключа индекса; None — список
+    # ещё не построен (строится при первом запросе)
+    self._sorted: {str: Optional[tuple]} = {name: None for name, index in self.INDEXES.items() if index.sorted}
+    self._loading = RLock()
+    self._idLock = Lock()
+    self._nextId = 1
+    self._idLimit = 0  # последний зарезервированный идентификатор
+    # у ленивого репозитория вместо ещё не построенного значения — None
+    self.values: {Key, (int, Optional[T])} = self._loadValues() if self.LAZY else self._deserializeValues()
 
 
   @abstractmethod
@@ -79,6 +147,23 @@ class LiraRepo:
     pass
 
 
+  def keyBySerialized(self, serialized: {str: Any}) -> Key:
+    """
+    Ключ значения по сериализованному объекту (нужен ленивому репозиторию для значений, записанных без
+    метаинформации); по умолчанию значение строится целиком
+    """
+    return self.keyByValue(self.valueFromSerialized(serialized=serialized))
+
+
+  def projectSerialized(self, serialized: {str: Any}) -> Any:
+    """
+    Лёгкая проекция сериализованного объекта, по которой ленивый репозиторий проверяет предикаты findIf,
+    findAll и removeAll для ещё не построенных значений (у проекции должны быть те поля значения, которые
+    используют предикаты); по умолчанию значение строится целиком
+    """
+    return self.valueFromSerialized(serialized=serialized)
+
+
   def put(self, value: T) -> T:
     """
     Добавить значение в репозиторий
@@ -87,13 +172,25 @@ class LiraRepo:
     
     :return: возвращает value
     """
-    lira_id = self.lira.put(self.valueToSerialized(value), cat=self.liraCat)
+    key = self.keyByValue(value)
+    lira_id = self.lira.put(self.valueToSerialized(value), cat=self.liraCat, meta=self._meta(key, value))
     self.lira.flush()
-    self.values[self.keyByValue(value)] = lira_id, value
+    self.values[key] = lira_id, value
+    self._index(key, value)
     self.addValueListener(value, self._onValueChanged)
     return value
   
 
+  def batch(self):
+    """
+    Контекст, внутри которого изменения репозитория (и любых других репозиториев на той же Lira) не сбрасываются
+    на диск по отдельности, а записываются вместе при выходе из самого внешнего контекста
+    
+    :return: контекстный менеджер транзакции Lira
+    """
+    return self.lira.transaction()
+  
+
   def find(self, key: Key, maker: Callable = None, with_id: bool = False) -> Optional[T]:
     """
     Найти значение по ключу; если значение не найдено и указано поле maker, то объект создаётся вызовом этой
@@ -108,9 +205,9 @@ class LiraRepo:
     
     :return: найденный или созданный объект или None
     """
-    value = self.values.get(key)
-    if value is not None:
-      return value[1]
+    item = self.values.get(key)
+    if item is not None:
+      return self._value(key, item)
     if maker is None:
       return None
     value = maker(key, self.newId()) if with_id else maker(key)
@@ -118,6 +215,39 @@ class LiraRepo:
     return value
   
   
+  def findBy(self, index: str, key: Any) -> Union[Optional[T], List[T]]:
+    """
+    Найти значения по ключу вторичного индекса (см. INDEXES)
+    
+    :param index: имя индекса
+    
+    :param key: ключ в индексе
+    
+    :return: для уникального индекса — значение или None, иначе — список значений (возможно, пустой)
+    """
+    found = self._indexes[index].get(key)
+    if self.INDEXES[index].unique:
+      if isinstance(found, dict):
+        found = next(iter(found))
+      return None if found is None else self._value(found)
+    if found is None:
+      return []
+    if not isinstance(found, dict):
+      return [self._value(found)]
+    return [self._value(valueKey) for valueKey in list(found)]
+  
+  
+  def query(self) -> LiraQuery:
+    """
+    Запрос к репозиторию:
+    
+    repo.query().where('type', Action.TG_AUTO_FORWARD).orderBy('id').limit(10).all()
+    
+    :return: новый запрос (см. LiraQuery)
+    """
+    return LiraQuery(self)
+  
+  
   def findIf(self, predicat: Callable) -> Optional[T]:
     """
     Найти первый объект, который удовлетворяет предикату
@@ -126,9 +256,8 @@ class LiraRepo:
     
     :return: найденное значение или None
     """
-    for _, value in self.values.values():
-      if predicat(value):
-        return value
+    for _, _, value in self._matching(predicat):
+      return value
     return None
   
   
@@ -140,7 +269,7 @@ class LiraRepo:
     
     :return: найденные объекты
     """
-    return [value for _, value in self.values.values() if predicat(value)]
+    return [value for _, _, value in self._matching(predicat)]
 
 
   def remove(self, key: Key) -> Optional[T]:
@@ -153,8 +282,11 @@ class LiraRepo:
     """
     try:
       lira_id, value = self.values.pop(key)
-      self.lira.pop(id=lira_id)
+      self._forget(key)
+      serialized = self.lira.pop(id=lira_id)
       self.lira.flush()
+      if value is None and serialized is not None:
+        value = self.valueFromSerialized(serialized=serialized)
       return value
     except KeyError:
       return None
@@ -170,43 +302,335 @@ class LiraRepo:
     """
     keys = []
     values = []
-    for key, (lira_id, value) in self.values.items():
-      if predicat(value):
-        keys.append((key, lira_id))
-        values.append(value)
-    for key, lira_id in keys:
+    for key, lira_id, value in list(self._matching(predicat)):
+      keys.append((key, lira_id))
+      values.append(value)
+    for key, _ in keys:
       self.values.pop(key)
-      self.lira.pop(id=lira_id)
+      self._forget(key)
+    self.lira.out_many([lira_id for _, lira_id in keys])
     self.lira.flush()
     return values
 
 
+  def sync(self):
+    """
+    Записать на диск отложенные изменения значений (всех репозиториев с тем же writer) прямо сейчас; без writer
+    ничего не делает
+    """
+    if self.writer is not None:
+      self.writer.sync()
+
+
   def newId(self) -> int:
     """
     Вернуть новое уникальное значение (идентификатор) для нового объекта
     
     :return: идентификатор
     """
-    counter = self.lira.get(id=self.liraCounterId, default=0)
-    counter += 1
-    self.lira.put(counter, id=self.liraCounterId, cat=LiraRepo.LIRA_COUNTER_ID_CATEGORY)
-    self.lira.flush()
-    return counter
+    with self._idLock:
+      if self._nextId > self._idLimit:
+        counter = self.lira.get(id=self.liraCounterId, default=0)
+        self.lira.put(counter + self.ID_BLOCK, id=self.liraCounterId, cat=LiraRepo.LIRA_COUNTER_ID_CATEGORY)
+        self.lira.flush()
+        self._nextId, self._idLimit = counter + 1, counter + self.ID_BLOCK
+      id = self._nextId
+      self._nextId += 1
+      return id
+
+
+  async def putAsync(self, value: T) -> T:
+    """
+    То же, что put, но запись на диск не блокирует цикл событий asyncio (выполняется в потоке ввода-вывода
+    AsyncLira)
+    """
+    key = self.keyByValue(value)
+    alira = AsyncLira.of(self.lira)
+    lira_id = await alira.put(self.valueToSerialized(value), cat=self.liraCat, meta=self._meta(key, value))
+    await alira.flush()
+    self.values[key] = lira_id, value
+    self._index(key, value)
+    self.addValueListener(value, self._onValueChanged)
+    return value
+
+
+  async def findAsync(self, key: Key, maker: Callable = None, with_id: bool = False) -> Optional[T]:
+    """
+    То же, что find; найденное значение возвращается без ожидания (незагруженное значение ленивого
+    репозитория читается через AsyncLira), а созданное записывается через putAsync
+    """
+    item = self.values.get(key)
+    if item is not None:
+      if item[1] is not None:
+        return item[1]
+      return self._materialize(key, item[0], await AsyncLira.of(self.lira).get(item[0]))
+    if maker is None:
+      return None
+    value = maker(key, await self.newIdAsync()) if with_id else maker(key)
+    await self.putAsync(value)
+    return value
+
+
+  async def removeAsync(self, key: Key) -> Optional[T]:
+    """То же, что remove, но удаление с диска не блокирует цикл событий asyncio"""
+    item = self.values.pop(key, None)
+    if item is None:
+      return None
+    self._forget(key)
+    lira_id, value = item
+    alira = AsyncLira.of(self.lira)
+    serialized = await alira.pop(lira_id)
+    await alira.flush()
+    if value is None and serialized is not None:
+      value = self.valueFromSerialized(serialized=serialized)
+    return value
+
+
+  async def removeAllAsync(self, predicat: Callable) -> [T]:
+    """То же, что removeAll, но удаление с диска не блокирует цикл событий asyncio"""
+    alira = AsyncLira.of(self.lira)
+    if self.LAZY:
+      items = await alira.run(lambda: list(self._matching(predicat)))
+    else:
+      items = list(self._matching(predicat))
+    for key, _, _ in items:
+      self.values.pop(key)
+      self._forget(key)
+    await alira.out_many([lira_id for _, lira_id, _ in items])
+    await alira.flush()
+    return [value for _, _, value in items]
+
+
+  async def newIdAsync(self) -> int:
+    """
+    То же, что newId; идентификатор из уже зарезервированного блока возвращается без ожидания, а новый блок
+    резервируется в потоке ввода-вывода AsyncLira
+    """
+    with self._idLock:
+      if self._nextId <= self._idLimit:
+        id = self._nextId
+        self._nextId += 1
+        return id
+    return await AsyncLira.of(self.lira).run(self.newId)
 
 
   def _deserializeValues(self) -> {Key: (int, T)}:
     values = {}
-    for lira_id in self.lira[self.liraCat]:
-      value = self.valueFromSerialized(serialized=self.lira.get(id=lira_id))
+    lira_ids = self.lira[self.liraCat]
+    for lira_id, serialized in zip(lira_ids, self.lira.get_many(lira_ids)):
+      value = self.valueFromSerialized(serialized=serialized)
       self.addValueListener(value, self._onValueChanged)
       values[self.keyByValue(value)] = lira_id, value
+      self._index(self.keyByValue(value), value)
     return values
   
   
+  def _loadValues(self) -> {Key: (int, Optional[T])}:
+    """Ключи ленивого репозитория из метаинформации Lira; значения без неё читаются и перезаписываются"""
+    values = {}
+    missing = []
+    for lira_id, meta in self.lira.metas(self.liraCat):
+      if not isinstance(meta, dict) or 'key' not in meta or len(meta.get('index', ())) != len(self.INDEXES):
+        missing.append(lira_id)
+        continue
+      values[meta['key']] = lira_id, None
+      if len(self.INDEXES) > 0:
+        self._indexAs(meta['key'], meta['index'])
+    if len(missing) == 0:
+      return values
+    with self.lira.transaction():
+      for start in range(0, len(missing), self.LAZY_BATCH):
+        lira_ids = missing[start:start + self.LAZY_BATCH]
+        for lira_id, serialized in zip(lira_ids, self.lira.get_many(lira_ids)):
+          key, value = self.keyBySerialized(serialized), None
+          if len(self.INDEXES) > 0:
+            value = self.valueFromSerialized(serialized=serialized)
+            self.addValueListener(value, self._onValueChanged)
+            self._index(key, value)
+          values[key] = lira_id, value
+          meta = {'key': key, 'index': self._indexKeys.get(key, ())}
+          self.lira.put(serialized, id=lira_id, cat=self.liraCat, meta=meta)
+    self.lira.flush()
+    return values
+
+
+  def _value(self, key: Key, item: (int, Optional[T]) = None) -> Optional[T]:
+    """Значение по ключу; незагруженное значение ленивого репозитория читается и строится"""
+    if item is None:
+      item = self.values.get(key)
+      if item is None:
+        return None
+    lira_id, value = item
+    if value is not None:
+      return value
+    return self._materialize(key, lira_id, self.lira.get(lira_id))
+
+
+  def _valuesOf(self, keys: List[Key], batch: int = None):
+    """
+    Значения по ключам в порядке keys (ключи без значений пропускаются); незагруженные значения ленивого
+    репозитория читаются порциями по batch (по умолчанию LAZY_BATCH) одним get_many на порцию
+    """
+    batch = self.LAZY_BATCH if batch is None else max(1, batch)
+    for start in range(0, len(keys), batch):
+      chunk = [(key, self.values.get(key)) for key in keys[start:start + batch]]
+      unloaded = [item[0] for _, item in chunk if item is not None and item[1] is None]
+      serialized = dict(zip(unloaded, self.lira.get_many(unloaded))) if len(unloaded) > 0 else {}
+      for key, item in chunk:
+        if item is None:
+          continue
+        value = item[1]
+        if value is None:
+          value = self._materialize(key, item[0], serialized[item[0]])
+        if value is not None:
+          yield value
+
+
+  def _materialize(self, key: Key, lira_id: int, serialized: {str: Any}) -> Optional[T]:
+    """
+    Построить значение ленивого репозитория из прочитанного объекта; если значение уже построено (другим
+    потоком), то возвращается оно, а если удалено — None
+    """
+    with self._loading:
+      item = self.values.get(key)
+      if item is None or item[0] != lira_id or serialized is None:
+        return None if item is None else item[1]
+      if item[1] is not None:
+        return item[1]
+      value = self.valueFromSerialized(serialized=serialized)
+      self.addValueListener(value, self._onValueChanged)
+      self.values[key] = lira_id, value
+      return value
+
+
+  def _matching(self, predicat: Callable):
+    """
+    (ключ, lira_id, значение) для всех значений, удовлетворяющих предикату; незагруженные значения ленивого
+    репозитория читаются порциями по LAZY_BATCH, проверяются по проекции и строятся, только если подошли
+    """
+    if not self.LAZY:
+      for key, (lira_id, value) in self.values.items():
+        if predicat(value):
+          yield key, lira_id, value
+      return
+    items = list(self.values.items())
+    for start in range(0, len(items), self.LAZY_BATCH):
+      chunk = items[start:start + self.LAZY_BATCH]
+      unloaded = [lira_id for _, (lira_id, value) in chunk if value is None]
+      serialized = dict(zip(unloaded, self.lira.get_many(unloaded))) if len(unloaded) > 0 else {}
+      for key, (lira_id, value) in chunk:
+        if value is None:
+          obj = serialized[lira_id]
+          if obj is None or not predicat(self.projectSerialized(obj)):
+            continue
+          value = self._materialize(key, lira_id, obj)
+          if value is None:
+            continue
+        elif not predicat(value):
+          continue
+        yield key, lira_id, value
+
+
+  def _meta(self, key: Key, value: T) -> Optional[dict]:
+    """Метаинформация значения в Lira: у ленивого репозитория — ключ и ключи в индексах"""
+    if not self.LAZY:
+      return None
+    return {'key': key, 'index': tuple(index.key(value) for index in self.INDEXES.values())}
+
+
   def _onValueChanged(self, value: T):
-    lira_id, value = self.values.get(self.keyByValue(value))
-    self.lira.put(self.valueToSerialized(value), id=lira_id, cat=self.liraCat)
+    key = self.keyByValue(value)
+    lira_id, value = self.values.get(key)
+    self._index(key, value)
+    if self.writer is not None:
+      self.writer.mark(self, key)
+      return
+    self.lira.put(self.valueToSerialized(value), id=lira_id, cat=self.liraCat, meta=self._meta(key, value))
     self.lira.flush()
 
 
+  def _persist(self, key: Key):
+    """Записать значение в Lira без flush (вызывается LiraWriter); удалённое значение пропускается"""
+    item = self.values.get(key)
+    if item is None or item[1] is None:
+      return
+    lira_id, value = item
+    self.lira.put(self.valueToSerialized(value), id=lira_id, cat=self.liraCat, meta=self._meta(key, value))
+
+
+  def _index(self, key: Key, value: T):
+    """Внести значение во все индексы (если оно уже было в них, то ключи индексов пересчитываются)"""
+    if len(self.INDEXES) == 0:
+      return
+    self._indexAs(key, tuple(index.key(value) for index in self.INDEXES.values()))
+
+
+  def _indexAs(self, key: Key, keys: tuple):
+    old = self._indexKeys.get(key)
+    if old == keys:
+      return
+    if old is not None:
+      self._unindex(key)
+    self._indexKeys[key] = keys
+    for (name, index), indexKey in zip(self.INDEXES.items(), keys):
+      if indexKey is None:
+        continue
+      found = self._indexes[name].get(indexKey)
+      if found is None:
+        self._indexes[name][indexKey] = key
+      elif isinstance(found, dict):
+        found[key] = None
+      elif found != key:
+        self._indexes[name][indexKey] = {found: None, key: None}
+      if index.sorted and self._sorted[name] is not None:
+        indexKeys, keysInOrder = self._sorted[name]
+        at = bisect_right(indexKeys, indexKey)
+        indexKeys.insert(at, indexKey)
+        keysInOrder.insert(at, key)
+
+
+  def _sortedIndex(self, name: str) -> (list, list):
+    """Упорядоченный индекс name: ([ключ индекса, ...], [ключ, ...]); при первом обращении строится"""
+    if self._sorted[name] is None:
+      at = list(self.INDEXES).index(name)
+      pairs = sorted(((keys[at], key) for key, keys in self._indexKeys.items() if keys[at] is not None),
+                     key=lambda pair: pair[0])
+      self._sorted[name] = [indexKey for indexKey, _ in pairs], [key for _, key in pairs]
+    return self._sorted[name]
+
+
+  def _forget(self, key: Key):
+    """Убрать удаляемое значение из индексов и из отложенной записи"""
+    self._unindex(key)
+    if self.writer is not None:
+      self.writer.discard(self, key)
+
+
+  def _unindex(self, key: Key):
+    keys = self._indexKeys.pop(key, None)
+    if keys is None:
+      return
+    for (name, index), indexKey in zip(self.INDEXES.items(), keys):
+      if indexKey is None:
+        continue
+      if index.sorted and self._sorted[name] is not None:
+        indexKeys, keysInOrder = self._sorted[name]
+        lo, hi = bisect_left(indexKeys, indexKey), bisect_right(indexKeys, indexKey)
+        at = keysInOrder.index(key, lo, hi)
+        del indexKeys[at]
+        del keysInOrder[at]
+      found = self._indexes[name].get(indexKey)
+      if found is None:
+        continue
+      if not isinstance(found, dict):
+        if found == key:
+          del self._indexes[name][indexKey]
+        continue
+      found.pop(key, None)
+      if len(found) == 0:
+        del self._indexes[name][indexKey]
+      elif len(found) == 1:
+        self._indexes[name][indexKey] = next(iter(found))
+
+
 # END
\ No newline at end of file
@@ -0,0 +1,410 @@
+import os
+
+from contextlib import contextmanager
+from threading import Lock, local
+from urllib.parse import quote, unquote
+
+from src.utils.lira import Lira
+from src.utils.lira_cache import LiraCache
+from src.utils.rwlock import RWLock
+
+
+class ShardedLira:
+  """
+  Хранилище с тем же интерфейсом, что и Lira, но каждая
+  категория (или группа категорий, см. groups) лежит в
+  своей Лире — своих файлах данных и заголовков, со своими
+  блокировками. Частые мелкие записи одних категорий
+  (счётчики id, action) не ждут записи больших объектов
+  других и не дробят их файл данных
+
+  Каждая Лира-осколок лежит в своём каталоге внутри root:
+  root/<имя>/data.lr и root/<имя>/head.lr. Категория
+  остаётся в том осколке, где она уже есть, поэтому
+  изменение groups касается только новых категорий
+
+  id объектов — общие для всех осколков: новые id выдаёт
+  сама ShardedLira, а осколок объекта находится по его
+  id (и запоминается): осколок ищет id в оглавлении
+  своих заголовков, не читая заголовков категорий, так
+  что промах в осколке ничего не читает. У каждого
+  осколка свой кэш объектов, поэтому восстановление
+  или перечитывание одного осколка не сбрасывает кэш
+  других. flush и transaction сбрасывают
+  все осколки, но атомарна запись только внутри одного
+  осколка: после сбоя посреди flush одни осколки могут
+  оказаться записанными, а другие — нет
+  """
+
+  DEFAULT = 'default'
+
+  def __init__(self, root, *, groups=None, cache=None, codec=None, **kwargs):
+    """
+    :param root: каталог с осколками
+
+    :param groups: {категория: имя осколка} — категории,
+    которые нужно хранить вместе; остальные категории
+    хранятся каждая в осколке со своим именем, объекты
+    без категории — в осколке DEFAULT
+
+    :param cache: образец кэша объектов (LiraCache): у
+    каждого осколка свой пустой кэш с теми же настройками
+    (LiraCache.fresh), так что ограничение политики
+    вытеснения действует на каждый осколок отдельно
+
+    :param codec: кодирование объектов (LiraCodec)
+
+    :param kwargs: остальные параметры Lira (group_commit,
+    compact_threshold, mmap) для каждого осколка
+    """
+    self._root = root
+    self._groups = dict(groups or {})
+    self._cache = LiraCache() if cache is None else cache
+    self._codec = codec
+    self._kwargs = kwargs
+    self._lock = Lock()
+    self._txlk = RWLock()
+    self._txdp = local()
+    self._shards = dict()  # {имя: Lira}
+    self._where = dict()   # {категория: имя осколка}
+    self._route = dict()   # {id: Lira осколка}
+    os.makedirs(root, exist_ok=True)
+    for name in sorted(os.listdir(root)):
+      if os.path.exists(os.path.join(root, name, 'head.lr')):
+        shard = self._open(unquote(name))
+        for cat in shard.cats():
+          self._where.setdefault(cat, unquote(name))
+    self._mnid = min([-1] + [shard._mnid for shard in self._shards.values()])
+
+
+
+  def flush(self):
+    """
+    Сбрасывает изменения всех осколков; внутри
+    transaction ничего не делает
+    """
+    if getattr(self._txdp, 'depth', 0) > 0:
+      return
+    with self._txlk.read():
+      self._flushAll()
+
+  @contextmanager
+  def transaction(self):
+    """
+    То же, что Lira.transaction, но атомарно только
+    внутри одного осколка. flush из других потоков
+    выполняются параллельно друг с другом и ждут только
+    открытых транзакций
+    """
+    depth = getattr(self._txdp, 'depth', 0)
+    if depth == 0:
+      self._txlk.acquire()
+    self._txdp.depth = depth + 1
+    try:
+      yield self
+    finally:
+      self._txdp.depth -= 1
+      if self._txdp.depth == 0:
+        try:
+          self._flushAll()
+        finally:
+          self._txlk.release()
+
+  def commitStats(self):
+    """Lira.commitStats, просуммированная по осколкам"""
+    stat = {}
+    for shard in self._all():
+      for key, value in shard.commitStats().items():
+        stat[key] = max(stat.get(key, value), value) if key == 'latency_max' else stat.get(key, 0) + value
+    return stat
+
+  def cacheStats(self):
+    """Lira.cacheStats, просуммированная по осколкам"""
+    stat = {'hits': 0, 'misses': 0, 'evictions': 0, 'items': 0, 'pinned': 0, 'bytes': 0}
+    for shard in self._all():
+      for key, value in shard.cacheStats().items():
+        stat[key] = stat.get(key, 0) + value
+    return stat
+
+  def changed(self):
+    """Есть ли несброшенные изменения хотя бы в одном осколке"""
+    return any(shard.changed() for shard in self._all())
+
+  def close(self):
+    """Закрывает все осколки"""
+    with self._txlk:
+      for shard in self._all():
+        shard.close()
+
+  def fragmentation(self):
+    """Доля дыр в занятой части файлов данных всех осколков"""
+    stat = self.arenaStats()
+    return 0.0 if stat['used'] == 0 else 1 - stat['live'] / stat['used']
+
+  def arenaStats(self):
+    """
+    Lira.arenaStats, просуммированная по осколкам;
+    shards — то же для каждого осколка отдельно
+    """
+    shards = {name: self._shards[name].arenaStats() for name in list(self._shards)}
+    stat = {'live': 0, 'used': 0, 'file': 0, 'holes': 0, 'largest_hole': 0}
+    for shardStat in shards.values():
+      for key in stat:
+        stat[key] = (max(stat[key], shardStat[key]) if key == 'largest_hole' else
+                     stat[key] + shardStat[key])
+    stat['shards'] = shards
+    return stat
+
+  def stats(self):
+    """
+    Lira.stats всех осколков: commits, cache, arena — в
+    сумме, shards — снимки каждого осколка (если осколкам
+    передан один LiraStats, то его ops, bytes и timings
+    — общие для всех)
+    """
+    shards = {name: self._shards[name].stats() for name in list(self._shards)}
+    cache = self.cacheStats()
+    requests = cache['hits'] + cache['misses']
+    cache['hit_rate'] = cache['hits'] / requests if requests > 0 else 0.0
+    arena = self.arenaStats()
+    arena.pop('shards')
+    arena['fragmentation'] = 0.0 if arena['used'] == 0 else 1 - arena['live'] / arena['used']
+    return {'commits': self.commitStats(), 'cache': cache, 'arena': arena, 'shards': shards}
+
+  def compact(self):
+    """Уплотняет все осколки; возвращает, на сколько байт они уменьшились"""
+    return sum(shard.compact() for shard in self._all())
+
+  def snapshot(self, path, incremental=False):
+    """
+    Lira.snapshot каждого осколка в path/<имя осколка>;
+    снимки осколков согласованы каждый по отдельности,
+    но не между собой
+    """
+    stat = {'objects': 0, 'copied': 0, 'bytes': 0}
+    for name in list(self._shards):
+      shardStat = self._shards[name].snapshot(os.path.join(path, quote(name, safe='')), incremental)
+      for key in stat:
+        stat[key] += shardStat[key]
+    return stat
+
+
+
+  def cat(self, id):
+    """
+    Возвращает категорию объекта с заданным id
+    если такового нет, возбуждается KeyError
+    """
+    shard = self._locate(id)
+    if shard is None:
+      raise KeyError(id)
+    return shard.cat(id)
+
+  def meta(self, id):
+    """
+    Метаинформация объекта с заданным id; если такого
+    объекта нет, возбуждается KeyError
+    """
+    shard = self._locate(id)
+    if shard is None:
+      raise KeyError(id)
+    return shard.meta(id)
+
+  def metas(self, cat):
+    """То же, что Lira.metas: пары (id, метаинформация) объектов категории"""
+    shard = self._shard(cat, create=False)
+    return [] if shard is None else shard.metas(cat)
+
+  def id(self, obj):
+    """То же, что Lira.id: поиск среди объектов в памяти всех осколков"""
+    for shard in self._all():
+      id = shard.id(obj)
+      if id is not None:
+        return id
+    return None
+
+  def cats(self):
+    """Список всех категорий"""
+    cats = []
+    for shard in self._all():
+      cats.extend(shard.cats())
+    return cats
+
+  def __iter__(self):
+    """Итератор по всем id"""
+    for shard in self._all():
+      yield from shard
+
+  def __getitem__(self, item):
+    """Список id всех объектов категории"""
+    shard = self._shard(item, create=False)
+    return [] if shard is None else shard[item]
+
+
+
+  def get(self, id, default=None):
+    """
+    Получение объекта по id если такового
+    нет, возвращается default (по умолчанию
+    None)
+    """
+    shard = self._locate(id)
+    return default if shard is None else shard.get(id, default)
+
+  def cached(self, id, default=None):
+    """То же, что Lira.cached: объект из кэша осколка в памяти"""
+    shard = self._route.get(id)
+    return default if shard is None else shard.cached(id, default)
+
+  def put(self, obj, *, id=None, cat=None, meta=None):
+    """
+    Записывает объект obj в осколок его категории и
+    возвращает его id; если указан существующий id, то
+    прежний объект замещается новым (и удаляется из
+    прежнего осколка, если категория сменилась)
+    """
+    shard = self._shard(cat)
+    if id is None:
+      id = self._nextid()
+    else:
+      self._relocate(id, shard)
+    shard.put(obj, id=id, cat=cat, meta=meta)
+    self._route[id] = shard
+    return id
+
+  def out(self, id):
+    """
+    Удаление существующего объекта ничего
+    не возвращает
+    """
+    shard = self._locate(id)
+    if shard is not None:
+      shard.out(id)
+      self._route.pop(id, None)
+
+  def pop(self, id, default=None):
+    """Удаляет объект и возвращает его"""
+    val = self.get(id, default)
+    self.out(id)
+    return val
+
+  def get_many(self, ids, default=None):
+    """
+    То же, что Lira.get_many: id группируются по
+    осколкам, и каждый осколок читает свои объекты
+    одним Lira.get_many
+    """
+    ids = list(ids)
+    objs = [default] * len(ids)
+    byShard = dict()
+    for i, id in enumerate(ids):
+      shard = self._locate(id)
+      if shard is not None:
+        byShard.setdefault(shard, []).append(i)
+    for shard, idxs in byShard.items():
+      for i, obj in zip(idxs, shard.get_many([ids[i] for i in idxs], default)):
+        objs[i] = obj
+    return objs
+
+  def scan_cat(self, cat, where=None, batch=256):
+    """То же, что Lira.scan_cat в осколке категории"""
+    shard = self._shard(cat, create=False)
+    if shard is not None:
+      yield from shard.scan_cat(cat, where=where, batch=batch)
+
+  def put_many(self, objs, *, ids=None, cat=None, meta=None):
+    """То же, что Lira.put_many: все объекты пишутся в осколок категории"""
+    objs = list(objs)
+    ids = [None] * len(objs) if ids is None else list(ids)
+    shard = self._shard(cat)
+    for i, id in enumerate(ids):
+      if id is None:
+        ids[i] = self._nextid()
+      else:
+        self._relocate(id, shard)
+    shard.put_many(objs, ids=ids, cat=cat, meta=meta)
+    for id in ids:
+      self._route[id] = shard
+    return ids
+
+  def out_many(self, ids):
+    """Удаление сразу нескольких объектов: по одному Lira.out_many на осколок"""
+    byShard = dict()
+    for id in ids:
+      shard = self._locate(id)
+      if shard is not None:
+        byShard.setdefault(shard, []).append(id)
+    for shard, shardIds in byShard.items():
+      shard.out_many(shardIds)
+      for id in shardIds:
+        self._route.pop(id, None)
+
+  def __call__(self, id, default=None):
+    """То же, что get"""
+    return self.get(id, default)
+
+
+
+  def _all(self):
+    with self._lock:
+      return list(self._shards.values())
+
+  def _open(self, name):
+    path = os.path.join(self._root, quote(name, safe=''))
+    os.makedirs(path, exist_ok=True)
+    shard = Lira(os.path.join(path, 'data.lr'), os.path.join(path, 'head.lr'),
+                 cache=self._cache.fresh(), codec=self._codec, **self._kwargs)
+    self._shards[name] = shard
+    return shard
+
+  def _shard(self, cat, create=True):
+    """Осколок категории cat; если его ещё нет — создаётся (или None, если create=False)"""
+    with self._lock:
+      name = self._where.get(cat)
+      if name is None:
+        if not create:
+          return None
+        name = self._groups.get(cat, ShardedLira.DEFAULT if cat is None else str(cat))
+        self._where[cat] = name
+      shard = self._shards.get(name)
+      if shard is None:
+        shard = self._open(name)
+      return shard
+
+  def _locate(self, id):
+    """
+    Осколок, в котором лежит объект id (или None): сначала
+    среди запомненных, затем по очереди во всех осколках;
+    осколок, в котором id нет, отвечает по оглавлению
+    заголовков (Lira._find), не читая категорий
+    """
+    shard = self._route.get(id)
+    if shard is not None:
+      return shard
+    for shard in self._all():
+      try:
+        shard.cat(id)
+      except KeyError:
+        continue
+      self._route[id] = shard
+      return shard
+    return None
+
+  def _relocate(self, id, shard):
+    """Перед записью id в shard удаляет его из другого осколка и сдвигает счётчик id"""
+    old = self._locate(id)
+    if old is not None and old is not shard:
+      old.out(id)
+    if isinstance(id, int):
+      with self._lock:
+        self._mnid = min(self._mnid, id - 1)
+
+  def _nextid(self):
+    with self._lock:
+      self._mnid -= 1
+      return self._mnid + 1
+
+  def _flushAll(self):
+    for shard in self._all():
+      if shard.changed():
+        shard.flush()
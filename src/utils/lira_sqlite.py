@@ -0,0 +1,463 @@
+import os
+import pickle
+import sqlite3
+import time
+
+from contextlib import contextmanager
+from threading import Lock, RLock, local
+
+from src.utils.lira_cache import LiraCache
+from src.utils.lira_codec import LiraCodec
+
+
+class SqliteLira:
+  """
+  Хранилище с тем же интерфейсом, что и Lira (get, put,
+  out, pop, cat, cats, индексация по категории, flush,
+  transaction), но поверх SQLite в режиме WAL: объекты
+  лежат в одной таблице, категория — индексированный
+  столбец. Читатели не ждут ни друг друга, ни писателя
+  (каждый поток читает через своё соединение), а
+  изменения, как и в Лире, копятся до flush и
+  фиксируются одной транзакцией SQLite
+
+  id объектов — целые числа или строки. Новые id
+  выдаются из счётчика в самой базе (таблица counter)
+  внутри транзакции записи, которая сразу берёт
+  блокировку записи базы (BEGIN IMMEDIATE), поэтому
+  несколько процессов на одной базе не выдают
+  одинаковых id
+  """
+
+  BATCH = 500
+
+  def __init__(self, path, *, cache=None, codec=None, timeout=30.0):
+    """
+    :param path: файл базы данных
+
+    :param cache: кэш объектов в памяти (LiraCache), как у Лиры
+
+    :param codec: кодирование объектов (LiraCodec), как у Лиры
+
+    :param timeout: сколько секунд ждать блокировки базы другим процессом
+    """
+    self._path = path
+    self._timeout = timeout
+    self._objv = LiraCache() if cache is None else cache
+    self._codec = LiraCodec() if codec is None else codec
+    self._lock = Lock()
+    self._txlk = RLock()
+    self._txdp = local()
+    self._local = local()
+    self._readers = []
+    self._dirty = False
+    self._stat = {
+      'commits': 0,
+      'latency_total': 0.0,
+      'latency_max': 0.0,
+    }
+
+    self._db = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                               check_same_thread=False)
+    self._db.execute('PRAGMA journal_mode=WAL')
+    self._db.execute('PRAGMA synchronous=NORMAL')
+    self._db.execute(
+      'CREATE TABLE IF NOT EXISTS objs '
+      '(id PRIMARY KEY, cat, meta BLOB, tag TEXT, obj BLOB NOT NULL)'
+    )
+    self._db.execute('CREATE INDEX IF NOT EXISTS objs_cat ON objs (cat)')
+    self._db.execute('CREATE TABLE IF NOT EXISTS counter (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+    self._db.execute(
+      "INSERT OR IGNORE INTO counter (name, value) "
+      "SELECT 'mnid', min(coalesce(MIN(id), 0) - 1, -1) FROM objs WHERE typeof(id) = 'integer'"
+    )
+    self._mnid = None  # следующий свободный id, пока открыта транзакция записи (иначе None)
+    self._mnidRead = None  # каким он был в начале транзакции
+
+
+
+  def flush(self):
+    """
+    Фиксирует накопившиеся изменения одной транзакцией
+    SQLite; внутри transaction ничего не делает
+    """
+    if getattr(self._txdp, 'depth', 0) > 0:
+      return
+    self._commit()
+
+  @contextmanager
+  def transaction(self):
+    """
+    То же, что Lira.transaction: flush откладывается до
+    выхода из самой внешней транзакции, и все изменения
+    фиксируются вместе
+    """
+    with self._txlk:
+      self._txdp.depth = getattr(self._txdp, 'depth', 0) + 1
+      try:
+        yield self
+      finally:
+        self._txdp.depth -= 1
+        if self._txdp.depth == 0:
+          self._commit()
+
+  def commitStats(self):
+    """Число фиксаций (commits), их суммарная и максимальная задержка"""
+    with self._lock:
+      return dict(self._stat)
+
+  def cacheStats(self):
+    """Статистика кэша объектов, как у Lira.cacheStats"""
+    return self._objv.stats()
+
+  def stats(self):
+    """То же, что Lira.stats: commits, cache (с долей попаданий hit_rate) и размер файлов базы"""
+    cache = self.cacheStats()
+    requests = cache['hits'] + cache['misses']
+    cache['hit_rate'] = cache['hits'] / requests if requests > 0 else 0.0
+    files = {}
+    for name, suffix in (('db', ''), ('wal', '-wal')):
+      try:
+        files[name] = os.path.getsize(self._path + suffix)
+      except OSError:
+        files[name] = 0
+    return {'commits': self.commitStats(), 'cache': cache, 'files': files}
+
+  def changed(self):
+    """Есть ли незафиксированные изменения"""
+    return self._dirty
+
+  def snapshot(self, path, incremental=False):
+    """
+    Согласованная копия базы на момент вызова в файл
+    path/lira.db (средствами backup API SQLite, без
+    остановки читателей и писателей)
+
+    incremental — если в path уже есть снимок, то он
+    обновляется на месте одной транзакцией: удаляются
+    объекты, которых больше нет, и переписываются только
+    изменившиеся. База при этом читается вся (объекты
+    сравниваются целиком), но пишется только разница
+
+    :return: {'objects', 'copied', 'bytes'}, как у Lira.snapshot
+    """
+    os.makedirs(path, exist_ok=True)
+    target = os.path.join(path, 'lira.db')
+    if incremental and os.path.exists(target):
+      return self._snapshotInto(target)
+    source = sqlite3.connect(self._path, timeout=self._timeout)
+    try:
+      with sqlite3.connect(target + '.tmp') as copy:
+        source.backup(copy)
+      count = source.execute('SELECT COUNT(*) FROM objs').fetchone()[0]
+    finally:
+      source.close()
+    copy.close()
+    os.replace(target + '.tmp', target)
+    return {'objects': count, 'copied': count, 'bytes': os.path.getsize(target)}
+
+  def _snapshotInto(self, target):
+    """Обновляет прежний снимок target до текущего состояния базы (см. snapshot)"""
+    source = sqlite3.connect(self._path, timeout=self._timeout, isolation_level=None)
+    try:
+      source.execute('ATTACH DATABASE ? AS snap', (target,))
+      source.execute('CREATE TABLE IF NOT EXISTS snap.counter (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+      source.execute('BEGIN')
+      try:
+        source.execute('DELETE FROM snap.objs WHERE id NOT IN (SELECT id FROM main.objs)')
+        source.execute(
+          'CREATE TEMP TABLE changed AS SELECT s.id AS id, length(s.obj) AS size '
+          'FROM main.objs s LEFT JOIN snap.objs t ON t.id = s.id '
+          'WHERE t.id IS NULL OR t.cat IS NOT s.cat OR t.meta IS NOT s.meta '
+          'OR t.tag IS NOT s.tag OR t.obj != s.obj'
+        )
+        source.execute(
+          'INSERT OR REPLACE INTO snap.objs (id, cat, meta, tag, obj) '
+          'SELECT id, cat, meta, tag, obj FROM main.objs WHERE id IN (SELECT id FROM temp.changed)'
+        )
+        source.execute('INSERT OR REPLACE INTO snap.counter SELECT name, value FROM main.counter')
+        copied, size = source.execute('SELECT COUNT(*), TOTAL(size) FROM temp.changed').fetchone()
+        count = source.execute('SELECT COUNT(*) FROM main.objs').fetchone()[0]
+        source.execute('DROP TABLE temp.changed')
+        source.execute('COMMIT')
+      except BaseException:
+        source.execute('ROLLBACK')
+        raise
+    finally:
+      source.close()
+    return {'objects': count, 'copied': copied, 'bytes': int(size)}
+
+  def close(self):
+    """Фиксирует изменения и закрывает все соединения"""
+    self._commit()
+    with self._lock:
+      for db in self._readers:
+        db.close()
+      self._readers = []
+      self._db.close()
+
+
+
+  def cat(self, id):
+    """
+    Возвращает категорию объекта с заданным id
+    если такового нет, возбуждается KeyError
+    """
+    row = self._query('SELECT cat FROM objs WHERE id = ?', (id,)).fetchone()
+    if row is None:
+      raise KeyError(id)
+    return row[0]
+
+  def meta(self, id):
+    """
+    Метаинформация объекта с заданным id; если такого
+    объекта нет, возбуждается KeyError
+    """
+    row = self._query('SELECT meta FROM objs WHERE id = ?', (id,)).fetchone()
+    if row is None:
+      raise KeyError(id)
+    return None if row[0] is None else pickle.loads(row[0])
+
+  def metas(self, cat):
+    """То же, что Lira.metas: пары (id, метаинформация) объектов категории"""
+    rows = self._query('SELECT id, meta FROM objs WHERE cat IS ? ORDER BY rowid', (cat,))
+    return [(id, None if meta is None else pickle.loads(meta)) for id, meta in rows]
+
+  def id(self, obj):
+    """То же, что Lira.id: поиск среди объектов в памяти"""
+    return self._objv.find(obj)
+
+  def cats(self):
+    """Список всех категорий"""
+    return [row[0] for row in self._query('SELECT DISTINCT cat FROM objs')]
+
+  def __iter__(self):
+    """Итератор по всем id"""
+    for row in self._query('SELECT id FROM objs').fetchall():
+      yield row[0]
+
+  def __getitem__(self, item):
+    """Список id всех объектов категории"""
+    return [row[0] for row in self._query('SELECT id FROM objs WHERE cat IS ? ORDER BY rowid', (item,))]
+
+
+
+  def get(self, id, default=None):
+    """
+    Получение объекта по id если такового
+    нет, возвращается default (по умолчанию
+    None)
+    """
+    obj = self._objv.get(id, None)
+    if obj is not None:
+      return obj
+    row = self._query('SELECT cat, tag, obj FROM objs WHERE id = ?', (id,)).fetchone()
+    if row is None:
+      return default
+    cat, tag, dump = row
+    obj = self._codec.decode(dump, tag, cat)
+    self._objv.put(id, obj, len(dump), cat)
+    return obj
+
+  def cached(self, id, default=None):
+    """То же, что Lira.cached: объект из кэша в памяти без запроса к базе"""
+    obj = self._objv.probe(id, None)
+    return default if obj is None else obj
+
+  def put(self, obj, *, id=None, cat=None, meta=None):
+    """
+    Записывает объект obj и возвращает его id; если
+    указан существующий id, то прежний объект
+    замещается новым
+    """
+    dump, tag = self._codec.encode(obj, cat)
+    meta = None if meta is None else pickle.dumps(meta)
+    with self._lock:
+      self._begin()
+      if id is None:
+        id = self._mnid
+        self._mnid -= 1
+      elif isinstance(id, int) and id <= self._mnid:
+        self._mnid = id - 1
+      self._db.execute(
+        'INSERT OR REPLACE INTO objs (id, cat, meta, tag, obj) VALUES (?, ?, ?, ?, ?)',
+        (id, cat, meta, tag, dump),
+      )
+      self._objv.put(id, obj, len(dump), cat, dump if tag is None else None)
+    return id
+
+  def out(self, id):
+    """
+    Удаление существующего объекта ничего
+    не возвращает
+    """
+    with self._lock:
+      self._begin()
+      self._db.execute('DELETE FROM objs WHERE id = ?', (id,))
+      self._objv.pop(id, None)
+
+  def pop(self, id, default=None):
+    """Удаляет объект и возвращает его"""
+    val = self.get(id, default)
+    self.out(id)
+    return val
+
+  def get_many(self, ids, default=None):
+    """То же, что Lira.get_many: объекты, которых нет в памяти, читаются запросами по BATCH id"""
+    ids = list(ids)
+    objs = [self._objv.get(id, None) for id in ids]
+    missed = [id for id, obj in zip(ids, objs) if obj is None]
+    found = {}
+    for i in range(0, len(missed), SqliteLira.BATCH):
+      chunk = missed[i:i + SqliteLira.BATCH]
+      rows = self._query(
+        f'SELECT id, cat, tag, obj FROM objs WHERE id IN ({",".join("?" * len(chunk))})',
+        chunk,
+      )
+      for id, cat, tag, dump in rows:
+        found[id] = self._codec.decode(dump, tag, cat)
+        self._objv.put(id, found[id], len(dump), cat)
+    return [found.get(id, default) if obj is None else obj for id, obj in zip(ids, objs)]
+
+  def scan_cat(self, cat, where=None, batch=256):
+    """
+    То же, что Lira.scan_cat: объекты категории читаются
+    порциями по batch штук в порядке вставки
+    """
+    ids = self[cat]
+    for i in range(0, len(ids), batch):
+      chunk = ids[i:i + batch]
+      rows = self._query(
+        f'SELECT id, meta, tag, obj FROM objs '
+        f'WHERE cat IS ? AND id IN ({",".join("?" * len(chunk))})',
+        [cat] + chunk,
+      ).fetchall()
+      found = {id: (meta, tag, dump) for id, meta, tag, dump in rows}
+      for id in chunk:
+        if id not in found:
+          continue
+        meta, tag, dump = found[id]
+        if where is not None and not where(None if meta is None else pickle.loads(meta)):
+          continue
+        obj = self._objv.get(id, None)
+        yield id, self._codec.decode(dump, tag, cat) if obj is None else obj
+
+  def put_many(self, objs, *, ids=None, cat=None, meta=None):
+    """То же, что Lira.put_many: все объекты пишутся одним executemany"""
+    objs = list(objs)
+    ids = [None] * len(objs) if ids is None else list(ids)
+    encoded = [self._codec.encode(obj, cat) for obj in objs]
+    meta = None if meta is None else pickle.dumps(meta)
+    with self._lock:
+      self._begin()
+      for i, id in enumerate(ids):
+        if id is None:
+          ids[i] = self._mnid
+          self._mnid -= 1
+        elif isinstance(id, int) and id <= self._mnid:
+          self._mnid = id - 1
+      self._db.executemany(
+        'INSERT OR REPLACE INTO objs (id, cat, meta, tag, obj) VALUES (?, ?, ?, ?, ?)',
+        [(id, cat, meta, tag, dump) for id, (dump, tag) in zip(ids, encoded)],
+      )
+      for obj, id, (dump, tag) in zip(objs, ids, encoded):
+        self._objv.put(id, obj, len(dump), cat, dump if tag is None else None)
+    return ids
+
+  def out_many(self, ids):
+    """Удаление сразу нескольких объектов одним executemany"""
+    ids = list(ids)
+    with self._lock:
+      self._begin()
+      self._db.executemany('DELETE FROM objs WHERE id = ?', [(id,) for id in ids])
+      for id in ids:
+        self._objv.pop(id, None)
+
+  def __call__(self, id, default=None):
+    """То же, что get"""
+    return self.get(id, default)
+
+
+
+  def _begin(self):
+    """
+    Открывает транзакцию записи (если она ещё не открыта)
+    и читает счётчик id: до COMMIT другие процессы писать
+    в базу не могут, так что выдавать id можно из памяти
+    """
+    if not self._dirty:
+      self._db.execute('BEGIN IMMEDIATE')
+      self._mnid = self._mnidRead = self._db.execute(
+        "SELECT value FROM counter WHERE name = 'mnid'"
+      ).fetchone()[0]
+      self._dirty = True
+
+  def _commit(self):
+    with self._txlk:
+      with self._lock:
+        if not self._dirty:
+          return
+        start = time.perf_counter()
+        if self._mnid != self._mnidRead:
+          self._db.execute("UPDATE counter SET value = ? WHERE name = 'mnid'", (self._mnid,))
+        self._db.execute('COMMIT')
+        self._dirty = False
+        self._mnid = self._mnidRead = None
+        latency = time.perf_counter() - start
+        self._stat['commits'] += 1
+        self._stat['latency_total'] += latency
+        self._stat['latency_max'] = max(self._stat['latency_max'], latency)
+
+  def _query(self, sql, params=()):
+    """
+    Незафиксированные изменения видны только соединению
+    писателя, поэтому, пока они есть, читаем через него
+    (и под блокировкой), а иначе — через соединение
+    своего потока
+    """
+    if self._dirty:
+      with self._lock:
+        if self._dirty:
+          return _Rows(self._db.execute(sql, params).fetchall())
+    db = getattr(self._local, 'db', None)
+    if db is None:
+      db = sqlite3.connect(self._path, timeout=self._timeout, isolation_level=None,
+                           check_same_thread=False)
+      self._local.db = db
+      with self._lock:
+        self._readers.append(db)
+    return db.execute(sql, params)
+
+
+class _Rows(list):
+  """Уже прочитанные строки с интерфейсом курсора"""
+
+  def fetchone(self):
+    return self[0] if len(self) > 0 else None
+
+  def fetchall(self):
+    return self
+
+
+def migrate(source, target, batch=1000):
+  """
+  Перенести все объекты из одного хранилища в другое
+  (Lira, SqliteLira, ShardedLira) с теми же id,
+  категориями и метаинформацией
+
+  :param source: хранилище, из которого читаются объекты
+
+  :param target: хранилище, в которое они пишутся
+
+  :param batch: сколько объектов фиксировать одной транзакцией
+
+  :return: число перенесённых объектов
+  """
+  count = 0
+  ids = list(source)
+  for i in range(0, len(ids), batch):
+    with target.transaction():
+      for id in ids[i:i + batch]:
+        target.put(source.get(id), id=id, cat=source.cat(id), meta=source.meta(id))
+        count += 1
+  return count
@@ -0,0 +1,171 @@
+import time
+
+from threading import Lock
+
+
+class Histogram:
+  """
+  Гистограмма длительностей по степеням двойки микросекунд: корзина i
+  считает значения от 2**(i-1) до 2**i мкс. Хранит также число значений,
+  их сумму и максимум; перцентили оцениваются по верхней границе корзины
+  """
+
+  BUCKETS = 32
+
+  def __init__(self):
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+    self.buckets = [0] * Histogram.BUCKETS
+
+
+  def add(self, seconds: float):
+    self.count += 1
+    self.total += seconds
+    if seconds > self.max:
+      self.max = seconds
+    self.buckets[min(int(seconds * 1e6).bit_length(), Histogram.BUCKETS - 1)] += 1
+
+  def percentile(self, q: float) -> float:
+    """Оценка q-го перцентиля (0 < q < 1) в секундах"""
+    rank = q * self.count
+    seen = 0
+    for i, n in enumerate(self.buckets):
+      seen += n
+      if n > 0 and seen >= rank:
+        return min(2 ** i / 1e6, self.max)
+    return 0.0
+
+  def snapshot(self) -> {str: float}:
+    """Число значений, сумма, среднее, p50, p99 и максимум (в секундах)"""
+    return {
+      'count': self.count,
+      'total': self.total,
+      'mean': self.total / self.count if self.count > 0 else 0.0,
+      'p50': self.percentile(0.5),
+      'p99': self.percentile(0.99),
+      'max': self.max,
+    }
+
+
+class LiraStats:
+  """
+  Счётчики и гистограммы работы Лиры: число операций (get, put, out,
+  scan) по категориям, прочитанные и записанные байты и длительности
+  (flush, запись журнала, контрольная точка, ожидание блокировки).
+  Собираются, только если экземпляр передан в Lira(stats=...), иначе
+  Лира тратит на них одну проверку на None; снимок — Lira.stats()
+  """
+
+  def __init__(self):
+    self._lock = Lock()
+    self._ops = dict()  # {(операция, категория): число}
+    self._bytes = {'read': 0, 'written': 0}
+    self._timings = dict()  # {имя: Histogram}
+
+
+  def count(self, op: str, cat, n: int = 1):
+    with self._lock:
+      key = op, cat
+      self._ops[key] = self._ops.get(key, 0) + n
+
+  def read(self, n: int):
+    with self._lock:
+      self._bytes['read'] += n
+
+  def written(self, n: int):
+    with self._lock:
+      self._bytes['written'] += n
+
+  def time(self, name: str, seconds: float):
+    with self._lock:
+      histogram = self._timings.get(name)
+      if histogram is None:
+        histogram = self._timings[name] = Histogram()
+      histogram.add(seconds)
+
+  def snapshot(self) -> dict:
+    """
+    {'ops': {операция: {категория: число}}, 'bytes': {'read', 'written'},
+    'timings': {имя: Histogram.snapshot()}}
+    """
+    with self._lock:
+      ops = dict()
+      for (op, cat), n in self._ops.items():
+        ops.setdefault(op, dict())[cat] = n
+      return {
+        'ops': ops,
+        'bytes': dict(self._bytes),
+        'timings': {name: histogram.snapshot() for name, histogram in self._timings.items()},
+      }
+
+  def reset(self):
+    with self._lock:
+      self._ops.clear()
+      self._bytes = {'read': 0, 'written': 0}
+      self._timings.clear()
+
+
+class TimedLock:
+  """
+  Обёртка над RWLock, которая записывает в LiraStats время ожидания
+  блокировки (lock_wait — на запись, read_lock_wait — на чтение);
+  Лира подменяет ею свою блокировку, только если статистика включена
+  """
+
+  def __init__(self, lock, stats: LiraStats):
+    self._lock = lock
+    self._stats = stats
+    self._reader = _TimedReadContext(self)
+
+
+  def read(self):
+    return self._reader
+
+  def acquire_read(self):
+    start = time.perf_counter()
+    self._lock.acquire_read()
+    self._stats.time('read_lock_wait', time.perf_counter() - start)
+
+  def release_read(self):
+    self._lock.release_read()
+
+  def acquire(self):
+    start = time.perf_counter()
+    self._lock.acquire()
+    self._stats.time('lock_wait', time.perf_counter() - start)
+
+  def release(self):
+    self._lock.release()
+
+  def __enter__(self):
+    self.acquire()
+    return self
+
+  def __exit__(self, *args):
+    self.release()
+
+
+class _TimedReadContext:
+  def __init__(self, lock: TimedLock):
+    self._lock = lock
+
+  def __enter__(self):
+    self._lock.acquire_read()
+    return self._lock
+
+  def __exit__(self, *args):
+    self._lock.release_read()
+
+
+def format_stats(stats: dict, prefix: str = '') -> str:
+  """Снимок Lira.stats() в виде строк «ключ.ключ: значение» для лога"""
+  lines = []
+  for key, value in stats.items():
+    if isinstance(value, dict):
+      lines.append(format_stats(value, f'{prefix}{key}.'))
+    elif isinstance(value, float):
+      lines.append(f'{prefix}{key}: {value:.6g}')
+    else:
+      lines.append(f'{prefix}{key}: {value}')
+  return '\n'.join(line for line in lines if line != '')
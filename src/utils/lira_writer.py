@@ -0,0 +1,141 @@
+import atexit
+import time
+import traceback
+
+from threading import Condition, Lock, Thread
+
+
+class LiraWriter:
+  """
+  Отложенная запись изменений объектов LiraRepo (write-behind): вместо
+  того чтобы на каждое изменение объекта сериализовать его, записывать
+  в Лиру и делать flush, репозиторий только отмечает объект изменённым,
+  а фоновый поток записывает все отмеченные объекты одной транзакцией,
+  когда изменения затихнут на delay секунд, но не позже чем через
+  max_delay секунд после первого незаписанного изменения. Несколько
+  изменений одного объекта за это время записываются один раз
+
+  Один писатель обслуживает все репозитории на одной Лире. Всё
+  незаписанное записывается в sync (его вызывают там, где изменение
+  должно сразу оказаться на диске) и в close — при завершении бота и
+  при выходе из процесса (atexit)
+
+  Блокировки берутся всегда в одном порядке: сначала транзакция Лиры,
+  потом запись писателя, — иначе поток, удаляющий объект внутри
+  repo.batch(), и фоновая запись ждали бы друг друга
+
+  writer = LiraWriter(lira, delay=0.2, max_delay=2)
+  repo = EventRepo(lira, 'event', writer=writer)
+  """
+
+  def __init__(self, lira, delay: float, max_delay: float = None, logger=None):
+    """
+    :param lira: хранилище, в которое пишут репозитории
+
+    :param delay: сколько секунд после последнего изменения ждать следующих, прежде чем записать
+
+    :param max_delay: дольше скольких секунд изменение не может оставаться незаписанным (по умолчанию 10 * delay)
+
+    :param logger: куда писать ошибки записи из фонового потока
+    """
+    self.lira = lira
+    self.delay = delay
+    self.maxDelay = max(delay, 10 * delay if max_delay is None else max_delay)
+    self.logger = logger
+    self._cnd = Condition()
+    self._writing = Lock()
+    self._dirty = dict()  # {(репозиторий, ключ): None} — в порядке изменения
+    self._first = None  # когда появилось первое незаписанное изменение
+    self._last = None  # когда было последнее изменение
+    self._closed = False
+    self._stat = {'marked': 0, 'written': 0, 'batches': 0}
+    self._thread = Thread(target=self._run, name='lira-writer', daemon=True)
+    self._thread.start()
+    atexit.register(self.close)
+
+
+  def mark(self, repo, key):
+    """Отметить объект репозитория repo с ключом key изменённым"""
+    with self._cnd:
+      now = time.monotonic()
+      if len(self._dirty) == 0:
+        self._first = now
+      self._last = now
+      self._dirty[repo, key] = None
+      self._stat['marked'] += 1
+      self._cnd.notify()
+
+  def discard(self, repo, key):
+    """
+    Забыть изменения объекта, который удаляется из репозитория; если
+    сейчас идёт запись, то дожидается её, чтобы удалённый объект не
+    был записан обратно (объекты, которых уже нет в репозитории,
+    запись пропускает)
+    """
+    with self.lira.transaction(), self._writing:
+      with self._cnd:
+        self._dirty.pop((repo, key), None)
+
+  def sync(self):
+    """Записать все отмеченные объекты прямо сейчас"""
+    with self._cnd:
+      if len(self._dirty) == 0:
+        return
+    with self.lira.transaction(), self._writing:
+      with self._cnd:
+        dirty = self._dirty
+        self._dirty = dict()
+        self._first = self._last = None
+      try:
+        for repo, key in dirty:
+          repo._persist(key)
+      except Exception:
+        with self._cnd:
+          now = time.monotonic()
+          self._dirty = {**dirty, **self._dirty}
+          self._first = self._last = now
+        raise
+      with self._cnd:
+        self._stat['written'] += len(dirty)
+        self._stat['batches'] += 1
+
+  def close(self):
+    """Останавливает фоновый поток и записывает всё незаписанное"""
+    with self._cnd:
+      if self._closed:
+        return
+      self._closed = True
+      self._cnd.notify()
+    atexit.unregister(self.close)
+    self._thread.join()
+    self.sync()
+
+  def stats(self) -> {str: int}:
+    """
+    Сколько изменений отмечено (marked), сколько объектов записано
+    (written) и за сколько транзакций (batches), сколько ждут записи
+    (pending)
+    """
+    with self._cnd:
+      return {**self._stat, 'pending': len(self._dirty)}
+
+
+  def _run(self):
+    while True:
+      with self._cnd:
+        while len(self._dirty) == 0 and not self._closed:
+          self._cnd.wait()
+        if self._closed:
+          return
+        while not self._closed and len(self._dirty) > 0:
+          wait = min(self._last + self.delay, self._first + self.maxDelay) - time.monotonic()
+          if wait <= 0:
+            break
+          self._cnd.wait(wait)
+      try:
+        self.sync()
+      except Exception:
+        if self.logger is not None:
+          self.logger.error(traceback.format_exc())
+        with self._cnd:
+          self._cnd.wait(self.delay)
@@ -1,8 +1,7 @@
 import datetime as dt
 import math
-import time
 
-from threading import Thread
+from threading import Event, Thread
 from typing import Callable
 
 
@@ -13,6 +12,7 @@ class Repeater(Thread):
     self.action = action
     self.counter = 0
     self.period = period
+    self._stopped = Event()  # stop будит поток, не дожидаясь конца периода
     
   def start(self):
     self.runFlag = True
@@ -21,12 +21,13 @@ class Repeater(Thread):
   def stop(self):
     self.runFlag = False
     self.counter = 0
+    self._stopped.set()
   
   def run(self):
     while self.runFlag:
       self.action(self.counter)
       self.counter += 1
-      time.sleep(self.period)
+      self._stopped.wait(self.period)
 
 
 class Period:
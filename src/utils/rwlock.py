@@ -0,0 +1,77 @@
+from threading import Condition, Lock
+
+
+class RWLock:
+  """
+  Блокировка читателей-писателей: сколько угодно потоков могут одновременно
+  держать её на чтение, на запись — только один и только когда нет читателей.
+  Ждущий писатель не пропускает новых читателей вперёд, поэтому писатели не
+  голодают. Блокировка не реентерабельна.
+
+  with lock:          # на запись (как обычный Lock)
+    ...
+  with lock.read():   # на чтение
+    ...
+  """
+
+  def __init__(self):
+    self._cond = Condition(Lock())
+    self._readers = 0
+    self._writer = False
+    self._waiting = 0
+    self._reader = _ReadContext(self)
+
+
+  def read(self):
+    """Контекст, в котором блокировка удерживается на чтение"""
+    return self._reader
+
+
+  def acquire_read(self):
+    """Захватить блокировку на чтение"""
+    with self._cond:
+      while self._writer or self._waiting > 0:
+        self._cond.wait()
+      self._readers += 1
+
+  def release_read(self):
+    """Освободить блокировку, захваченную на чтение"""
+    with self._cond:
+      self._readers -= 1
+      if self._readers == 0:
+        self._cond.notify_all()
+
+
+  def acquire(self):
+    """Захватить блокировку на запись"""
+    with self._cond:
+      self._waiting += 1
+      while self._writer or self._readers > 0:
+        self._cond.wait()
+      self._waiting -= 1
+      self._writer = True
+
+  def release(self):
+    """Освободить блокировку, захваченную на запись"""
+    with self._cond:
+      self._writer = False
+      self._cond.notify_all()
+
+  def __enter__(self):
+    self.acquire()
+    return self
+
+  def __exit__(self, *args):
+    self.release()
+
+
+class _ReadContext:
+  def __init__(self, lock: RWLock):
+    self._lock = lock
+
+  def __enter__(self):
+    self._lock.acquire_read()
+    return self._lock
+
+  def __exit__(self, *args):
+    self._lock.release_read()